@@ -0,0 +1,433 @@
+# Local stand-in for the Decathlon search and product pages, used to benchmark the scraper without network
+# access. Pages use the exact markup final.py targets, with the JSON-LD and /products/<handle>.js documents of
+# the Shopify storefront; latency, payload size and failures are configurable.
+import re
+import gzip
+import json
+import time
+import random
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from final import CATEGORIES
+
+# Products per result page, like the live search grid
+PAGE_SIZE = 20
+# Products per product sitemap (Shopify puts up to 5000 in each)
+SITEMAP_SIZE = 50
+SITEMAP_NAMESPACES = ('xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                      'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"')
+
+BRANDS = ["Decathlon Wedze", "Decathlon Quechua", "Decathlon Kalenji", "Decathlon Domyos", "Decathlon Btwin"]
+COLOURS = ["Black", "Navy Blue", "Grey", "Red", "Khaki", "White"]
+
+
+def bench_categories(count):
+    # Categories whose label is not part of another label, so :has-text() picks the intended checkbox
+    distinct = [category for category in CATEGORIES
+                if not any(category != other and category.lower() in other.lower() for other in CATEGORIES)]
+    return distinct[:count]
+
+
+class StandInConfig:
+    def __init__(self, products=200, categories=8, latency_ms=50, jitter_ms=0, search_latency_ms=300,
+                 search_jitter_ms=0, payload_kb=0, images=6, image_kb=40, failure_rate=0.0, review_ratio=0.7,
+                 review_delay_ms=300, seed=0):
+        self.products = products
+        self.categories = bench_categories(categories)
+        # Delay of page loads and of the search API calls made by the grid
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.search_latency_ms = search_latency_ms
+        self.search_jitter_ms = search_jitter_ms
+        # Extra bytes of markup per product page, and the heavy assets it links
+        self.payload_kb = payload_kb
+        self.images = images
+        self.image_kb = image_kb
+        # Share of product page loads answered with a 503
+        self.failure_rate = failure_rate
+        # Share of products with a reviews widget, and how late the widget renders
+        self.review_ratio = review_ratio
+        self.review_delay_ms = review_delay_ms
+        self.seed = seed
+
+
+def build_catalogue(config):
+    # Deterministic products, each listed under one or two categories
+    generator = random.Random(config.seed)
+    products = []
+    by_category = {category: [] for category in config.categories}
+    for number in range(config.products):
+        mrp = generator.choice([9.99, 14.99, 19.99, 24.99, 39.99, 59.99])
+        product = {
+            'handle': f"bench-product-{number}",
+            'name': f"Bench Product {number}",
+            'brand': generator.choice(BRANDS),
+            'mrp': mrp,
+            'price': round(mrp * generator.choice([1, 1, 0.8, 0.7]), 2),
+            'colour': generator.choice(COLOURS),
+            'rating': generator.choice([3.5, 4, 4.5, 5]) if generator.random() < config.review_ratio else None,
+            'reviews': generator.randint(1, 9000),
+            'updated': f"2026-{generator.randint(1, 9):02d}-{generator.randint(1, 28):02d}T08:00:00Z",
+        }
+        products.append(product)
+        for category in generator.sample(config.categories, min(len(config.categories), generator.choice([1, 1, 2]))):
+            by_category[category].append(number)
+    return products, by_category
+
+
+def price_text(value):
+    return f"${value:.2f} "
+
+
+def cents(value):
+    return int(round(value * 100))
+
+
+def description_html(product):
+    return (f"<p>{product['name']} | Designed for benchmarking the scraper.</p>\n<p>A photo of the product</p>\n"
+            f"<p>Moisture wicking</p>\n<p>VERY LOW: a fabric that provides moisture wicking.</p>")
+
+
+def product_json(product):
+    # The /products/<handle>.js document: prices in cents, no compare-at price without a discount
+    compare_at = cents(product['mrp']) if product['mrp'] > product['price'] else None
+    return {'id': int(product['handle'].rsplit('-', 1)[1]), 'title': product['name'], 'handle': product['handle'],
+            'vendor': product['brand'], 'description': description_html(product),
+            'price': cents(product['price']), 'compare_at_price': compare_at,
+            'options': [{'name': 'Color', 'position': 1, 'values': [product['colour']]}],
+            'variants': [{'id': 1, 'title': product['colour'], 'option1': product['colour'],
+                          'price': cents(product['price']), 'compare_at_price': compare_at, 'available': True}]}
+
+
+def product_json_ld(product):
+    # Structured data embedded in the page; only products with reviews have an aggregate rating
+    data = {'@context': 'https://schema.org', '@type': 'Product', 'name': product['name'],
+            'brand': {'@type': 'Brand', 'name': product['brand']},
+            'offers': {'@type': 'Offer', 'price': f"{product['price']:.2f}", 'priceCurrency': 'USD'}}
+    if product['rating']:
+        data['aggregateRating'] = {'@type': 'AggregateRating', 'ratingValue': product['rating'],
+                                   'reviewCount': product['reviews']}
+    return json.dumps(data)
+
+
+def sitemap_index(base_url, products):
+    # Index in the Shopify layout: product sitemaps next to pages and collections ones
+    children = [f"{base_url}/sitemap_products_{number + 1}.xml?from={start}&amp;to={start + SITEMAP_SIZE - 1}"
+                for number, start in enumerate(range(0, len(products), SITEMAP_SIZE))]
+    children += [f"{base_url}/sitemap_pages_1.xml", f"{base_url}/sitemap_collections_1.xml"]
+    entries = ''.join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in children)
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex {SITEMAP_NAMESPACES}>{entries}</sitemapindex>'
+
+
+def sitemap_urls(entries):
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset {SITEMAP_NAMESPACES}>\n' +
+            ''.join(entries) + '</urlset>')
+
+
+def product_sitemap(base_url, products):
+    # One <url> per product with its lastmod and image, like the live product sitemaps
+    return sitemap_urls(
+        f"<url><loc>{base_url}/products/{product['handle']}</loc><lastmod>{product['updated']}</lastmod>"
+        f"<changefreq>daily</changefreq><image:image><image:loc>{base_url}/assets/image-{product['handle']}-0.jpg"
+        f"</image:loc><image:title>{product['name']}</image:title></image:image></url>\n"
+        for product in products)
+
+
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Search</title>
+<style>.collapsed {display: none} .de-u-hiddenVisually {position: absolute; clip: rect(0 0 0 0); width: 1px; height: 1px; overflow: hidden}</style>
+</head><body>
+<button class="adept-filter-list__title" aria-label="product category Filter" aria-expanded="false">
+  <span class="adept-filter__list__title__text">Product Category</span></button>
+<div id="filters" class="collapsed">
+  <div class="adept-checkbox__input-container">__CHECKBOXES__</div>
+  <button class="adept-filter__checkbox__show-toggle">Show All</button>
+</div>
+<div id="selection"></div>
+<div id="grid"></div>
+<ul id="pagination"></ul>
+<script>
+const state = {category: null, page: 1};
+const visibleByDefault = 5;
+
+function render(data) {
+  document.querySelector('#grid').innerHTML = data.items.map(item =>
+    `<div class="adept-product-display"><a class="adept-product-display__title-container" href="${item.href}">${item.title}</a>` +
+    `<span class="adept-product-display__price">${item.price}</span>` +
+    (item.mrp ? `<s class="adept-product-display__compare-price">${item.mrp}</s>` : '') +
+    (item.rating ? `<span class="adept-product-display__rating" aria-label="Rated ${item.rating} out of 5 stars"></span>` +
+                   `<span class="adept-product-display__reviews">${item.reviews} Reviews</span>` : '') +
+    `</div>`).join('');
+  const base = state.category ? `/search?category=${encodeURIComponent(state.category)}&` : '/search?';
+  let links = '';
+  for (let number = 1; number <= data.pages; number++) {
+    links += `<li class="adept-pagination__item"><a href="${base}page=${number}">${number}</a></li>`;
+  }
+  const last = state.page >= data.pages;
+  links += `<li class="adept-pagination__item${last ? ' adept-pagination__disabled' : ''}">` +
+           `<a aria-label="Go to next page" href="${last ? '' : base + 'page=' + (state.page + 1)}">&rsaquo;</a></li>`;
+  document.querySelector('#pagination').innerHTML = links;
+  document.querySelector('#selection').innerHTML = state.category ?
+    `<button class="adept-selection-list__close" aria-label="Clear ${state.category.toLowerCase()} Filter">x</button>` : '';
+}
+
+async function load() {
+  const params = new URLSearchParams({page: state.page});
+  if (state.category) params.set('category', state.category);
+  const response = await fetch('/api/search?' + params);
+  render(await response.json());
+}
+
+document.addEventListener('click', event => {
+  const title = event.target.closest('.adept-filter-list__title');
+  if (title) {
+    const expanded = title.getAttribute('aria-expanded') === 'true';
+    title.setAttribute('aria-expanded', String(!expanded));
+    document.querySelector('#filters').classList.toggle('collapsed', expanded);
+    return;
+  }
+  const toggle = event.target.closest('.adept-filter__checkbox__show-toggle');
+  if (toggle) {
+    const showAll = toggle.textContent === 'Show All';
+    toggle.textContent = showAll ? 'Show Less' : 'Show All';
+    document.querySelectorAll('label.adept-checkbox__label').forEach((label, index) =>
+      label.classList.toggle('collapsed', !showAll && index >= visibleByDefault));
+    return;
+  }
+  const label = event.target.closest('label.adept-checkbox__label');
+  if (label) {
+    event.preventDefault();
+    document.querySelectorAll('label.adept-checkbox__label').forEach(other => other.setAttribute('aria-checked', 'false'));
+    label.setAttribute('aria-checked', 'true');
+    state.category = label.dataset.category;
+    state.page = 1;
+    load();
+    return;
+  }
+  const clear = event.target.closest('.adept-selection-list__close');
+  if (clear) {
+    document.querySelectorAll('label.adept-checkbox__label').forEach(other => other.setAttribute('aria-checked', 'false'));
+    state.category = null;
+    state.page = 1;
+    load();
+    return;
+  }
+  const link = event.target.closest('#pagination a');
+  if (link) {
+    event.preventDefault();
+    const match = (link.getAttribute('href') || '').match(/page=(\\d+)/);
+    if (match) {
+      state.page = Number(match[1]);
+      load();
+    }
+  }
+});
+
+const params = new URLSearchParams(location.search);
+state.category = params.get('category');
+state.page = Number(params.get('page') || 1);
+load();
+</script>
+</body></html>
+"""
+
+PRODUCT_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{name}</title>
+<style>@font-face {{font-family: Bench; src: url('/assets/font-{handle}.woff2')}}
+.de-u-hiddenVisually {{position: absolute; clip: rect(0 0 0 0); width: 1px; height: 1px; overflow: hidden}}</style>
+<script type="application/ld+json">{json_ld}</script>
+</head><body>
+<svg role="img" width="10" height="10"><title>{brand}</title></svg>
+<h1 class="de-u-textGrow1 de-u-md-textGrow2 de-u-textMedium de-u-spaceBottom06">
+  {name}
+</h1>
+{reviews_block}
+{crossed_out_price}<div class="js-de-CurrentPrice"><span class="js-de-PriceAmount">{price}</span></div>
+<div class="de-u-spaceTop06 de-u-lineHeight1 de-u-hidden de-u-md-block de-u-spaceBottom2"><strong>Colour:</strong><span class="js-de-ColorInfo">{colour}</span></div>
+<div class="de-ProductInformation--multispec">
+  <div class="de-ProductInformation-entry"><h3 itemprop="name">
+      Composition    </h3><p itemprop="value"> Main fabric: 100.0% Polyester</p></div>
+  <div class="de-ProductInformation-entry"><h3 itemprop="name">
+      Storage instructions    </h3><p itemprop="value"> Dry thoroughly before storing.</p></div>
+  <div class="de-ProductInformation-entry"><h3 itemprop="name">
+      Origin    </h3><p itemprop="value"> Imported</p></div>
+</div>
+<div class="FeaturesContainer">
+{description}
+</div>
+{images}
+<div hidden>{padding}</div>
+<script>
+const review = {review};
+if (review) {{
+  setTimeout(() => {{
+    document.querySelector('#reviews').innerHTML =
+      `<span class="de-StarRating-fill"></span><span class="de-u-hiddenVisually">Rated ${{review.rating}} out of 5 stars</span>` +
+      `<span class="de-u-textMedium de-u-textSelectNone de-u-textBlue">${{review.count}}<br>Reviews)</span>`;
+  }}, {review_delay_ms});
+}}
+</script>
+</body></html>
+"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # Keep-alive, every response has a Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Set on the subclass built by serve()
+    config = None
+    products = None
+    by_category = None
+    random = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def delay(self, latency_ms, jitter_ms):
+        time.sleep(max(0, latency_ms + self.random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+    def send(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if parts.path == '/search':
+            self.delay(self.config.latency_ms, self.config.jitter_ms)
+            checkboxes = ''.join(
+                f'<label class="adept-checkbox__label{" collapsed" if index >= 5 else ""}" '
+                f'data-category="{category}" aria-checked="false">{category}</label>'
+                for index, category in enumerate(self.config.categories))
+            self.send(200, SEARCH_PAGE.replace('__CHECKBOXES__', checkboxes))
+        elif parts.path == '/api/search':
+            self.search(query)
+        elif parts.path.startswith('/sitemap'):
+            self.sitemap(parts.path)
+        elif parts.path.startswith('/products/'):
+            self.product(parts.path[len('/products/'):])
+        elif parts.path.startswith('/assets/'):
+            self.asset(parts.path)
+        else:
+            self.send(404, 'Not found', 'text/plain')
+
+    def search(self, query):
+        self.delay(self.config.search_latency_ms, self.config.search_jitter_ms)
+        category = query.get('category', [None])[0]
+        page = int(query.get('page', ['1'])[0])
+        numbers = self.by_category.get(category, []) if category else range(len(self.products))
+        pages = max(1, -(-len(numbers) // PAGE_SIZE))
+        items = [self.tile(self.products[number]) for number in list(numbers)[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]]
+        self.send(200, json.dumps({'items': items, 'pages': pages}), 'application/json')
+
+    def tile(self, product):
+        # What a result tile shows: name and prices, and the rating of the products with reviews
+        return {'href': f"{self.base_url()}/products/{product['handle']}?adept-product={product['handle']}",
+                'title': product['name'], 'price': price_text(product['price']),
+                'mrp': price_text(product['mrp']).rstrip() if product['mrp'] > product['price'] else None,
+                'rating': product['rating'], 'reviews': product['reviews'] if product['rating'] else None}
+
+    def find_product(self, handle):
+        if not handle.startswith('bench-product-'):
+            return None
+        try:
+            number = int(handle[len('bench-product-'):])
+        except ValueError:
+            return None
+        return self.products[number] if 0 <= number < len(self.products) else None
+
+    def product(self, handle):
+        self.delay(self.config.latency_ms, self.config.jitter_ms)
+        if self.random.random() < self.config.failure_rate:
+            self.send(503, 'Service unavailable', 'text/plain')
+            return
+        document = handle.endswith('.js')
+        product = self.find_product(handle[:-len('.js')] if document else handle)
+        if product is None:
+            self.send(404, 'Not found', 'text/plain')
+            return
+        if document:
+            self.send(200, json.dumps(product_json(product)), 'application/json')
+            return
+        # The validator changes with the price, a revalidated page that did not change costs no transfer
+        etag = f'"{handle}-{product["price"]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send(304, b'', headers={'ETag': etag})
+            return
+        images = ''.join(f'<img src="/assets/image-{handle}-{number}.jpg" width="10" height="10">'
+                         for number in range(self.config.images))
+        review = json.dumps({'rating': product['rating'], 'count': product['reviews']}) if product['rating'] else 'null'
+        # Products without reviews have no widget block at all, the others get it empty and filled in late
+        reviews_block = '<div class="de-StarRating" id="reviews"></div>' if product['rating'] else ''
+        # Like the live pages, a price is only crossed out when the product is discounted
+        crossed_out_price = (f'<div class="js-de-CrossedOutPrice"><span class="js-de-PriceAmount">'
+                             f'{price_text(product["mrp"])}</span></div>\n' if product['mrp'] > product['price'] else '')
+        page = PRODUCT_PAGE.format(name=product['name'], handle=handle, brand=product['brand'],
+                                   json_ld=product_json_ld(product), crossed_out_price=crossed_out_price,
+                                   description=description_html(product), price=price_text(product['price']),
+                                   colour=product['colour'], images=images, review=review, reviews_block=reviews_block,
+                                   review_delay_ms=self.config.review_delay_ms,
+                                   padding='x' * (self.config.payload_kb * 1024))
+        self.send(200, page, headers={'ETag': etag})
+
+    def sitemap(self, path):
+        # Sitemap index and its children; a .xml.gz name serves the same file gzipped
+        compressed = path.endswith('.gz')
+        name = path[1:-len('.gz')] if compressed else path[1:]
+        chunk = re.fullmatch(r'sitemap_products_(\d+)\.xml', name)
+        if name == 'sitemap.xml':
+            body = sitemap_index(self.base_url(), self.products)
+        elif chunk:
+            start = (int(chunk.group(1)) - 1) * SITEMAP_SIZE
+            body = product_sitemap(self.base_url(), self.products[start:start + SITEMAP_SIZE])
+        elif name in ('sitemap_pages_1.xml', 'sitemap_collections_1.xml'):
+            body = sitemap_urls(f"<url><loc>{self.base_url()}/{kind}</loc></url>\n"
+                                for kind in ('pages/about', 'collections/apparel'))
+        else:
+            self.send(404, 'Not found', 'text/plain')
+            return
+        body = body.encode('utf-8')
+        self.send(200, gzip.compress(body) if compressed else body,
+                  'application/gzip' if compressed else 'application/xml')
+
+    def asset(self, path):
+        # Heavy assets a product page links, the ones a fast page mode should never download
+        content_type = 'font/woff2' if path.endswith('.woff2') else 'image/jpeg'
+        self.send(200, b'\0' * (self.config.image_kb * 1024), content_type,
+                  headers={'Cache-Control': 'no-store'})
+
+
+def serve(config=None, host='127.0.0.1', port=0):
+    # Start the stand-in server in a background thread, returns (server, base URL)
+    config = config or StandInConfig()
+    products, by_category = build_catalogue(config)
+    handler = type('ConfiguredStandInHandler', (StandInHandler,), {
+        'config': config, 'products': products, 'by_category': by_category, 'random': random.Random(config.seed)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def search_url(base_url):
+    return f"{base_url}/search"
+
+
+if __name__ == '__main__':
+    server, base_url = serve(port=8000)
+    print(f"Stand-in server on {search_url(base_url)} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
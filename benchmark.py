@@ -0,0 +1,163 @@
+# End-to-end benchmark of final.py against the local stand-in server (bench_server.py): every scenario is a
+# separate crawl of the same synthetic catalogue, reported as products per second, wall time and peak RSS.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from bench_server import StandInConfig, serve, search_url
+from browser_pool import process_tree_rss
+
+# Scenarios: extra final.py arguments, run in this order. The base arguments point the crawl at the
+# stand-in server and give it its own output, checkpoint, cache and snapshot files.
+SCENARIOS = {
+    'serial': ['--concurrency', '1', '--discovery-concurrency', '1', '--pagination', 'click',
+               '--block-resources', '', '--no-cache'],
+    'default': ['--no-cache'],
+    'no-blocking': ['--block-resources', '', '--no-cache'],
+    'concurrency-8': ['--concurrency', '8', '--no-cache'],
+    'html-extraction': ['--extraction', 'html', '--no-cache'],
+    'getters-extraction': ['--extraction', 'getters', '--no-cache'],
+    'sharded-4': ['--processes', '4', '--no-cache'],
+    'shopify-json': ['--backend', 'shopify', '--concurrency', '16', '--no-cache'],
+    'sitemap-discovery': ['--discovery', 'sitemap', '--no-cache'],
+    'pipeline': ['--pipeline', '--no-cache'],
+    'tile-harvest-first': ['--harvest-tiles', '--no-cache'],
+    'tile-harvest-repeat': ['--harvest-tiles', '--no-cache'],
+    'cold-cache': [],
+    'warm-cache': [],
+}
+# Interval (s) between two samples of the memory of the crawl and its browser processes
+RSS_SAMPLE_INTERVAL = 0.2
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, process_tree_rss(self.pid) or 0)
+
+
+def count_rows(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as file:
+        return sum(1 for line in file if line.strip())
+
+
+def run_scenario(name, arguments, base_url, categories, directory, verbose=False):
+    # Crawl the stand-in once with final.py in a child process
+    output = os.path.join(directory, f'{name}.jsonl')
+    timings = os.path.join(directory, f'{name}.timings.json')
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'final.py'),
+               '--search-url', search_url(base_url), '--categories', ','.join(categories), '--max-per-second', '0',
+               '--output', output, '--timings', timings,
+               '--checkpoint', os.path.join(directory, f'{name}.checkpoint.sqlite'),
+               '--snapshot', os.path.join(directory, f'{name}.snapshot.sqlite'),
+               '--category-stats', os.path.join(directory, f'{name}.category_stats.sqlite'),
+               '--sitemap-state', os.path.join(directory, f'{name}.sitemap_state.sqlite'),
+               # The cache scenarios share one cache directory, the second run finds it warm; the tile harvests
+               # share their price database the same way
+               '--cache-dir', os.path.join(directory, 'cache'),
+               '--tile-state', os.path.join(directory, 'tile_prices.sqlite')] + arguments
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=None if verbose else subprocess.DEVNULL)
+    sampler = RssSampler(process.pid)
+    sampler.start()
+    # wait4 also reports the peak RSS of the largest process, in case /proc is not available
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    sampler.stopped.set()
+    sampler.join()
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    rows = count_rows(output)
+    report = {}
+    if os.path.exists(timings):
+        with open(timings, encoding='utf-8') as file:
+            report = json.load(file)
+    return {'scenario': name, 'exit_code': process.returncode, 'products': rows, 'seconds': seconds,
+            'products_per_second': rows / seconds if seconds else 0.0,
+            'peak_rss_mb': (sampler.peak or usage.ru_maxrss * 1024) / 1e6,
+            'results_wait_s': report.get('stages', {}).get('results_wait', {}).get('total', 0.0),
+            'bytes_transferred_mb': report.get('counters', {}).get('bytes_transferred', 0) / 1e6,
+            'timings': report}
+
+
+def print_results(results):
+    print(f"{'scenario':<18}{'exit':>5}{'products':>10}{'seconds':>10}{'products/s':>12}{'peak RSS MB':>13}"
+          f"{'results wait s':>16}{'MB loaded':>11}")
+    for result in results:
+        print(f"{result['scenario']:<18}{result['exit_code']:>5}{result['products']:>10}{result['seconds']:>10.1f}"
+              f"{result['products_per_second']:>12.2f}{result['peak_rss_mb']:>13.0f}"
+              f"{result['results_wait_s']:>16.1f}{result['bytes_transferred_mb']:>11.1f}")
+
+
+def main(options):
+    config = StandInConfig(options.products, options.categories, options.latency_ms, options.jitter_ms,
+                           options.search_latency_ms, options.search_jitter_ms, options.payload_kb,
+                           options.images, options.image_kb, options.failure_rate, options.review_ratio,
+                           options.review_delay_ms, options.seed)
+    server, base_url = serve(config)
+    print(f"Stand-in server on {base_url}: {options.products} products in {len(config.categories)} categories.")
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='decathlon-bench-') as directory:
+            for name in options.scenario or list(SCENARIOS):
+                print(f"Running {name}...")
+                result = run_scenario(name, SCENARIOS[name] + options.extra, base_url, config.categories, directory,
+                                      options.verbose)
+                results.append(result)
+    finally:
+        server.shutdown()
+    print_results(results)
+    if options.report:
+        with open(options.report, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+def parse_args(argv=None):
+    defaults = StandInConfig()
+    parser = argparse.ArgumentParser(description="Benchmark final.py against a local Decathlon stand-in server")
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="scenario to run (repeatable, all of them by default)")
+    parser.add_argument('--products', type=int, default=defaults.products, help="products in the catalogue")
+    parser.add_argument('--categories', type=int, default=len(defaults.categories),
+                        help="categories shown in the filter panel")
+    parser.add_argument('--latency-ms', type=int, default=defaults.latency_ms, help="delay of every page load")
+    parser.add_argument('--jitter-ms', type=int, default=defaults.jitter_ms, help="random spread of the page delay")
+    parser.add_argument('--search-latency-ms', type=int, default=defaults.search_latency_ms,
+                        help="delay of the search API behind the result grid")
+    parser.add_argument('--search-jitter-ms', type=int, default=defaults.search_jitter_ms,
+                        help="random spread of the search API delay")
+    parser.add_argument('--payload-kb', type=int, default=defaults.payload_kb,
+                        help="extra markup added to every product page")
+    parser.add_argument('--images', type=int, default=defaults.images, help="images linked by every product page")
+    parser.add_argument('--image-kb', type=int, default=defaults.image_kb, help="size of every image and font")
+    parser.add_argument('--failure-rate', type=float, default=defaults.failure_rate,
+                        help="share of product page loads answered with HTTP 503")
+    parser.add_argument('--review-ratio', type=float, default=defaults.review_ratio,
+                        help="share of products with a reviews widget")
+    parser.add_argument('--review-delay-ms', type=int, default=defaults.review_delay_ms,
+                        help="delay before the reviews widget renders")
+    parser.add_argument('--seed', type=int, default=defaults.seed, help="seed of the synthetic catalogue")
+    parser.add_argument('--report', default=None, metavar='RESULTS.json', help="also write the results as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the output of the crawls")
+    parser.add_argument('extra', nargs=argparse.REMAINDER,
+                        help="arguments after -- are passed to final.py in every scenario")
+    options = parser.parse_args(argv)
+    options.extra = [argument for argument in options.extra if argument != '--']
+    return options
+
+
+if __name__ == '__main__':
+    main(parse_args())
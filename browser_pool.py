@@ -0,0 +1,170 @@
+# Browser contexts for long crawls. Every worker leases its own context and page, and the pool swaps it for a
+# warm spare after a number of navigations or when the browser's memory crosses a threshold, so memory stays
+# flat over thousands of page loads. A crashed browser is relaunched and the worker carries on with a new lease.
+import os
+import asyncio
+from collections import Counter
+from instrumentation import TIMINGS
+
+# Page loads a context serves before it is closed and replaced
+RECYCLE_AFTER_NAVIGATIONS = 200
+# Resident memory (MB) of the browser processes above which every context is recycled (0 disables the check,
+# which is also skipped on systems without /proc)
+MAX_BROWSER_RSS_MB = 2048
+# The browser memory is read from /proc once every this many page loads
+MEMORY_CHECK_EVERY = 25
+# Contexts kept open and ready, so a recycle does not wait for a context and page to be created
+SPARE_CONTEXTS = 1
+
+
+def process_tree_rss(root_pid, skip_names=()):
+    # Resident memory (bytes) of a process and all its descendants, read from /proc. Processes whose
+    # command name starts with one of skip_names are not counted, their descendants still are. None when the
+    # memory is unknown, on systems without /proc (macOS, Windows).
+    if not os.path.isdir('/proc') or not hasattr(os, 'sysconf'):
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    children = {}
+    rss = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as file:
+                stat = file.read()
+        except OSError:
+            continue
+        command, fields = stat[stat.index('(') + 1:stat.rindex(')')], stat[stat.rindex(')') + 1:].split()
+        # Fields after the command name: state, ppid, ... rss (in pages) is the 22nd
+        children.setdefault(int(fields[1]), []).append(int(name))
+        rss[int(name)] = 0 if command.startswith(skip_names) else int(fields[21]) * page_size
+    total = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        total += rss.get(pid, 0)
+        pending += children.get(pid, [])
+    return total
+
+
+class Lease:
+    __slots__ = ('browser', 'context', 'page', 'navigations', 'generation')
+
+    def __init__(self, browser, context, page, generation):
+        self.browser = browser
+        self.context = context
+        self.page = page
+        self.navigations = 0
+        self.generation = generation
+
+
+class BrowserPool:
+    def __init__(self, browser, setup=None, recycle_after=RECYCLE_AFTER_NAVIGATIONS,
+                 max_rss_mb=MAX_BROWSER_RSS_MB, spares=SPARE_CONTEXTS):
+        self.browser = browser
+        self.launched = None
+        # Called with every new context, to install route handlers
+        self.setup = setup
+        self.recycle_after = recycle_after
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.spare_count = spares
+        self.spares = []
+        self.refill_task = None
+        # Bumped to retire every context opened before (memory threshold, browser restart)
+        self.generation = 0
+        self.navigations = 0
+        self.restart_lock = asyncio.Lock()
+        # recycled, memory_recycles, browser_restarts
+        self.stats = Counter()
+
+    async def new_lease(self):
+        browser = self.browser
+        context = await browser.new_context()
+        if self.setup is not None:
+            await self.setup(context)
+        return Lease(browser, context, await context.new_page(), self.generation)
+
+    async def acquire(self):
+        lease = None
+        while self.spares and lease is None:
+            lease = self.spares.pop()
+            if lease.generation != self.generation:
+                await self.release(lease)
+                lease = None
+        if lease is None:
+            lease = await self.new_lease()
+        self.refill()
+        return lease
+
+    def refill(self):
+        # Open the spares in the background
+        if self.spare_count and (self.refill_task is None or self.refill_task.done()):
+            self.refill_task = asyncio.create_task(self.fill_spares())
+
+    async def fill_spares(self):
+        while len(self.spares) < self.spare_count:
+            try:
+                self.spares.append(await self.new_lease())
+            except Exception:
+                # The browser is going away; acquire() opens contexts on demand meanwhile
+                return
+
+    async def release(self, lease):
+        try:
+            await lease.context.close()
+        except Exception:
+            # Context of a browser that crashed
+            pass
+
+    def browser_rss(self):
+        # The browser and its driver are children of this process, the Python workers of a process pool are not counted;
+        # None where the memory cannot be read, which leaves the threshold out
+        return process_tree_rss(os.getpid(), skip_names=('python',))
+
+    async def checkin(self, lease):
+        # Called after every page load: returns the lease to go on with, a fresh one when it was recycled
+        lease.navigations += 1
+        self.navigations += 1
+        if self.max_rss and self.navigations % MEMORY_CHECK_EVERY == 0 and (self.browser_rss() or 0) > self.max_rss:
+            # Every context is recycled at its next check-in
+            self.generation += 1
+            self.stats['memory_recycles'] += 1
+            TIMINGS.count('memory_recycles')
+        if lease.navigations >= self.recycle_after or lease.generation != self.generation:
+            self.stats['recycled'] += 1
+            TIMINGS.count('contexts_recycled')
+            fresh = await self.acquire()
+            await self.release(lease)
+            return fresh
+        return lease
+
+    def lost(self, lease):
+        # The browser crashed or the page was closed under the worker
+        return not lease.browser.is_connected() or lease.page.is_closed()
+
+    async def replace(self, lease):
+        # A new lease for a worker whose lease was lost, relaunching the browser if it crashed
+        async with self.restart_lock:
+            if lease.browser is self.browser and not self.browser.is_connected():
+                print("Browser crashed, launching a new one.")
+                self.browser = self.launched = await self.browser.browser_type.launch()
+                self.generation += 1
+                self.stats['browser_restarts'] += 1
+                TIMINGS.count('browser_restarts')
+        await self.release(lease)
+        return await self.acquire()
+
+    async def close(self):
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+        for lease in self.spares:
+            await self.release(lease)
+        self.spares = []
+        # A relaunched browser belongs to the pool, the first one to the caller
+        if self.launched is not None:
+            await self.launched.close()
+
+    def summary(self):
+        return (f"Contexts recycled {self.stats['recycled']} times "
+                f"({self.stats['memory_recycles']} memory threshold hits), "
+                f"browser restarted {self.stats['browser_restarts']} times.")
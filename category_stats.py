@@ -0,0 +1,146 @@
+# Per-category statistics kept across runs (products listed, share of them that changed, seconds per product
+# page) and the crawl plan drawn from them: categories ranked by expected changes per second of crawling,
+# large and small ones interleaved so parallel workers stay balanced, and an optional time budget.
+import time
+import sqlite3
+from collections import defaultdict
+from url_index import CATEGORY_SEPARATOR
+
+# Default location of the statistics database
+CATEGORY_STATS_PATH = 'category_stats.sqlite'
+# Weight of the latest run in the running averages
+SMOOTHING = 0.5
+# Assumed for a category never crawled, so it is explored early: every product changed
+DEFAULT_CHANGE_RATE = 1.0
+# Assumed seconds per product page and products per category before any run recorded them
+DEFAULT_PAGE_SECONDS = 3.0
+DEFAULT_PRODUCTS = 50
+
+
+def blend(old, new):
+    # Running average; None means not measured
+    if new is None:
+        return old
+    return new if old is None else (1 - SMOOTHING) * old + SMOOTHING * new
+
+
+class CategoryRun:
+    # Statistics of the current run, filled in while it goes
+    def __init__(self):
+        self.products = defaultdict(int)
+        self.scraped = defaultdict(int)
+        self.changed = defaultdict(int)
+        # Products scraped in incremental mode, the only ones where a change is known
+        self.compared = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def add_discovered(self, product_urls):
+        # (url, category) pairs as found by discovery, before deduplication
+        for url, category in product_urls:
+            if category:
+                self.products[category] += 1
+
+    def record(self, category, seconds, changed=None):
+        # One product page; a product listed under several categories counts for each of them, one found
+        # without a category (in the sitemap) for none
+        for name in filter(None, category.split(CATEGORY_SEPARATOR)):
+            self.scraped[name] += 1
+            self.seconds[name] += seconds
+            if changed is not None:
+                self.compared[name] += 1
+                self.changed[name] += bool(changed)
+
+
+class CategoryStatsStore:
+    def __init__(self, path=CATEGORY_STATS_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS categories (name TEXT PRIMARY KEY, products REAL, change_rate REAL, '
+            'page_seconds REAL, runs INTEGER, updated_at REAL)')
+        self.connection.commit()
+
+    def load(self):
+        return {name: {'products': products, 'change_rate': change_rate, 'page_seconds': page_seconds, 'runs': runs}
+                for name, products, change_rate, page_seconds, runs in self.connection.execute(
+                    'SELECT name, products, change_rate, page_seconds, runs FROM categories')}
+
+    def update(self, run):
+        # Fold the run into the running averages; what the run did not measure keeps its previous value
+        history = self.load()
+        now = time.time()
+        with self.connection:
+            for name in set(run.products) | set(run.scraped):
+                previous = history.get(name)
+                products = run.products[name] if name in run.products else None
+                change_rate = run.changed[name] / run.compared[name] if run.compared[name] else None
+                page_seconds = run.seconds[name] / run.scraped[name] if run.scraped[name] else None
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO categories VALUES (?, ?, ?, ?, ?, ?)',
+                    (name, blend(previous and previous['products'], products),
+                     blend(previous and previous['change_rate'], change_rate),
+                     blend(previous and previous['page_seconds'], page_seconds),
+                     (previous['runs'] if previous else 0) + 1, now))
+
+    def close(self):
+        self.connection.close()
+
+
+def estimates(categories, history):
+    # Products, change rate and seconds per page of every category, with defaults for the unknown ones
+    known = [history[name] for name in categories if name in history]
+
+    def typical(key, default):
+        values = [stats[key] for stats in known if stats[key] is not None]
+        return sum(values) / len(values) if values else default
+
+    fallback = {'products': typical('products', DEFAULT_PRODUCTS), 'change_rate': DEFAULT_CHANGE_RATE,
+                'page_seconds': typical('page_seconds', DEFAULT_PAGE_SECONDS)}
+    result = {}
+    for name in categories:
+        stats = history.get(name, {})
+        result[name] = {key: stats.get(key) if stats.get(key) is not None else value
+                        for key, value in fallback.items()}
+    return result
+
+
+def plan_categories(categories, history, budget=None, workers=1):
+    # (categories to crawl in order, categories left out by the time budget in seconds), for a crawl
+    # scraping product pages with this many workers
+    stats = estimates(categories, history)
+
+    def cost(name):
+        return stats[name]['products'] * stats[name]['page_seconds'] / workers
+
+    def value(name):
+        return stats[name]['products'] * stats[name]['change_rate']
+
+    # Most expected changes per second of crawling first, the largest first among equals
+    ranked = sorted(categories, key=lambda name: (-value(name) / max(cost(name), 1e-9), -stats[name]['products']))
+    chosen, skipped = [], []
+    spent = 0.0
+    for name in ranked:
+        if budget is not None and chosen and spent + cost(name) > budget:
+            skipped.append(name)
+        else:
+            chosen.append(name)
+            spent += cost(name)
+
+    # Alternate large and small categories, each half keeping its rank order
+    median = sorted(stats[name]['products'] for name in chosen)[len(chosen) // 2] if chosen else 0
+    large = [name for name in chosen if stats[name]['products'] >= median]
+    small = [name for name in chosen if stats[name]['products'] < median]
+    interleaved = []
+    for position in range(max(len(large), len(small))):
+        interleaved += large[position:position + 1] + small[position:position + 1]
+    return interleaved, skipped
+
+
+def order_product_urls(product_urls, categories):
+    # Scrape the products of the highest ranked categories first; a product takes its best ranked category
+    rank = {name: position for position, name in enumerate(categories)}
+
+    def best_rank(pair):
+        return min((rank.get(name, len(rank)) for name in pair[1].split(CATEGORY_SEPARATOR)), default=len(rank))
+
+    return sorted(product_urls, key=best_rank)
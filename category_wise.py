@@ -1,127 +1,81 @@
-import random
 import asyncio
 from playwright.async_api import async_playwright
+from final import (perform_request_with_retry, get_product_urls, results_signature, wait_for_results_change,
+                   filter_products_parallel)
+from request_scheduler import ACTION_TIMEOUT
+from url_index import deduplicate_product_urls
 
-async def perform_request_with_retry(page, url):
-    # set maximum retries
-    MAX_RETRIES = 5
-    # initialize retry counter
-    retry_count = 0
-
-    # loop until maximum retries are reached
-    while retry_count < MAX_RETRIES:
-        try:
-            # try to make request to the URL using the page object and a timeout of 30 seconds
-            await page.goto(url, timeout=150000)
-            # break out of the loop if the request was successful
-            break
-        except:
-            # if an exception occurs, increment the retry counter
-            retry_count += 1
-            # if maximum retries have been reached, raise an exception
-            if retry_count == MAX_RETRIES:
-                raise Exception("Request timed out")
-            # wait for a random amount of time between 1 and 5 seconds before retrying
-            await asyncio.sleep(random.uniform(1, 5))
-
-async def get_product_urls(browser, page):
-    product_urls = []
-
-    # Loop through all pages
-    while True:
-        # Select all elements with the product urls
-        all_items = await page.query_selector_all('.adept-product-display__title-container')
-        # Loop through each item and extract the href attribute
-        for item in all_items:
-            url = await item.get_attribute('href')
-            product_urls.append(url)
-
-        num_products = len(product_urls)
-        print(f"Scraped {num_products} products.")
-
-        next_button = await page.query_selector('.adept-pagination__item:not(.adept-pagination__disabled) a[aria-label="Go to next page"]')
-        if not next_button:
-            break  # Exit the loop if there is no next button
-
-        # Click the next button with retry mechanism and delay
-        retry_count = 0
-        MAX_RETRIES = 5
-        while retry_count < MAX_RETRIES:
-            try:
-                await next_button.click()
-                await page.wait_for_selector('.adept-product-display__title-container', timeout=800000)
-                await asyncio.sleep(random.uniform(2, 5)) # add a delay
-                break
-            except:
-                retry_count += 1
-                if retry_count == MAX_RETRIES:
-                    raise Exception("Clicking next button timed out")
-                await asyncio.sleep(random.uniform(1, 3))
+# Number of categories discovered at the same time, each in its own browser context
+DISCOVERY_CONCURRENCY = 4
 
-    return product_urls
+# Search page the categories are filtered on
+SEARCH_URL = 'https://www.decathlon.com/search?q=Sports+Gear+%26+Apparel'
 
+# Define a list of checkbox labels to select and clear (each label once)
+CHECKBOX_LABELS = ["Shorts", "T-Shirt", "Hardbait", "Backpack", "Base Layer", "Basketball", "Bikini Bottom", "Bikini Top", "Boardshorts", "Cap",
+                   "Cycling Shorts", "Fleece", "Flip-Flops", "Gloves", "Hooks", "Jacket", "Long-Sleeved T-Shirt",
+                   "Lure", "One-Piece Swimsuit", "Shoes", "Short-Sleeved Jersey",  "Socks", "Sport Bag",
+                   "Sports Bra", "Sweatshirt", "Tennis Racquet/Racket", "Top", "Trousers/Pants",
+                   "Water Bottle", "Leggings"]
 
 
 async def filter_products(browser, page):
     # Expand the product category section
     category_button = await page.query_selector('.adept-filter-list__title[aria-label="product category Filter"]')
-    await category_button.click(timeout=600000)
+    await category_button.click(timeout=ACTION_TIMEOUT)
     category_text_element = await category_button.query_selector('.adept-filter__list__title__text')
     category_text = await category_text_element.inner_text()
     print(category_text)
     is_expanded = await category_button.get_attribute('aria-expanded')
     if is_expanded == 'false':
-        await category_button.click(timeout=600000)
+        await category_button.click(timeout=ACTION_TIMEOUT)
         print("Category section expanded.")
     else:
         print("Category section is already expanded.")
 
     # Click the "Show All" button to show all categories
     show_all_button = await page.query_selector('.adept-filter__checkbox__show-toggle')
-    await show_all_button.click(timeout=600000)
+    await show_all_button.click(timeout=ACTION_TIMEOUT)
     show_all_text = await show_all_button.text_content()
     print(show_all_text)
     if show_all_text == 'Show All':
-        await show_all_button.click(timeout=600000)
+        await show_all_button.click(timeout=ACTION_TIMEOUT)
         print('not expanded')
     else:
         pass
         print('expanded')
 
     # Wait for the category list to load
-    await page.wait_for_selector('.adept-checkbox__input-container', timeout=800000)
-
-    # Define a list of checkbox labels to select and clear
-    checkbox_labels = ["Shorts", "T-Shirt", "Hardbait", "Backpack", "Base Layer", "Basketball", "Bikini Bottom", "Bikini Top", "Boardshorts", "Cap",
-                       "Cycling Shorts", "Fleece", "Flip-Flops", "Gloves", "Hooks", "Jacket", "Long-Sleeved T-Shirt",
-                       "Lure", "One-Piece Swimsuit", "Shoes", "Short-Sleeved Jersey",  "Socks", "Sport Bag",
-                       "Sports Bra", "Sweatshirt", "T-Shirt", "Tennis Racquet/Racket", "Top", "Trousers/Pants",
-                       "Water Bottle", "Shorts", "Leggings"]
+    await page.wait_for_selector('.adept-checkbox__input-container', timeout=ACTION_TIMEOUT)
 
     product_urls = []
 
     # Iterate over the list of checkboxes to select and clear
-    for label in checkbox_labels:
+    for label in CHECKBOX_LABELS:
+        # Remember the current results to detect when the filtered ones are shown
+        signature = await results_signature(page)
         # Select the checkbox
         checkbox = await page.query_selector(f'label.adept-checkbox__label:has-text("{label}")')
-        await checkbox.click(timeout=2000000)
+        await checkbox.click(timeout=ACTION_TIMEOUT)
         is_checked = await checkbox.get_attribute('aria-checked')
         if is_checked == 'false':
-            await checkbox.click(timeout=2000000)
+            await checkbox.click(timeout=ACTION_TIMEOUT)
             print(f"{label} checkbox not clicked.")
         else:
             print(f"{label} checkbox is already checked.")
-        await asyncio.sleep(60)
+        # Wait for the filtered results to load
+        await wait_for_results_change(page, signature)
 
         # Get the list of product URLs
-        product_urls += await get_product_urls(browser, page)
+        product_urls += [(url, label) for url in await get_product_urls(browser, page)]
 
         # Clear the checkbox filter
+        signature = await results_signature(page)
         clear_filter_button = await page.query_selector(
             f'button.adept-selection-list__close[aria-label="Clear {label.lower()} Filter"]')
-        await clear_filter_button.click(timeout=800000)
+        await clear_filter_button.click(timeout=ACTION_TIMEOUT)
         print(f"{label} filter cleared.")
-        await asyncio.sleep(10)
+        await wait_for_results_change(page, signature)
 
     return product_urls
 
@@ -130,11 +84,19 @@ async def main():
     # Launch a Firefox browser using Playwright
     async with async_playwright() as pw:
         browser = await pw.firefox.launch()
-        page = await browser.new_page()
 
-        # Make a request to the Amazon search page and extract the product URLs
-        await perform_request_with_retry(page, 'https://www.decathlon.com/search?q=Sports+Gear+%26+Apparel')
-        product_urls = await filter_products(browser, page)
+        if DISCOVERY_CONCURRENCY > 1:
+            # Crawl the categories side by side, each in its own browser context
+            product_urls = await filter_products_parallel(browser, SEARCH_URL, CHECKBOX_LABELS, DISCOVERY_CONCURRENCY)
+        else:
+            page = await browser.new_page()
+
+            # Make a request to the Decathlon search page and extract the product URLs
+            await perform_request_with_retry(page, SEARCH_URL)
+            product_urls = await filter_products(browser, page)
+
+        # Keep one canonical URL per product
+        product_urls = [url for url, labels in deduplicate_product_urls(product_urls)]
 
         # Print the list of URLs
         print(product_urls)
@@ -0,0 +1,77 @@
+# On-disk checkpoint of a crawl: the (url, category) list found by filter_products and every finished
+# product row, so an interrupted run can resume where it stopped. A pipelined run saves the list as discovery
+# grows it and marks discovery as running until it is complete.
+import json
+import sqlite3
+
+# Default location of the checkpoint database
+CHECKPOINT_PATH = 'crawl_checkpoint.sqlite'
+
+
+class CheckpointStore:
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # WAL keeps the per-row commits cheap and readable while the crawl is writing
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS product_urls (position INTEGER PRIMARY KEY, url TEXT, category TEXT)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS products (position INTEGER PRIMARY KEY, url TEXT, row TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT)')
+        self.connection.commit()
+
+    def clear(self):
+        # Forget the previous crawl
+        with self.connection:
+            self.connection.execute('DELETE FROM product_urls')
+            self.connection.execute('DELETE FROM products')
+            self.connection.execute('DELETE FROM state')
+
+    def set_discovery_complete(self, complete):
+        # A pipelined run marks its discovery as running, the URL list is partial until it is complete
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO state VALUES (?, ?)',
+                                    ('discovery', 'complete' if complete else 'running'))
+
+    def discovery_complete(self):
+        found = self.connection.execute("SELECT value FROM state WHERE name = 'discovery'").fetchone()
+        return found is None or found[0] == 'complete'
+
+    def save_product_urls(self, product_urls):
+        # Replace the discovered URL list; positions identify the products in the rows table
+        with self.connection:
+            self.connection.execute('DELETE FROM product_urls')
+            self.connection.executemany('INSERT INTO product_urls VALUES (?, ?, ?)',
+                                        [(position, url, category)
+                                         for position, (url, category) in enumerate(product_urls)])
+
+    def save_product_url(self, position, url, category):
+        # Add a product found by a pipelined discovery, or update the categories of one found before
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO product_urls VALUES (?, ?, ?)', (position, url, category))
+
+    def load_product_urls(self):
+        # The discovered (url, category) list, or None when nothing was discovered; partial while
+        # discovery_complete() is False
+        rows = self.connection.execute('SELECT url, category FROM product_urls ORDER BY position').fetchall()
+        return [(url, category) for url, category in rows] or None
+
+    def save_row(self, position, row):
+        # Rows hold dicts and lists, JSON keeps them intact; None marks a product finished without a row
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO products VALUES (?, ?, ?)',
+                                    (position, row[0] if row else None,
+                                     json.dumps(None if row is None else list(row))))
+
+    def load_rows(self):
+        # Finished rows by position
+        rows = {}
+        for position, row in self.connection.execute('SELECT position, row FROM products'):
+            row = json.loads(row)
+            rows[position] = None if row is None else tuple(row)
+        return rows
+
+    def close(self):
+        self.connection.close()
@@ -3,6 +3,8 @@ import random
 import asyncio
 import pandas as pd
 from playwright.async_api import async_playwright
+from final import present_late_fields
+from product_fields import LATE_FIELDS
 
 
 async def perform_request_with_retry(page, url):
@@ -93,8 +95,12 @@ async def get_brand_name(page):
 
 async def get_star_rating(page):
     try:
+        # Products without reviews have no rating: do not wait for it
+        if not await present_late_fields(page, ['star_rating']):
+            return "Not Available"
         # Find the star rating element and get its text content
-        star_rating_elem = await page.wait_for_selector(".de-StarRating-fill + .de-u-hiddenVisually")
+        star_rating_elem = await page.wait_for_selector(".de-StarRating-fill + .de-u-hiddenVisually",
+                                                        timeout=LATE_FIELDS['star_rating']['wait'])
         star_rating_text = await star_rating_elem.inner_text()
         star_rating = star_rating_text.split(" ")[2]
     except:
@@ -106,8 +112,11 @@ async def get_star_rating(page):
 
 async def get_num_reviews(page):
     try:
+        if not await present_late_fields(page, ['number_of_reviews']):
+            return "Not Available"
         # Find the number of reviews element and get its text content
-        num_reviews_elem = await page.wait_for_selector("span.de-u-textMedium.de-u-textSelectNone.de-u-textBlue")
+        num_reviews_elem = await page.wait_for_selector("span.de-u-textMedium.de-u-textSelectNone.de-u-textBlue",
+                                                        timeout=LATE_FIELDS['number_of_reviews']['wait'])
         num_reviews = await num_reviews_elem.inner_text()
         num_reviews = num_reviews.split(" ")[0]
     except:
@@ -1,142 +1,369 @@
-import random
 import asyncio
-import pandas as pd
-from playwright.async_api import async_playwright
+import json
+import queue
+import multiprocessing
+import hashlib
+import argparse
+from collections import Counter
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qs, urlencode
+from concurrent.futures import ProcessPoolExecutor
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from product_fields import (COLUMNS, FIELD_SPECS, FIELD_NAMES, LATE_FIELDS, LATE_FIELD_WAIT, PROBE_WAIT,
+                            REVIEWS_BLOCK, TILE_SELECTOR, TILE_SPECS, EXTRACT_FIELDS_JS, FINGERPRINT_JS, HARVEST_TILES_JS,
+                            PROBE_FIELDS_JS, browser_specs, fingerprint_specs, postprocess_fields, probe_specs,
+                            set_field_waits, set_probe_wait)
+from checkpoint import CHECKPOINT_PATH, CheckpointStore
+from url_index import deduplicate_product_urls
+from resource_blocking import BLOCKED_RESOURCE_TYPES, DENIED_URL_PATTERNS, ResourceBlocker
+from response_cache import CACHE_DIR, CACHE_TTL, CACHE_MAX_BYTES, ResponseCache
+from snapshot import SNAPSHOT_PATH, NEW, CHANGED, REMOVED, SnapshotStore
+from sinks import BATCH_SIZE, SINKS, OrderedWriter, open_sink
+from instrumentation import TIMINGS
+from category_stats import (CATEGORY_STATS_PATH, CategoryRun, CategoryStatsStore, order_product_urls,
+                            plan_categories)
+from browser_pool import RECYCLE_AFTER_NAVIGATIONS, MAX_BROWSER_RSS_MB, BrowserPool
+from pipeline import DETAIL_QUEUE_SIZE, DiscoveryFeed, WorkQueue
+from tile_harvest import TILE_STATE_PATH, TileStore, harvest_rows, row_prices, tiles_by_url
+from shopify_backend import JSON_FALLBACK, ShopifyFetcher
+from sitemap_discovery import PRODUCT_SITEMAPS, SITEMAP_STATE_PATH, SitemapState, discover_from_sitemap
+from request_scheduler import (ACTION_TIMEOUT, NAVIGATION_TIMEOUT, MAX_ATTEMPTS, ExtractionFailure, FetchFailure,
+                               RequestScheduler, default_scheduler, describe, set_default_scheduler)
 
-async def perform_request_with_retry(page, url):
-    # set maximum retries
-    MAX_RETRIES = 5
-    # initialize retry counter
-    retry_count = 0
+# Number of product pages scraped at the same time
+CONCURRENCY = 4
+# Maximum number of page loads per second sent to a single host
+MAX_REQUESTS_PER_SECOND_PER_HOST = 2.0
+# Times a failed product goes back to the end of the queue before it is given up
+MAX_REQUEUES = 2
+# Number of crawl processes, each with its own browser, the product pages are sharded over (1 = no sharding)
+PROCESSES = 1
+# Number of categories discovered at the same time, each in its own browser context
+DISCOVERY_CONCURRENCY = 4
+# How result pages are walked: 'url' fetches them concurrently by URL (after checking page 2 by URL shows what
+# clicking shows, so the page links keep the category filter), 'click' clicks "Go to next page"
+PAGINATION = 'url'
+# Query parameter holding the result page number in the pagination links
+PAGE_PARAM = 'page'
+# Number of result pages of one category fetched at the same time
+PAGINATION_CONCURRENCY = 4
+# Longest time (ms) to wait for the result grid to change after a filter is applied or cleared
+RESULTS_READY_TIMEOUT = 30000
 
-    # loop until maximum retries are reached
-    while retry_count < MAX_RETRIES:
+# Decathlon search page the categories are filtered on
+SEARCH_URL = 'https://www.decathlon.com/search?SOLD_OUT=%7B%22label_text%22%3A%22SOLD_OUT%22%2C%22value%22%3A%7B%22%24eq%22%3A%22FALSE%22%7D%7D&query_history=%5B%22Apparel%22%5D&q=Apparel&category_history=%5B%5D&sorting=NATURAL|desc'
+
+# Checkbox labels of the product categories to scrape
+CATEGORIES = ["Base Layer", "Cap", "Cropped Leggings", "Cycling Shorts", "Fleece", "Gloves", "Legging 7/8",
+              "Long-Sleeved T-Shirt", "Padded Jacket", "Short-Sleeved Jersey", "Down Jacket", "Socks",
+              "Sports Bra", "Sweatshirt", "Tank", "Tracksuit", "Trousers/Pants", "Windbreaker", "Zip-Off Pants",
+              "Shoes", "Sunglasses","Sport Bag", "Fitness Mat", "Shorts", "T-Shirt", "Jacket", "Leggings"]
+
+# Product links currently shown in the search result grid
+RESULT_HREFS_JS = """
+() => Array.from(document.querySelectorAll('.adept-product-display__title-container'),
+                 item => item.getAttribute('href'))
+"""
+# Links of the pagination bar: absolute href, aria-label and visible text (the page number)
+PAGINATION_LINKS_JS = """
+() => Array.from(document.querySelectorAll('.adept-pagination__item a'),
+                 link => ({href: link.href || null, label: link.getAttribute('aria-label'),
+                           text: link.textContent.trim()}))
+"""
+# Same links joined into one string, used to detect when the grid re-renders
+RESULTS_SIGNATURE_JS = """
+() => Array.from(document.querySelectorAll('.adept-product-display__title-container'),
+                 item => item.getAttribute('href')).join('\\n')
+"""
+# True once the grid shows products and they differ from the signature taken before the click
+RESULTS_CHANGED_JS = """
+(signature) => {
+    const hrefs = Array.from(document.querySelectorAll('.adept-product-display__title-container'),
+                             item => item.getAttribute('href'));
+    return hrefs.length > 0 && hrefs.join('\\n') !== signature;
+}
+"""
+
+
+async def perform_request_with_retry(page, url, scheduler=None, ready_selector=None):
+    # Load the page through the shared scheduler: bounded attempts with backoff, failures raised as FetchFailure
+    return await (scheduler or default_scheduler()).goto(page, url, ready_selector)
+
+
+async def results_signature(page):
+    return await page.evaluate(RESULTS_SIGNATURE_JS)
+
+
+async def wait_for_results_change(page, signature, timeout=RESULTS_READY_TIMEOUT):
+    # Wait for the result grid to re-render instead of sleeping a fixed time, return the seconds waited
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        with TIMINGS.stage('results_wait'):
+            await page.wait_for_function(RESULTS_CHANGED_JS, arg=signature, timeout=timeout)
+    except PlaywrightTimeoutError:
+        # Same products before and after (or a very slow search): carry on after the ceiling
+        print(f"Result grid did not change within {timeout / 1000:.0f} s.")
+    return loop.time() - start
+
+
+def result_page_urls(links, page_param=PAGE_PARAM):
+    # Work out the URL of every result page from the pagination links, or None when the links carry no page URLs
+    numbers = [int(link['text']) for link in links if link['text'].isdigit()]
+    template = next((link['href'] for link in links
+                     if link['href'] and page_param in parse_qs(urlsplit(link['href']).query)), None)
+    if template is None or not numbers:
+        return None
+
+    # Swap the page number in the query string of one of the links
+    parts = urlsplit(template)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    urls = []
+    for number in range(2, max(numbers) + 1):
+        query[page_param] = [str(number)]
+        urls.append(urlunsplit(parts._replace(query=urlencode(query, doseq=True))))
+    return urls
+
+
+async def read_result_page(page, tiles=None):
+    # Product links of the result grid in a single call. With a tiles dict, the fields of every tile are read
+    # in a second call and stored in it by link; the links always come from the grid, so a tile the tile
+    # selectors miss only sends its product to a product page visit.
+    hrefs = await page.evaluate(RESULT_HREFS_JS)
+    if tiles is not None:
+        for raw in await page.evaluate(HARVEST_TILES_JS, [TILE_SELECTOR, browser_specs(TILE_SPECS)]):
+            if raw['product_url']:
+                tiles[raw['product_url']] = postprocess_fields(raw, TILE_SPECS)
+    return hrefs
+
+
+async def fetch_result_page_hrefs(context, url, semaphore, tiles=None, scheduler=None, last=False):
+    # Load one result page in its own tab and read all of its product links at once. The pagination bar can
+    # show only a window of page numbers, so on the last page it showed, the next pages are clicked through
+    # while "Go to next page" is enabled.
+    async with semaphore:
+        page = await context.new_page()
         try:
-            # try to make request to the URL using the page object and a timeout of 30 seconds
-            await page.goto(url, timeout=1000000)
-            # break out of the loop if the request was successful
-            break
-        except:
-            # if an exception occurs, increment the retry counter
-            retry_count += 1
-            # if maximum retries have been reached, raise an exception
-            if retry_count == MAX_RETRIES:
-                raise Exception("Request timed out")
-            # wait for a random amount of time between 1 and 5 seconds before retrying
-            await asyncio.sleep(random.uniform(1, 10))
+            with TIMINGS.stage('result_page', url):
+                await perform_request_with_retry(page, url, scheduler,
+                                                 ready_selector='.adept-product-display__title-container')
+                if last:
+                    return await get_product_urls_by_click(page, scheduler, tiles)
+                return await read_result_page(page, tiles)
+        finally:
+            await page.close()
 
 
-async def get_product_urls(browser, page):
+async def fetch_result_pages(context, urls, semaphore, tiles=None, scheduler=None):
+    # Product links of the result pages at urls, fetched concurrently, in page order
+    pages = await asyncio.gather(*(fetch_result_page_hrefs(context, url, semaphore, tiles, scheduler,
+                                                           last=position == len(urls) - 1)
+                                   for position, url in enumerate(urls)))
+    return [href for hrefs in pages for href in hrefs]
+
+
+async def get_product_urls_by_url(page, concurrency=PAGINATION_CONCURRENCY, tiles=None, scheduler=None):
+    # Read the first page, then fetch the remaining result pages concurrently; None if they have no URLs, or
+    # if the page URLs lose the category filter ticked in the UI (the pages are then clicked through)
+    links = await page.evaluate(PAGINATION_LINKS_JS)
+    urls = result_page_urls(links)
+    if urls is None and any(link['label'] == "Go to next page" for link in links):
+        return None
+
+    product_urls = await read_result_page(page, tiles)
+    if urls:
+        semaphore = asyncio.Semaphore(concurrency)
+        # Page 2 fetched by URL must show the products clicking "Go to next page" shows
+        by_url = await fetch_result_page_hrefs(page.context, urls[0], semaphore, scheduler=scheduler)
+        if not await click_next_page(page, scheduler):
+            # No next button to check the page URLs against: fetch them as they are
+            product_urls += await fetch_result_pages(page.context, urls, semaphore, tiles, scheduler)
+        elif by_url != await page.evaluate(RESULT_HREFS_JS):
+            print("Page URLs do not keep the category filter, clicking through the pages instead.")
+            return product_urls + await get_product_urls_by_click(page, scheduler, tiles)
+        elif len(urls) == 1:
+            # Page 2 is the last page the bar showed: carry on clicking if it still has a next page
+            product_urls += await get_product_urls_by_click(page, scheduler, tiles)
+        else:
+            product_urls += await read_result_page(page, tiles)
+            product_urls += await fetch_result_pages(page.context, urls[1:], semaphore, tiles, scheduler)
+
+    print(f"Scraped {len(product_urls)} products from {len(urls or []) + 1} result pages.")
+    return product_urls
+
+
+async def click_next_page(page, scheduler=None):
+    # Click "Go to next page" and wait for the next results; False on the last page
+    next_button = await page.query_selector('.adept-pagination__item:not(.adept-pagination__disabled) a[aria-label="Go to next page"]')
+    if not next_button:
+        return False
+
+    # Click the next button through the scheduler: bounded waits, backoff between attempts
+    async def go_to_next_page():
+        # Remember the current results to detect when the next page is shown
+        signature = await results_signature(page)
+        # Click the next button
+        await next_button.click(timeout=ACTION_TIMEOUT)
+        # Wait for the next page to render
+        await page.wait_for_function(RESULTS_CHANGED_JS, arg=signature, timeout=RESULTS_READY_TIMEOUT)
+
+    with TIMINGS.stage('pagination_click'):
+        await (scheduler or default_scheduler()).run(page.url, go_to_next_page)
+    return True
+
+
+async def get_product_urls_by_click(page, scheduler=None, tiles=None):
     product_urls = []
 
     # Loop through all pages
     while True:
-        # Find all elements with the product urls
-        all_items = await page.querySelectorAll('.adept-product-display__title-container')
-        
-        # Extract the href attribute for each item and append to product_urls list
-        for item in all_items:
-            url = await item.getAttribute('href')
-            product_urls.append(url)
+        # Extract the href of every product in a single call and append to product_urls list
+        product_urls += await read_result_page(page, tiles)
 
         num_products = len(product_urls)
         print(f"Scraped {num_products} products.")
-        
-        # Find the next button
-        next_button = await page.querySelector('.adept-pagination__item:not(.adept-pagination__disabled) a[aria-label="Go to next page"]')
-        
-        # Exit the loop if there is no next button
-        if not next_button:
-            break  
 
-        # Click the next button with retry mechanism and delay
-        MAX_RETRIES = 5
-        for retry_count in range(MAX_RETRIES):
-            try:
-                # Click the next button
-                await next_button.click()
-                # Wait for the next page to load
-                await page.waitForSelector('.adept-product-display__title-container', timeout=800000)
-                # Add a delay
-                await asyncio.sleep(random.uniform(2, 5))
-                # Break out of the loop if successful
-                break
-            except:
-                # If an exception occurs, retry up to MAX_RETRIES times
-                if retry_count == MAX_RETRIES - 1:
-                    raise Exception("Clicking next button timed out")
-                # Wait for a random amount of time between 1 and 3 seconds before retrying
-                await asyncio.sleep(random.uniform(1, 3))
+        # Exit the loop if there is no next button
+        if not await click_next_page(page, scheduler):
+            break
 
     return product_urls
 
 
-async def filter_products(browser, page):
+async def get_product_urls(browser, page, pagination=PAGINATION, tiles=None):
+    # Prefer fetching the result pages by URL, fall back to clicking "Go to next page". With a tiles dict,
+    # the fields of every tile are harvested along the way.
+    if pagination == 'url':
+        product_urls = await get_product_urls_by_url(page, tiles=tiles)
+        if product_urls is not None:
+            return product_urls
+        print("Pagination links carry no page URLs, clicking through the pages instead.")
+    return await get_product_urls_by_click(page, tiles=tiles)
+
+
+async def open_category_filter(page):
     # Expand the product category section
     category_button = await page.query_selector('.adept-filter-list__title[aria-label="product category Filter"]')
-    await category_button.click(timeout=600000)
+    await category_button.click(timeout=ACTION_TIMEOUT)
     # Check if category section is already expanded
     is_expanded = await category_button.get_attribute('aria-expanded')
     if is_expanded == 'false':
-        await category_button.click(timeout=600000)
+        await category_button.click(timeout=ACTION_TIMEOUT)
     else:
         pass
 
     # Click the "Show All" button to show all categories
     show_all_button = await page.query_selector('.adept-filter__checkbox__show-toggle')
-    await show_all_button.click(timeout=400000)
+    await show_all_button.click(timeout=ACTION_TIMEOUT)
     # Check if "Show All" button is already clicked
     show_all_text = await show_all_button.text_content()
     if show_all_text == 'Show All':
-        await show_all_button.click(timeout=400000)
+        await show_all_button.click(timeout=ACTION_TIMEOUT)
     else:
         pass
 
     # Wait for the category list to load
-    await page.wait_for_selector('.adept-checkbox__input-container', timeout=400000)
+    await page.wait_for_selector('.adept-checkbox__input-container', timeout=ACTION_TIMEOUT)
+
+
+async def apply_category(page, category, ready_timeout=RESULTS_READY_TIMEOUT):
+    # Remember the current results to detect when the filtered ones are shown
+    signature = await results_signature(page)
+    # Select the checkbox
+    checkbox = await page.query_selector(f'label.adept-checkbox__label:has-text("{category}")')
+    await checkbox.click(timeout=ACTION_TIMEOUT)
+    # Check if checkbox is already selected
+    is_checked = await checkbox.get_attribute('aria-checked')
+    if is_checked == 'false':
+        await checkbox.click(timeout=ACTION_TIMEOUT)
+    else:
+        print(f"{category} checkbox is checked.")
+    # Wait for the filtered results to load
+    return await wait_for_results_change(page, signature, ready_timeout)
+
+
+async def clear_category(page, category, ready_timeout=RESULTS_READY_TIMEOUT):
+    # Clear the checkbox filter
+    signature = await results_signature(page)
+    clear_filter_button = await page.query_selector(
+        f'button.adept-selection-list__close[aria-label="Clear {category.lower()} Filter"]')
+    if clear_filter_button is not None:
+        await clear_filter_button.click(timeout=ACTION_TIMEOUT)
+        print(f"{category} filter cleared.")
+    else:
+        clear_buttons = await page.query_selector_all('button[aria-label^="Clear"]')
+        for button in clear_buttons:
+            await button.click(timeout=ACTION_TIMEOUT)
+            print(f"{category} filter cleared.")
+    # Wait for the unfiltered results to load
+    return await wait_for_results_change(page, signature, ready_timeout)
+
 
-    # Define a list of checkbox labels to select and clear
-    categories = ["Base Layer", "Cap", "Cropped Leggings", "Cycling Shorts", "Fleece", "Gloves", "Legging 7/8",
-                  "Long-Sleeved T-Shirt", "Padded Jacket", "Short-Sleeved Jersey", "Down Jacket", "Socks",
-                  "Sports Bra", "Sweatshirt", "Tank", "Tracksuit", "Trousers/Pants", "Windbreaker", "Zip-Off Pants",
-                  "Shoes", "Sunglasses","Sport Bag", "Fitness Mat", "Shorts", "T-Shirt", "Jacket", "Leggings"]
+async def filter_products(browser, page, ready_timeout=RESULTS_READY_TIMEOUT, categories=CATEGORIES,
+                          pagination=PAGINATION, found=None, tiles=None):
+    # found(pairs), when given, receives the pairs of every category as soon as it is crawled; tiles, when
+    # given, the fields of every result tile
+    await open_category_filter(page)
 
     product_urls = []
+    # Total time spent waiting for the result grid
+    waited = 0
 
     # Iterate over the list of category to select and clear
     for category in categories:
-        # Select the checkbox
-        checkbox = await page.query_selector(f'label.adept-checkbox__label:has-text("{category}")')
-        await checkbox.click(timeout=600000)
-        # Check if checkbox is already selected
-        is_checked = await checkbox.get_attribute('aria-checked')
-        if is_checked == 'false':
-            await checkbox.click(timeout=600000)
-        else:
-            print(f"{category} checkbox is checked.")
-        # Wait for the page to load
-        await asyncio.sleep(10)
+        with TIMINGS.stage('filter_apply'):
+            waited += await apply_category(page, category, ready_timeout)
 
         # Get the list of product URLs
-        product_urls += [(url, category) for url in await get_product_urls(browser, page)]
+        with TIMINGS.stage('category_pages'):
+            pairs = [(url, category) for url in await get_product_urls(browser, page, pagination, tiles)]
+        product_urls += pairs
+        if found is not None:
+            await found(pairs)
 
-        # Clear the checkbox filter
-        clear_filter_button = await page.query_selector(
-            f'button.adept-selection-list__close[aria-label="Clear {category.lower()} Filter"]')
-        if clear_filter_button is not None:
-            await clear_filter_button.click(timeout=600000)
-            print(f"{category} filter cleared.")
-        else:
-            clear_buttons = await page.query_selector_all('button[aria-label^="Clear"]')
-            for button in clear_buttons:
-                await button.click(timeout=600000)
-                print(f"{category} filter cleared.")
-        # Wait for the page to load
-        await asyncio.sleep(10)
+        with TIMINGS.stage('filter_clear'):
+            waited += await clear_category(page, category, ready_timeout)
 
+    print(f"Waited {waited:.1f} s for search results across {len(categories)} categories.")
     return product_urls
 
 
+async def discover_category(browser, category, search_url=SEARCH_URL, ready_timeout=RESULTS_READY_TIMEOUT,
+                            pagination=PAGINATION, cache=None, tiles=None):
+    # Crawl one category in a fresh browser context: open the search page, tick the category, page through it
+    context = await browser.new_context()
+    if cache is not None:
+        await cache.install(context)
+    try:
+        page = await context.new_page()
+        await perform_request_with_retry(page, search_url)
+        await open_category_filter(page)
+        with TIMINGS.stage('filter_apply'):
+            await apply_category(page, category, ready_timeout)
+        with TIMINGS.stage('category_pages'):
+            return [(url, category) for url in await get_product_urls(browser, page, pagination, tiles)]
+    finally:
+        await context.close()
+
+
+async def filter_products_parallel(browser, search_url=SEARCH_URL, categories=CATEGORIES,
+                                   max_contexts=DISCOVERY_CONCURRENCY, ready_timeout=RESULTS_READY_TIMEOUT,
+                                   pagination=PAGINATION, cache=None, found=None, tiles=None):
+    # At most max_contexts categories are crawled at once, each in its own context; found(pairs), when given,
+    # receives the pairs of every category as soon as it is crawled
+    semaphore = asyncio.Semaphore(max_contexts)
+
+    async def discover(category):
+        async with semaphore:
+            pairs = await discover_category(browser, category, search_url, ready_timeout, pagination, cache, tiles)
+        if found is not None:
+            await found(pairs)
+        return pairs
+
+    # Results are concatenated in category order, like the serial filter_products
+    results = await asyncio.gather(*(discover(category) for category in categories))
+    return [pair for category_urls in results for pair in category_urls]
+
+
 async def get_product_name(page):
     try:
         # Find the product title element and get its text content
@@ -165,8 +392,12 @@ async def get_brand_name(page):
 
 async def get_star_rating(page):
     try:
+        # Products without reviews have no rating: do not wait for it
+        if not await present_late_fields(page, ['star_rating']):
+            return "Not Available"
         # Find the star rating element and get its text content
-        star_rating_elem = await page.wait_for_selector(".de-StarRating-fill + .de-u-hiddenVisually")
+        star_rating_elem = await page.wait_for_selector(".de-StarRating-fill + .de-u-hiddenVisually",
+                                                        timeout=LATE_FIELDS['star_rating']['wait'])
         star_rating_text = await star_rating_elem.inner_text()
         star_rating = star_rating_text.split(" ")[2]
     except:
@@ -178,10 +409,13 @@ async def get_star_rating(page):
 
 async def get_num_reviews(page):
     try:
+        if not await present_late_fields(page, ['number_of_reviews']):
+            return "Not Available"
         # Find the number of reviews element and get its text content
-        num_reviews_elem = await page.wait_for_selector("span.de-u-textMedium.de-u-textSelectNone.de-u-textBlue")
+        num_reviews_elem = await page.wait_for_selector("span.de-u-textMedium.de-u-textSelectNone.de-u-textBlue",
+                                                        timeout=LATE_FIELDS['number_of_reviews']['wait'])
         num_reviews = await num_reviews_elem.inner_text()
-        num_reviews = num_reviews.split(" ")[0]
+        num_reviews = num_reviews.split()[0]
     except:
         num_reviews = "Not Available"
 
@@ -272,56 +506,1004 @@ async def get_ProductInformation(page):
     return ProductInformation
 
 
-async def main():
+async def present_late_fields(page, names):
+    # The late fields among names whose widget block is on the page; the others will never render. A block
+    # missing at the load event gets a short wait, in case the widget script injects it.
+    global late_block_warned
+    with TIMINGS.stage('late_fields_probe', page.url):
+        present = await page.evaluate(PROBE_FIELDS_JS, probe_specs(names))
+        absent = [name for name in names if name not in present]
+        wait = max((LATE_FIELDS[name]['probe_wait'] for name in absent), default=0)
+        if wait:
+            selectors = sorted({selector for name in absent for selector in LATE_FIELDS[name]['probe']})
+            try:
+                await page.wait_for_selector(', '.join(selectors), state='attached', timeout=wait)
+            except Exception:
+                pass
+            else:
+                late = await page.evaluate(PROBE_FIELDS_JS, probe_specs(absent))
+                TIMINGS.count('late_blocks', len(late))
+                if late and not late_block_warned:
+                    late_block_warned = True
+                    print(f"The block of {', '.join(late)} showed up after the page load; products whose block "
+                          f"takes longer than --probe-wait get Not Available.")
+                present += late
+    late_probes['probed'] += len(names)
+    late_probes['missed'] += len(names) - len(present)
+    TIMINGS.count('late_fields_probed', len(names))
+    TIMINGS.count('late_fields_absent', len(names) - len(present))
+    return present
+
+
+# Whether a widget block was already seen showing up after the page load (reported once per run)
+late_block_warned = False
+# Late fields probed over the run and how many of them had no block, counted whether --timings is on or not
+late_probes = Counter()
+# Probes after which a block never found is reported as a likely wrong selector
+PROBE_MISS_WARNING = 20
+
+
+def late_fields_summary():
+    # A block missing on every product points at a wrong or too slow REVIEWS_BLOCK rather than at products
+    # without reviews; None when nothing looks wrong
+    if late_probes['probed'] >= PROBE_MISS_WARNING and late_probes['missed'] == late_probes['probed']:
+        return (f"Warning: the block of the late fields ({REVIEWS_BLOCK}) was not found for any of the "
+                f"{late_probes['probed']} late fields probed, so every rating and review count is Not Available. "
+                f"Check the selector, or raise --probe-wait if the widget renders later.")
+    return None
+
+
+async def wait_for_late_field(page, spec):
+    # Bounded wait for one late field, True when it showed up
+    if not spec['wait']:
+        return False
+    try:
+        await page.wait_for_selector(", ".join(spec['selectors']), timeout=spec['wait'])
+        return True
+    except Exception:
+        return False
+
+
+async def wait_for_late_fields(page, raw, names=LATE_FIELDS):
+    # Rating and reviews are rendered late by the reviews widget. Fields without their block on the page
+    # are missing right away; the others get their own bounded wait, all at the same time.
+    missing = [name for name in LATE_FIELDS if name in names and raw.get(name) is None]
+    if not missing:
+        return False
+    present = await present_late_fields(page, missing)
+    if not present:
+        return False
+    with TIMINGS.stage('late_fields_wait', page.url):
+        found = await asyncio.gather(*(wait_for_late_field(page, LATE_FIELDS[name]) for name in present))
+    return any(found)
+
+
+async def extract_product_fields(page):
+    # Read every field of FIELD_SPECS in a single browser round trip
+    specs = browser_specs()
+    raw = await page.evaluate(EXTRACT_FIELDS_JS, specs)
+    # Read again once the late fields have shown up
+    if await wait_for_late_fields(page, raw):
+        raw = await page.evaluate(EXTRACT_FIELDS_JS, specs)
+    return postprocess_fields(raw)
+
+
+async def extract_missing_fields(page, names):
+    # The fields the documents backend could not read, from the rendered page
+    specs = [spec for spec in FIELD_SPECS if spec['name'] in names]
+    raw = await page.evaluate(EXTRACT_FIELDS_JS, browser_specs(specs))
+    if await wait_for_late_fields(page, raw, names):
+        raw = await page.evaluate(EXTRACT_FIELDS_JS, browser_specs(specs))
+    return postprocess_fields(raw, specs)
+
+
+def html_extractor(executor=None):
+    # Fetch the rendered HTML once and parse it with lxml off the event loop (in a process pool when given)
+    from html_extract import extract_raw_fields_from_html
+
+    async def extract_product_fields_from_html(page):
+        loop = asyncio.get_running_loop()
+        raw = await loop.run_in_executor(executor, extract_raw_fields_from_html, await page.content())
+        if await wait_for_late_fields(page, raw):
+            raw = await loop.run_in_executor(executor, extract_raw_fields_from_html, await page.content())
+        return postprocess_fields(raw)
+
+    return extract_product_fields_from_html
+
+
+async def extract_product_fields_with_getters(page):
+    # Reference path: one getter (and several round trips) per field
+    getters = [get_product_name, get_brand_name, get_star_rating, get_num_reviews, get_MRP, get_sale_price,
+               get_colour, get_ProductInformation, get_Product_description]
+    fields = {}
+    for name, getter in zip(FIELD_NAMES, getters):
+        with TIMINGS.stage(f'getter:{name}', page.url):
+            fields[name] = await getter(page)
+    return fields
+
+
+# Field extraction strategies selectable from the command line ('html' parses page.content() in a process pool)
+EXTRACTORS = {
+    'evaluate': extract_product_fields,
+    'getters': extract_product_fields_with_getters,
+    'html': html_extractor,
+}
+
+
+async def page_fingerprint(page):
+    # Hash of the text of the page region the fields are read from and of the late fields, read once their
+    # widget has rendered or is known to be absent, so a new rating or review count is not skipped
+    text = await page.evaluate(FINGERPRINT_JS, fingerprint_specs())
+    late = await extract_missing_fields(page, list(LATE_FIELDS))
+    text += '\u0001' + json.dumps(late, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+async def read_step(url, step):
+    # Await one read of a loaded page; its errors fail the product, which is re-queued, instead of the run
+    try:
+        return await step
+    except FetchFailure:
+        raise
+    except Exception as error:
+        raise ExtractionFailure(url, describe(error)) from error
+
+
+async def scrape_product(page, url, category, scheduler=None, extractor=extract_product_fields, snapshot=None):
+    await perform_request_with_retry(page, url, scheduler)
+
+    # Incremental mode: skip the extraction when the page region is the same as in the previous snapshot
+    if snapshot is not None:
+        with TIMINGS.stage('fingerprint', url):
+            fingerprint = await read_step(url, page_fingerprint(page))
+        previous = snapshot.get(url)
+        if previous is not None and previous['fingerprint'] == fingerprint:
+            snapshot.touch(url)
+            return None
+
+    with TIMINGS.stage('extract', url):
+        fields = await read_step(url, extractor(page))
+    row = (url, category) + tuple(fields[name] for name in FIELD_NAMES)
+    if snapshot is None:
+        return row
+    return snapshot_delta(snapshot, url, fingerprint, row, previous)
+
+
+def snapshot_delta(snapshot, url, fingerprint, row, previous):
+    # Emit a delta row only when the extracted values differ from the snapshot
+    snapshot.put(url, fingerprint, row)
+    if previous is None:
+        return (NEW,) + row
+    if json.loads(json.dumps(list(row))) == list(previous['row']):
+        return None
+    return (CHANGED,) + row
+
+
+def fields_fingerprint(fields):
+    # Hash of the values of every field, late fields included
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+async def scrape_product_documents(fetcher, url, category, open_page, scheduler=None, snapshot=None):
+    # Documents backend: product.js and the page HTML over HTTP. open_page() is only called, for a page to
+    # render the product in, when the documents lack a field.
+    with TIMINGS.stage('documents', url):
+        fields, missing = await fetcher.product_fields(url)
+
+    # The fields the documents lack (rating and review count rendered by the widget) are read before the
+    # fingerprint is taken, so a change to them is never skipped
+    if missing:
+        page = await open_page()
+        await perform_request_with_retry(page, url, scheduler)
+        with TIMINGS.stage('extract', url):
+            fields.update(await read_step(url, extract_missing_fields(page, missing)))
+
+    if snapshot is not None:
+        fingerprint = fields_fingerprint(fields)
+        previous = snapshot.get(url)
+        if previous is not None and previous['fingerprint'] == fingerprint:
+            snapshot.touch(url)
+            return None
+
+    row = (url, category) + tuple(fields[name] for name in FIELD_NAMES)
+    if snapshot is None:
+        return row
+    return snapshot_delta(snapshot, url, fingerprint, row, previous)
+
+
+def product_context_setup(blocker=None, cache=None):
+    # Route handlers of a product page context: unneeded resources are blocked, documents are cached. Playwright
+    # runs the handlers last registered first, so the cache goes in first and the blocker sees every request
+    # before it.
+    async def setup(context):
+        if cache is not None:
+            await cache.install(context)
+        if blocker is not None:
+            await blocker.install(context)
+
+    return setup
+
+
+def requeue_failure(requeues, index, retryable):
+    # Count a failed attempt at a product; True when it gets another go at the end of the queue instead of
+    # being given up
+    requeues[index] = requeues.get(index, 0) + 1
+    return retryable and requeues[index] <= MAX_REQUEUES
+
+
+def product_scraper(scheduler=None, extractor=extract_product_fields, snapshot=None, fetcher=None):
+    # scrape(open_page, url, category) of one product. With a fetcher the product is read from its documents
+    # and open_page() is only called when they lack a field.
+    async def scrape(open_page, url, category):
+        if fetcher is not None:
+            return await scrape_product_documents(fetcher, url, category, open_page, scheduler, snapshot)
+        return await scrape_product(await open_page(), url, category, scheduler, extractor, snapshot)
+
+    return scrape
+
+
+async def product_worker(pool, next_product, scrape, *, on_row, on_failure, push_back, crashes, settled=None):
+    # One worker of a product crawl, shared by the single-process and the sharded paths. It takes
+    # (index, url, category) items from next_product() until it returns None, leasing a page from the pool the
+    # first time a product needs one. A product the browser crashed under is pushed back (MAX_REQUEUES times,
+    # counted in crashes) on a fresh context; any other FetchFailure goes to on_failure(item, failure) and a
+    # row to on_row(item, row, seconds). settled(), when given, is called once the item is dealt with.
+    loop = asyncio.get_running_loop()
+    lease = None
+    # Whether the current product loaded a page
+    opened = False
+
+    async def open_page():
+        nonlocal lease, opened
+        if lease is None:
+            lease = await pool.acquire()
+        opened = True
+        return lease.page
+
+    try:
+        while True:
+            item = await next_product()
+            if item is None:
+                break
+            index, url, category = item
+            started = loop.time()
+            opened = False
+            try:
+                row = await scrape(open_page, url, category)
+            except Exception as error:
+                if opened and pool.lost(lease):
+                    # Start over on a fresh context (and browser) without losing the product
+                    lease = await pool.replace(lease)
+                    crashes[index] = crashes.get(index, 0) + 1
+                    if crashes[index] <= MAX_REQUEUES:
+                        push_back(item)
+                        if settled is not None:
+                            settled()
+                        continue
+                    error = FetchFailure(url, "browser crashed on every attempt")
+                    error.retryable = False
+                if not isinstance(error, FetchFailure):
+                    if settled is not None:
+                        settled()
+                    raise
+                if opened:
+                    lease = await pool.checkin(lease)
+                on_failure(item, error)
+            else:
+                if opened:
+                    lease = await pool.checkin(lease)
+                on_row(item, row, loop.time() - started)
+            if settled is not None:
+                settled()
+    finally:
+        if lease is not None:
+            await pool.release(lease)
+
+
+async def scrape_products(browser, product_urls, sink, *, concurrency=CONCURRENCY,
+                          scheduler=None, extractor=extract_product_fields,
+                          checkpoint=None, blocker=None, cache=None, snapshot=None,
+                          recycle_after=RECYCLE_AFTER_NAVIGATIONS, max_browser_rss_mb=MAX_BROWSER_RSS_MB,
+                          deadline=None, category_run=None, fetcher=None, feed=None):
+    # Rows are streamed to the sink in the order of product_urls. No product is started after the deadline
+    # (event loop time); seconds per page and changes are recorded per category in category_run. With a
+    # fetcher the products are read from their documents, and a worker only leases a page when they lack a field.
+    # With a feed (pipelined run) the products come from discovery while it goes on, product_urls is None, and
+    # rows are checkpointed right away but held from the sink until discovery is over, so their category column
+    # names every category of the product.
+    loop = asyncio.get_running_loop()
+    writer = OrderedWriter(sink)
+    done = set()
+    # Rows of a pipelined run waiting for the end of discovery: position -> (row, seconds), None for a failure
+    held = {}
+    # Reuse the rows finished by a previous run
+    if checkpoint is not None:
+        for index, row in checkpoint.load_rows().items():
+            if feed is not None:
+                # Their category column is rewritten once discovery is over; no time to record
+                held[index] = (row, None)
+                done.add(index)
+            elif index < len(product_urls):
+                writer.add(index, row)
+                done.add(index)
+        if done or feed is None:
+            print(f"Resuming with {len(done)} products already scraped.")
+
+    # Queue every remaining product together with its position
+    if feed is not None:
+        queue = feed.queue
+    else:
+        queue = WorkQueue()
+        for index, (url, category) in enumerate(product_urls):
+            if index not in done:
+                queue.push((index, url, category))
+        queue.close()
+
+    processed = 0
+    # Products that failed after all their attempts and re-queues, by position
+    requeues = {}
+    failed = {}
+    # Products re-queued because the browser crashed under them
+    crashes = {}
+    category_column = 2 if snapshot is not None else 1
+
+    def settle(index, category, row, seconds):
+        if feed is not None:
+            category = feed.category(index)
+            if row is not None:
+                row = row[:category_column] + (category,) + row[category_column + 1:]
+        if category_run is not None and seconds is not None:
+            category_run.record(category, seconds, None if snapshot is None else row is not None)
+        # Record the row right away so a crash never loses it
+        if checkpoint is not None:
+            checkpoint.save_row(index, row)
+        writer.add(index, row)
+
+    def release_held():
+        for index, result in sorted(held.items()):
+            if result is None:
+                writer.add(index, None)
+            else:
+                settle(index, None, *result)
+        held.clear()
+
+    async def next_product():
+        item = await queue.get()
+        if item is not None and deadline is not None and loop.time() >= deadline:
+            # Out of time: leave the product and everything still queued for --resume
+            queue.push(item)
+            queue.task_done()
+            queue.stop()
+            return None
+        return item
+
+    def on_row(item, row, seconds):
+        nonlocal processed
+        index, url, category = item
+        if feed is not None and not feed.complete.is_set():
+            # Checkpointed right away so a crash during discovery never loses it
+            if checkpoint is not None:
+                checkpoint.save_row(index, row)
+            held[index] = (row, seconds)
+        else:
+            release_held()
+            settle(index, category, row, seconds)
+        processed += 1
+        # Print progress message after processing every 10 product URLs
+        if processed % 10 == 0:
+            print(f"Processed {processed} links.")
+
+    def on_failure(item, failure):
+        index, url, category = item
+        # Give the product another go at the end of the queue instead of aborting the run
+        if requeue_failure(requeues, index, failure.retryable):
+            queue.push(item)
+            return
+        print(f"Giving up on {url}: {failure}")
+        failed[index] = failure
+        # Keep the output order going; the product stays unfinished in the checkpoint
+        if feed is not None and not feed.complete.is_set():
+            held[index] = None
+        else:
+            writer.add(index, None)
+
+    # Every worker leases its own context, where unneeded resources are blocked and documents are cached,
+    # recycled as it ages so the browser memory stays flat
+    pool = BrowserPool(browser, product_context_setup(blocker, cache), recycle_after, max_browser_rss_mb)
+    scrape = product_scraper(scheduler, extractor, snapshot, fetcher)
+
+    def worker():
+        return product_worker(pool, next_product, scrape, on_row=on_row, on_failure=on_failure,
+                              push_back=queue.push, crashes=crashes, settled=queue.task_done)
+
+    # Never open more pages than there are products to scrape
+    workers = [asyncio.create_task(worker())
+               for _ in range(concurrency if feed is not None else max(1, min(concurrency, queue.depth())))]
+    try:
+        await asyncio.gather(*workers)
+    except Exception:
+        # Stop the remaining workers if one of them gave up on a product
+        for task in workers:
+            task.cancel()
+        queue.stop()
+        raise
+    finally:
+        await pool.close()
+
+    left = len(queue.drain())
+    if feed is not None:
+        # Products discovery found but never queued, once the deadline had stopped the queue
+        left = len(feed.entries) - processed - len(failed) - len(done)
+    release_held()
+    if left:
+        # Out of time: the rest stays unfinished in the checkpoint for --resume
+        writer.drain()
+        print(f"Time budget spent, {left} products left for --resume.")
+    # Print completion message after all product URLs have been processed
+    print(f"All information for {processed} urls has been scraped.")
+    if fetcher is not None:
+        print(fetcher.summary())
+    if feed is not None:
+        print(queue.summary())
+    print(pool.summary())
+    if failed:
+        print(f"{len(failed)} products failed, run again with --resume to retry them.")
+    return processed
+
+
+async def scrape_shard(shard, options, tasks, results):
+    # One shard of a sharded crawl: its own browser pulls products from the coordinator's task queue and
+    # sends back every row, failure and, at the end, its counters
+    TIMINGS.enabled = bool(options.timings)
+    set_field_waits(dict(options.field_wait))
+    set_probe_wait(options.probe_wait)
+    # The shards share the per-host rate cap
+    scheduler = RequestScheduler(options.max_per_second / options.processes, options.navigation_timeout,
+                                 options.max_attempts)
+    set_default_scheduler(scheduler)
+    # Each shard is already a process of its own, html extraction parses in-process
+    extractor = html_extractor() if options.extraction == 'html' else EXTRACTORS[options.extraction]
+    blocker = ResourceBlocker(options.block_resources, options.block_url, options.allow_url)
+    cache = None if options.no_cache else ResponseCache(options.cache_dir, options.cache_ttl * 3600,
+                                                        options.cache_max_mb * 1024 * 1024)
+    snapshot = SnapshotStore(options.snapshot) if options.incremental else None
+    loop = asyncio.get_running_loop()
+
+    # Products handed back to the task queue because the browser crashed under them
+    crashes = {}
+
+    async def next_product():
+        # Block in a thread so the other pages keep loading
+        return await loop.run_in_executor(None, tasks.get)
+
+    def on_row(item, row, seconds):
+        results.put(('row', item[0], row, seconds))
+
+    def on_failure(item, failure):
+        # The coordinator decides whether the product goes back to the queue
+        results.put(('failed', item[0], failure.retryable, str(failure)))
+
+    async with async_playwright() as pw:
+        browser = await pw.firefox.launch()
+        pool = BrowserPool(browser, product_context_setup(blocker, cache), options.recycle_after,
+                           options.max_browser_mb)
+        scrape = product_scraper(scheduler, extractor, snapshot)
+
+        def worker():
+            return product_worker(pool, next_product, scrape, on_row=on_row, on_failure=on_failure,
+                                  push_back=tasks.put, crashes=crashes)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(options.concurrency)))
+        finally:
+            await pool.close()
+            await browser.close()
+            if cache is not None:
+                cache.close()
+            if snapshot is not None:
+                snapshot.close()
+        print(f"Shard {shard}: {pool.summary()}")
+
+    results.put(('done', shard, {
+        'timings': TIMINGS.state(),
+        'blocked': dict(blocker.blocked), 'requests_loaded': blocker.requests_loaded,
+        'bytes_loaded': blocker.bytes_loaded,
+        'retries': dict(scheduler.retries), 'failures': dict(scheduler.failures),
+        'breaker_trips': scheduler.breaker_trips,
+        'cache': cache.stats if cache is not None else {},
+        'late_probes': dict(late_probes),
+    }))
+
+
+def shard_process(shard, options, tasks, results):
+    # Entry point of a shard process
+    try:
+        asyncio.run(scrape_shard(shard, options, tasks, results))
+    except Exception as error:
+        results.put(('crashed', shard, f"{type(error).__name__}: {error}"))
+        raise
+
+
+def merge_shard_stats(stats, scheduler=None, blocker=None, cache=None):
+    # Fold the counters of a finished shard into the coordinator's summaries
+    TIMINGS.merge(stats['timings'])
+    late_probes.update(stats['late_probes'])
+    if blocker is not None:
+        blocker.blocked.update(stats['blocked'])
+        blocker.requests_loaded += stats['requests_loaded']
+        blocker.bytes_loaded += stats['bytes_loaded']
+    if scheduler is not None:
+        scheduler.retries.update(stats['retries'])
+        scheduler.failures.update(stats['failures'])
+        scheduler.breaker_trips += stats['breaker_trips']
+    if cache is not None:
+        for name, value in stats['cache'].items():
+            cache.stats[name] += value
+
+
+async def scrape_products_sharded(product_urls, sink, options, *, checkpoint=None, scheduler=None, blocker=None,
+                                  cache=None, deadline=None, category_run=None):
+    # Coordinator of a sharded crawl: options.processes shard processes, each with its own browser, pull
+    # products from one task queue, so a slow shard simply takes fewer. Rows come back over a result queue
+    # and are written here, in the order of product_urls, to the same sink and checkpoint as scrape_products.
+    writer = OrderedWriter(sink)
+    done = set()
+    if checkpoint is not None:
+        for index, row in checkpoint.load_rows().items():
+            if index < len(product_urls):
+                writer.add(index, row)
+                done.add(index)
+        print(f"Resuming with {len(done)} products already scraped.")
+
+    # Playwright's event loop and threads do not survive a fork
+    mp = multiprocessing.get_context('spawn')
+    tasks = mp.Queue()
+    results = mp.Queue()
+    pending = 0
+    for index, (url, category) in enumerate(product_urls):
+        if index not in done:
+            tasks.put((index, url, category))
+            pending += 1
+
+    shards = [mp.Process(target=shard_process, args=(shard, options, tasks, results), name=f'shard-{shard}')
+              for shard in range(options.processes)]
+    for process in shards:
+        process.start()
+
+    loop = asyncio.get_running_loop()
+    processed = 0
+    requeues = {}
+    failed = {}
+    finished = 0
+    stopping = False
+    expired = False
+    left = 0
+    try:
+        while finished < len(shards):
+            if deadline is not None and not expired and loop.time() >= deadline:
+                # Out of time: take back the products no shard started, they stay unfinished for --resume
+                expired = True
+                while True:
+                    try:
+                        tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    pending -= 1
+                    left += 1
+            if not pending and not stopping:
+                # Every product is settled: one stop marker per page of every shard
+                for _ in range(options.processes * options.concurrency):
+                    tasks.put(None)
+                stopping = True
+            try:
+                message = await loop.run_in_executor(None, results.get, True, 1.0)
+            except queue.Empty:
+                crashed = [process.name for process in shards if process.exitcode not in (None, 0)]
+                if crashed:
+                    raise RuntimeError(f"Crawl shards exited unexpectedly: {', '.join(crashed)}")
+                continue
+
+            kind = message[0]
+            if kind == 'row':
+                _, index, row, seconds = message
+                if category_run is not None:
+                    category_run.record(product_urls[index][1], seconds,
+                                        None if not options.incremental else row is not None)
+                if checkpoint is not None:
+                    checkpoint.save_row(index, row)
+                writer.add(index, row)
+                pending -= 1
+                processed += 1
+                if processed % 10 == 0:
+                    print(f"Processed {processed} links.")
+            elif kind == 'failed':
+                _, index, retryable, reason = message
+                url, category = product_urls[index]
+                if expired:
+                    left += 1
+                    pending -= 1
+                elif requeue_failure(requeues, index, retryable):
+                    tasks.put((index, url, category))
+                else:
+                    print(f"Giving up on {url}: {reason}")
+                    failed[index] = reason
+                    writer.add(index, None)
+                    pending -= 1
+            elif kind == 'done':
+                merge_shard_stats(message[2], scheduler, blocker, cache)
+                finished += 1
+            elif kind == 'crashed':
+                raise RuntimeError(f"Crawl shard {message[1]} crashed: {message[2]}")
+    finally:
+        for process in shards:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+    if left:
+        writer.drain()
+        print(f"Time budget spent, {left} products left for --resume.")
+    print(f"All information for {processed} urls has been scraped by {len(shards)} processes.")
+    if failed:
+        print(f"{len(failed)} products failed, run again with --resume to retry them.")
+    return processed
+
+
+async def discover_product_urls(browser, options, categories, scheduler=None, cache=None, found=None, tiles=None,
+                                sitemap_state=None, listed=None):
+    # (url, category) pairs of every product, by the discovery method of the options; found(pairs), when
+    # given, receives them while discovery goes on, tiles the fields of the result tiles (filter discovery),
+    # listed the lastmod of every product of the sitemap (sitemap discovery)
+    if options.discovery == 'sitemap':
+        # Stream the product sitemaps instead of clicking through the filters; only products modified
+        # since the previous run are queued (the checkpoint keeps them for --resume)
+        sitemap_url = options.sitemap_url or urljoin(options.search_url, '/sitemap.xml')
+        return await discover_from_sitemap(sitemap_url, sitemap_state, scheduler, options.sitemaps, found=found,
+                                           listed=listed)
+    if options.discovery_concurrency > 1:
+        # Crawl the categories side by side, each in its own browser context
+        return await filter_products_parallel(browser, options.search_url, categories, options.discovery_concurrency,
+                                              options.ready_timeout, options.pagination, cache, found, tiles)
+
+    context = await browser.new_context()
+    if cache is not None:
+        await cache.install(context)
+    page = await context.new_page()
+
+    # Make a request to the Decathlon search page and extract the product URLs
+    await perform_request_with_retry(page, options.search_url)
+    product_urls = await filter_products(browser, page, options.ready_timeout, categories, options.pagination,
+                                         found, tiles)
+    await context.close()
+    return product_urls
+
+
+async def discover_into_feed(feed, discovery):
+    # Discovery stage of a pipelined run. A failed discovery stops the queue so the workers end.
+    try:
+        await discovery
+    except BaseException:
+        feed.queue.stop()
+        raise
+    feed.close()
+
+
+async def main(options=None):
+    options = options or parse_args([])
+
+    # Open the checkpoint of the previous run, or start a new one
+    checkpoint = CheckpointStore(options.checkpoint)
+    if not options.resume:
+        checkpoint.clear()
+    # Per-stage timings, off unless a report is asked for
+    TIMINGS.enabled = bool(options.timings)
+    set_field_waits(dict(options.field_wait))
+    set_probe_wait(options.probe_wait)
+    # One scheduler paces and retries every page load and click of the run
+    scheduler = RequestScheduler(options.max_per_second, options.navigation_timeout, options.max_attempts)
+    set_default_scheduler(scheduler)
+    # Page documents kept from previous runs
+    cache = None if options.no_cache else ResponseCache(options.cache_dir, options.cache_ttl * 3600,
+                                                        options.cache_max_mb * 1024 * 1024)
+    # Statistics of previous runs rank the categories; this run's measurements are added at the end
+    category_store = CategoryStatsStore(options.category_stats)
+    category_run = CategoryRun()
+    # Tile prices of the previous harvest, for --harvest-tiles
+    tile_store = TileStore(options.tile_state) if options.harvest_tiles else None
+    # Lastmods of the products scraped from the sitemap before, and of every product the sitemap lists now
+    sitemap_state = (SitemapState(options.sitemap_state)
+                     if options.discovery == 'sitemap' and not options.sitemap_all else None)
+    listed = {} if options.discovery == 'sitemap' else None
+    categories = options.categories
+    # Categories left out by the time budget, whose products are not reported as removed
+    skipped = []
+    budget = options.time_budget * 60 if options.time_budget else None
+    deadline = asyncio.get_running_loop().time() + budget if budget else None
+    if options.category_order == 'stats':
+        categories, skipped = plan_categories(categories, category_store.load(), budget,
+                                              options.concurrency * options.processes)
+        print(f"Category order: {', '.join(categories)}")
+        if skipped:
+            print(f"Left out by the time budget: {', '.join(skipped)}")
+
     # Launch a Firefox browser using Playwright
     async with async_playwright() as pw:
         browser = await pw.firefox.launch()
-        page = await browser.new_page()
-
-        # Make a request to the Decathlon search page and extract the product URLs
-        await perform_request_with_retry(page, 'https://www.decathlon.com/search?SOLD_OUT=%7B%22label_text%22%3A%22SOLD_OUT%22%2C%22value%22%3A%7B%22%24eq%22%3A%22FALSE%22%7D%7D&query_history=%5B%22Apparel%22%5D&q=Apparel&category_history=%5B%5D&sorting=NATURAL|desc')
-        product_urls = await filter_products(browser, page)
-
-        # Print the list of URLs
-        print(product_urls)
-        print(len(product_urls))
-        data = []
-
-        # Loop through each product URL and scrape the necessary information
-        for i, (url, category) in enumerate(product_urls):
-            await perform_request_with_retry(page, url)
-
-            product_name = await get_product_name(page)
-            brand = await get_brand_name(page)
-            star_rating = await get_star_rating(page)
-            num_reviews = await get_num_reviews(page)
-            MRP = await get_MRP(page)
-            sale_price = await get_sale_price(page)
-            colour = await get_colour(page)
-            ProductInformation = await get_ProductInformation(page)
-            Product_description = await get_Product_description(page)
-
-
-            # Print progress message after processing every 10 product URLs
-            if i % 10 == 0 and i > 0:
-                print(f"Processed {i} links.")
-
-            # Print completion message after all product URLs have been processed
-            if i == len(product_urls) - 1:
-                print(f"All information for url {i} has been scraped.")
-
-            # Add the scraped information to a list
-            data.append((url, category, product_name, brand, star_rating, num_reviews, MRP, sale_price, colour,
-                         ProductInformation, Product_description))
-
-        # Convert the list of tuples to a Pandas DataFrame and save it to a CSV file
-        df = pd.DataFrame(data,
-                          columns=['product_url', 'category', 'product_name', 'brand', 'star_rating', 'number_of_reviews',
-                                   'MRP', 'sale_price', 'colour', 'product information', 'Product description'])
-        df.to_csv('product_data.csv', index=False)
-        print('CSV file has been written successfully.')
+
+        # Reuse the URL list of the interrupted run instead of clicking through the filters again
+        product_urls = checkpoint.load_product_urls() if options.resume else None
+        # A pipelined run interrupted during discovery left a partial list, its discovery goes on
+        partial = product_urls is not None and not checkpoint.discovery_complete()
+        if partial and not options.pipeline:
+            print("The checkpoint holds a pipelined run whose discovery never finished, resume it with --pipeline; "
+                  "starting over.")
+            product_urls = None
+            partial = False
+        discovered = product_urls is None or partial
+        feed = None
+        if product_urls is None:
+            checkpoint.clear()
+        if discovered and options.pipeline:
+            # Discovery runs side by side with the product page workers below, feeding them as it goes
+            feed = DiscoveryFeed(options.queue_size, not options.keep_duplicates, checkpoint)
+            if partial:
+                feed.resume(product_urls, checkpoint.load_rows())
+                print(f"Resuming discovery with {len(product_urls)} products found before.")
+                product_urls = None
+        elif discovered:
+            tiles = {} if tile_store is not None else None
+            product_urls = await discover_product_urls(browser, options, categories, scheduler, cache, tiles=tiles,
+                                                       sitemap_state=sitemap_state, listed=listed)
+            category_run.add_discovered(product_urls)
+            # Fetch every product once, with all the categories it was listed under
+            if not options.keep_duplicates:
+                product_urls = deduplicate_product_urls(product_urls)
+            if options.category_order == 'stats':
+                # The products of the most valuable categories go first, so they finish within the budget
+                product_urls = order_product_urls(product_urls, categories)
+            checkpoint.save_product_urls(product_urls)
+            if tiles is not None:
+                # Products whose tile shows the price of the previous harvest are finished from their tile
+                matched = tiles_by_url(product_urls, tiles)
+                if product_urls and not matched:
+                    print(f"No result tile matched {TILE_SELECTOR}, every product gets a product page visit.")
+                rows = harvest_rows(product_urls, matched, tile_store.prices())
+                for position, row in rows.items():
+                    checkpoint.save_row(position, row)
+                print(f"{len(product_urls) - len(rows)} products are new or changed price and get a product page "
+                      f"visit, {len(rows)} rows come from their tile.")
+        else:
+            print(f"Loaded {len(product_urls)} product URLs from {options.checkpoint}.")
+
+        if product_urls is not None:
+            # Print the list of URLs
+            print(product_urls)
+            print(len(product_urls))
+
+        # Scrape the product pages with a pool of pages pulling from a shared queue,
+        # streaming the rows to the output file in batches
+        # Spawned, not forked: the browser and the Playwright driver threads are already running
+        executor = (ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+                    if options.extraction == 'html' and options.processes == 1 else None)
+        extractor = html_extractor(executor) if options.extraction == 'html' else EXTRACTORS[options.extraction]
+        blocker = ResourceBlocker(options.block_resources, options.block_url, options.allow_url)
+        # Incremental runs write a delta file (new, changed and removed products) against the snapshot
+        snapshot = SnapshotStore(options.snapshot) if options.incremental else None
+        columns = ['change'] + COLUMNS if snapshot is not None else COLUMNS
+        output = options.output or ('product_delta.csv' if snapshot is not None else 'product_data.csv')
+        sink = open_sink(output, options.format, columns, options.batch_size)
+        # Documents backend: one keep-alive HTTP session, as many connections as products in flight
+        fetcher = (await ShopifyFetcher(options.concurrency, scheduler, fallback=options.json_fallback).open()
+                   if options.backend == 'shopify' else None)
+        # Collaborators of the single-process product crawl, pipelined or not
+        product_options = dict(concurrency=options.concurrency, scheduler=scheduler, extractor=extractor,
+                               checkpoint=checkpoint, blocker=blocker, cache=cache, snapshot=snapshot,
+                               recycle_after=options.recycle_after, max_browser_rss_mb=options.max_browser_mb,
+                               deadline=deadline, category_run=category_run, fetcher=fetcher)
+        try:
+            if feed is not None:
+                async def found(pairs):
+                    category_run.add_discovered(pairs)
+                    await feed.add(pairs)
+
+                discovery = asyncio.create_task(
+                    discover_into_feed(feed, discover_product_urls(browser, options, categories, scheduler, cache,
+                                                                   found, sitemap_state=sitemap_state,
+                                                                   listed=listed)))
+                try:
+                    await scrape_products(browser, None, sink, feed=feed, **product_options)
+                finally:
+                    # Still running only when the time budget ran out or a worker failed
+                    discovery.cancel()
+                    outcome, = await asyncio.gather(discovery, return_exceptions=True)
+                    # The feed checkpointed the list as it grew, for --resume
+                    product_urls = feed.product_urls()
+                if isinstance(outcome, Exception):
+                    raise outcome
+            elif options.processes > 1 and fetcher is None:
+                # Shard the product pages over several processes and browsers
+                await scrape_products_sharded(product_urls, sink, options, checkpoint=checkpoint,
+                                              scheduler=scheduler, blocker=blocker, cache=cache,
+                                              deadline=deadline, category_run=category_run)
+            else:
+                await scrape_products(browser, product_urls, sink, **product_options)
+            if snapshot is not None and listed is not None and not discovered:
+                # The sitemap listing of the interrupted run is gone, removals show up in the next run
+                print("Resumed sitemap run, removed products are not reported.")
+            elif snapshot is not None:
+                # Products that are no longer listed; a sitemap run only queues the modified products, its
+                # listing says which are still there
+                seen_urls = listed if listed is not None else (url for url, category in product_urls)
+                for row in snapshot.pop_removed(seen_urls, skipped):
+                    sink.write((REMOVED,) + row)
+            if tile_store is not None:
+                # Prices the next harvest compares the tiles against; a failed product keeps its old price
+                tile_store.record(row_prices(checkpoint.load_rows().values()))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if fetcher is not None:
+                await fetcher.close()
+            if sitemap_state is not None:
+                if listed and product_urls is not None:
+                    # Only the products whose row was produced are skipped by the next run while unmodified
+                    finished = {product_urls[position][0] for position in checkpoint.load_rows()
+                                if position < len(product_urls)}
+                    sitemap_state.record((url, listed[url]) for url in finished if url in listed)
+                sitemap_state.close()
+            checkpoint.close()
+            sink.close()
+            category_store.update(category_run)
+            category_store.close()
+            if tile_store is not None:
+                tile_store.close()
+            if snapshot is not None:
+                snapshot.close()
+            if cache is not None:
+                print(cache.summary())
+                cache.close()
+        print(f'{sink.rows_written} rows have been written to {output}.')
+        print(blocker.summary())
+        print(scheduler.summary())
+        warning = late_fields_summary()
+        if warning:
+            print(warning)
+        if options.timings:
+            print(TIMINGS.table())
+            TIMINGS.write(options.timings)
         # Close the browser
         await browser.close()
+    return sink.rows_written
+
+
+def field_wait(value):
+    # --field-wait FIELD=MS -> (field, ms), checked here so a typo is a usage error before the browser starts
+    name, separator, wait = value.partition('=')
+    if name not in LATE_FIELDS:
+        raise argparse.ArgumentTypeError(f"{name!r} is not a late field, choose from {', '.join(LATE_FIELDS)}")
+    try:
+        wait = int(wait)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected FIELD=MS with a whole number of milliseconds, got {value!r}")
+    if wait < 0:
+        raise argparse.ArgumentTypeError(f"the wait of {name} cannot be negative")
+    return name, wait
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape Decathlon sports gear and apparel into product_data.csv")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help="number of product pages scraped at the same time")
+    parser.add_argument('--processes', type=int, default=PROCESSES,
+                        help="crawl processes, each with its own browser, the product pages are sharded over")
+    parser.add_argument('--recycle-after', type=int, default=RECYCLE_AFTER_NAVIGATIONS,
+                        help="page loads a browser context serves before it is replaced by a fresh one")
+    parser.add_argument('--max-browser-mb', type=int, default=MAX_BROWSER_RSS_MB,
+                        help="browser memory (MB) above which every context is recycled (0 disables the check)")
+    parser.add_argument('--max-per-second', type=float, default=MAX_REQUESTS_PER_SECOND_PER_HOST,
+                        help="maximum page loads per second per host (0 disables the cap)")
+    parser.add_argument('--navigation-timeout', type=int, default=NAVIGATION_TIMEOUT,
+                        help="timeout (ms) of one page load attempt")
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS,
+                        help="attempts per page load or click before the request is given up")
+    parser.add_argument('--search-url', default=SEARCH_URL,
+                        help="search page the categories are filtered on")
+    parser.add_argument('--categories', type=lambda value: [item.strip() for item in value.split(',') if item.strip()],
+                        default=CATEGORIES, help="comma separated checkbox labels of the categories to scrape")
+    parser.add_argument('--category-order', choices=['stats', 'fixed'], default='fixed',
+                        help="keep --categories order, or rank categories by the changes per second seen in previous "
+                             "runs (this also reorders the rows of the output)")
+    parser.add_argument('--category-stats', default=CATEGORY_STATS_PATH,
+                        help="SQLite file holding the per-category statistics of previous runs")
+    parser.add_argument('--time-budget', type=float, default=None, metavar='MINUTES',
+                        help="stop starting products after this long; with --category-order stats the categories "
+                             "that fit the budget go first and the others are left out")
+    parser.add_argument('--discovery', choices=['filters', 'sitemap'], default='filters',
+                        help="find products by ticking the category filters of the search page, or by streaming "
+                             "the store's product sitemaps")
+    parser.add_argument('--sitemap-url', default=None,
+                        help="sitemap index read by --discovery sitemap (defaults to /sitemap.xml of --search-url)")
+    parser.add_argument('--sitemaps', default=PRODUCT_SITEMAPS,
+                        help="regular expression selecting the product sitemaps of the index")
+    parser.add_argument('--sitemap-state', default=SITEMAP_STATE_PATH,
+                        help="SQLite file holding the lastmod of every product queued from the sitemap")
+    parser.add_argument('--sitemap-all', action='store_true',
+                        help="queue every product of the sitemap, not only those modified since the last run")
+    parser.add_argument('--discovery-concurrency', type=int, default=DISCOVERY_CONCURRENCY,
+                        help="number of categories discovered at once in separate browser contexts (1 = one page)")
+    parser.add_argument('--pagination', choices=['url', 'click'], default=PAGINATION,
+                        help="fetch result pages concurrently by URL once page 2 is checked against clicking, "
+                             "or click through them")
+    parser.add_argument('--harvest-tiles', action='store_true',
+                        help="read the fields of every result tile during discovery and only visit the product "
+                             "pages of new products and changed prices, the others get a row from their tile")
+    parser.add_argument('--tile-state', default=TILE_STATE_PATH,
+                        help="SQLite file holding the price of every product seen by --harvest-tiles")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="scrape product pages while discovery is still running instead of after it")
+    parser.add_argument('--queue-size', type=int, default=DETAIL_QUEUE_SIZE,
+                        help="with --pipeline, products waiting for a page before discovery is held back (0 = no limit)")
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help="scrape a product once per category link instead of once per canonical URL")
+    parser.add_argument('--ready-timeout', type=int, default=RESULTS_READY_TIMEOUT,
+                        help="longest wait (ms) for the result grid to change after a filter click")
+    parser.add_argument('--extraction', choices=sorted(EXTRACTORS), default='evaluate',
+                        help="read all fields in one page.evaluate call, with the per-field getters, "
+                             "or by parsing the page HTML with lxml")
+    parser.add_argument('--backend', choices=['browser', 'shopify'], default='browser',
+                        help="render every product page, or read product.js and the page HTML over HTTP and only "
+                             "render the pages whose documents lack a field (runs in one process)")
+    parser.add_argument('--json-fallback', choices=['html', 'browser', 'none'], default=JSON_FALLBACK,
+                        help="with --backend shopify, where the fields product.js lacks come from: the page HTML and "
+                             "its JSON-LD, the rendered page, or nowhere (Not Available; the description then comes "
+                             "from product.js and differs from the other backends)")
+    parser.add_argument('--field-wait', action='append', default=[], metavar='FIELD=MS',
+                        type=field_wait,
+                        help="longest wait for a late field whose widget is on the page, e.g. star_rating=2000 "
+                             f"(default {LATE_FIELD_WAIT} ms, repeatable)")
+    parser.add_argument('--probe-wait', type=int, default=PROBE_WAIT, metavar='MS',
+                        help="longest wait for the reviews widget block when it is not on the page at the load "
+                             "event (0 = probe once)")
+    parser.add_argument('--output', default=None,
+                        help="file receiving the product rows (product_data.csv, product_delta.csv with --incremental)")
+    parser.add_argument('--format', choices=sorted(SINKS), default=None,
+                        help="output format, defaults to the extension of --output")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="number of rows buffered before they are written out")
+    parser.add_argument('--block-resources', type=lambda value: [item for item in value.split(',') if item],
+                        default=list(BLOCKED_RESOURCE_TYPES),
+                        help="comma separated resource types aborted on product pages ('' loads everything)")
+    parser.add_argument('--block-url', action='append', default=list(DENIED_URL_PATTERNS),
+                        help="extra URL regular expression aborted on product pages (repeatable)")
+    parser.add_argument('--allow-url', action='append', default=[],
+                        help="URL regular expression never aborted, wins over the block lists (repeatable)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="directory of the on-disk page cache")
+    parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL / 3600,
+                        help="hours a cached page is served without revalidation (0: always ask the server)")
+    parser.add_argument('--cache-max-mb', type=int, default=CACHE_MAX_BYTES // (1024 * 1024),
+                        help="size of the page cache before least recently used pages are evicted")
+    parser.add_argument('--no-cache', action='store_true', help="always download pages from the network")
+    parser.add_argument('--incremental', action='store_true',
+                        help="skip products whose page did not change and only write new, changed and removed ones")
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH,
+                        help="SQLite file holding the fingerprint and row of every product for --incremental")
+    parser.add_argument('--timings', default=None, metavar='REPORT.json',
+                        help="time every stage and write a p50/p95/p99 report to this file")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH,
+                        help="SQLite file recording discovered URLs and finished products")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the run recorded in the checkpoint instead of starting over")
+    options = parser.parse_args(argv)
+    if options.pipeline and options.incremental:
+        parser.error("--pipeline cannot be combined with --incremental: products are compared to the snapshot "
+                     "before every category they are listed under is known")
+    if options.harvest_tiles and (options.incremental or options.pipeline or options.discovery == 'sitemap'):
+        parser.error("--harvest-tiles reads the result tiles of filter discovery before any product page is "
+                     "visited, it cannot be combined with --incremental, --pipeline or --discovery sitemap")
+    if options.pipeline and options.processes > 1 and options.backend == 'browser':
+        parser.error("--pipeline runs in one process, leave out --processes")
+    return options
+
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
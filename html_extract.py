@@ -0,0 +1,158 @@
+# Offline extraction backend: applies the FIELD_SPECS selectors to raw product page HTML with lxml,
+# without a browser. The HTML can come from page.content(), a plain HTTP client or saved files.
+#   python html_extract.py --parity tests/fixtures/product_pages/*.html   compares it with the browser backend
+import sys
+import glob
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import lxml.html
+from product_fields import FIELD_SPECS, FIELD_NAMES, postprocess_fields
+
+# Elements that start a new line in the rendered text
+BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption',
+              'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main',
+              'nav', 'ol', 'p', 'pre', 'section', 'table', 'tr', 'ul'}
+# Elements whose text is never rendered
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'head'}
+
+
+def is_hidden(element):
+    # Only inline styles and the hidden attribute can be checked without a layout engine
+    style = (element.get('style') or '').replace(' ', '').lower()
+    return element.get('hidden') is not None or 'display:none' in style
+
+
+def collect_text(element, parts):
+    tag = element.tag if isinstance(element.tag, str) else ''
+    if tag in SKIPPED_TAGS or is_hidden(element):
+        # The tail text belongs to the parent and is still rendered
+        if element.tail:
+            parts.append(element.tail)
+        return
+    if tag == 'br':
+        parts.append('\n')
+    elif tag in BLOCK_TAGS:
+        parts.append('\n')
+    if element.text and tag != 'br':
+        parts.append(element.text)
+    for child in element:
+        collect_text(child, parts)
+    if tag in BLOCK_TAGS:
+        parts.append('\n')
+    if element.tail:
+        parts.append(element.tail)
+
+
+def inner_text(element):
+    # Approximate HTMLElement.innerText: skip hidden content, break lines at block elements and <br>,
+    # collapse whitespace inside each line
+    parts = [element.text or '']
+    for child in element:
+        collect_text(child, parts)
+    lines = [' '.join(line.split()) for line in ''.join(parts).split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+def read_property(element, name):
+    if name == 'innerText':
+        return inner_text(element)
+    return element.text_content()
+
+
+def extract_raw_fields(tree, specs=FIELD_SPECS):
+    # Same traversal as EXTRACT_FIELDS_JS, on an lxml tree
+    raw = {}
+    for spec in specs:
+        if 'entries' in spec:
+            entries = spec['entries']
+            containers = tree.cssselect(entries['container'])
+            pairs = [] if containers else None
+            if containers:
+                for entry in containers[0].cssselect(entries['entry']):
+                    names = entry.cssselect(entries['name'])
+                    values = entry.cssselect(entries['value'])
+                    if not names or not values:
+                        pairs = None
+                        break
+                    pairs.append([names[0].text_content(), values[0].text_content()])
+            raw[spec['name']] = pairs
+            continue
+        value = None
+        for selector in spec['selectors']:
+            matches = tree.cssselect(selector)
+            if matches:
+                value = read_property(matches[0], spec['property'])
+                break
+        raw[spec['name']] = value
+    return raw
+
+
+def extract_raw_fields_from_html(html):
+    # Parse the page once and return the raw value of every field (None when missing)
+    return extract_raw_fields(lxml.html.fromstring(html))
+
+
+def extract_fields_from_html(html):
+    # Every field, post-processed like the browser backend
+    return postprocess_fields(extract_raw_fields_from_html(html))
+
+
+def read_html_file(path):
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+def extract_fields_from_file(path):
+    return extract_fields_from_html(read_html_file(path))
+
+
+def extract_files(paths, workers=None):
+    # Parse saved pages in a pool of processes, results follow the order of paths
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(extract_fields_from_file, paths, chunksize=8))
+
+
+async def compare_backends(paths):
+    # Run the browser backend (final.extract_product_fields) and this backend on the same saved pages
+    from playwright.async_api import async_playwright
+    from final import extract_product_fields
+
+    mismatches = 0
+    async with async_playwright() as pw:
+        browser = await pw.firefox.launch()
+        page = await browser.new_page()
+        for path in paths:
+            html = read_html_file(path)
+            await page.set_content(html)
+            browser_fields = await extract_product_fields(page)
+            html_fields = extract_fields_from_html(html)
+            for name in FIELD_NAMES:
+                if browser_fields[name] != html_fields[name]:
+                    mismatches += 1
+                    print(f"{path}: {name} differs\n  browser: {browser_fields[name]!r}\n  html:    {html_fields[name]!r}")
+        await browser.close()
+
+    print(f"Compared {len(paths)} pages, {mismatches} mismatching fields.")
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract product fields from saved product page HTML")
+    parser.add_argument('paths', nargs='+', help="saved product pages (globs are expanded)")
+    parser.add_argument('--workers', type=int, default=None, help="number of parser processes")
+    parser.add_argument('--parity', action='store_true',
+                        help="compare the browser backend and the HTML backend on the pages")
+    args = parser.parse_args(argv)
+
+    paths = sorted(path for pattern in args.paths for path in (glob.glob(pattern) or [pattern]))
+    if args.parity:
+        return 1 if asyncio.run(compare_backends(paths)) else 0
+
+    for path, fields in zip(paths, extract_files(paths, args.workers)):
+        print(path, fields)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
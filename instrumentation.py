@@ -0,0 +1,130 @@
+# Lightweight per-stage timing of a crawl (page loads, extraction, pagination, filters, waits) with
+# retry and byte counters, summarised as percentiles per stage and the slowest URLs.
+# Disabled by default: stage() then hands back a shared no-op context manager.
+import json
+import math
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+# Number of slowest URLs listed in the report
+SLOWEST_URLS = 10
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+# True while a stage charging its time to a URL is open in the current task (and the tasks it started), so
+# the stages nested in it (goto in result_page, ready_selector in goto, late_fields_wait in extract) are not
+# charged to the URL a second time
+_charging_url = ContextVar('charging_url', default=False)
+
+
+class _Stage:
+    __slots__ = ('timings', 'name', 'url', 'start', 'token')
+
+    def __init__(self, timings, name, url):
+        self.timings = timings
+        self.name = name
+        self.url = url
+        self.token = None
+
+    def __enter__(self):
+        if self.url is not None and not _charging_url.get():
+            self.token = _charging_url.set(True)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        if self.token is None:
+            self.timings.add(self.name, seconds)
+        else:
+            _charging_url.reset(self.token)
+            self.timings.add(self.name, seconds, self.url)
+        return False
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Timings:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        # Durations in seconds by stage
+        self.samples = defaultdict(list)
+        # Time spent per URL, charged by the outermost stage naming it
+        self.url_seconds = Counter()
+        # Retries, bytes transferred and other counts
+        self.counters = Counter()
+
+    def stage(self, name, url=None):
+        # with TIMINGS.stage('goto', url): ...
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, url)
+
+    def add(self, name, seconds, url=None):
+        if not self.enabled:
+            return
+        self.samples[name].append(seconds)
+        if url is not None:
+            self.url_seconds[url] += seconds
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def state(self):
+        # Raw samples and counters, handed to another process to merge
+        return {'samples': dict(self.samples), 'url_seconds': dict(self.url_seconds), 'counters': dict(self.counters)}
+
+    def merge(self, state):
+        # Add the timings recorded by another process (a crawl shard)
+        for name, values in state['samples'].items():
+            self.samples[name].extend(values)
+        self.url_seconds.update(state['url_seconds'])
+        self.counters.update(state['counters'])
+
+    def report(self):
+        stages = {}
+        for name, values in self.samples.items():
+            values = sorted(values)
+            stages[name] = {'count': len(values), 'total': sum(values), 'p50': percentile(values, 0.50),
+                            'p95': percentile(values, 0.95), 'p99': percentile(values, 0.99), 'max': values[-1]}
+        return {'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['total'])),
+                'slowest_urls': [{'url': url, 'seconds': seconds}
+                                 for url, seconds in self.url_seconds.most_common(SLOWEST_URLS)],
+                'counters': dict(self.counters)}
+
+    def table(self):
+        report = self.report()
+        lines = [f"{'stage':<24}{'count':>8}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'max s':>9}"]
+        for name, stage in report['stages'].items():
+            lines.append(f"{name:<24}{stage['count']:>8}{stage['total']:>10.1f}{stage['p50']:>9.2f}"
+                         f"{stage['p95']:>9.2f}{stage['p99']:>9.2f}{stage['max']:>9.2f}")
+        if report['slowest_urls']:
+            lines.append("Slowest URLs:")
+            lines += [f"  {entry['seconds']:8.1f} s  {entry['url']}" for entry in report['slowest_urls']]
+        if report['counters']:
+            lines.append("Counters: " + ', '.join(f"{name}={value}" for name, value in sorted(report['counters'].items())))
+        return '\n'.join(lines)
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+
+
+# Timings shared by every module of the crawl, enabled by final.py --timings
+TIMINGS = Timings()
@@ -0,0 +1,177 @@
+# Staged crawl: discovery streams the (url, category) pairs it finds into a bounded queue that the product page
+# workers consume right away, so the browser scrapes products while the category filters are still being
+# clicked. Discovery is held back while the queue is full, the workers stop once discovery is over and the
+# queue is drained, and both sides record how long they waited on each other and how deep the queue ran. The
+# products found are checkpointed as they come, so an interrupted run resumes its discovery where it stopped.
+import time
+import asyncio
+from collections import Counter
+from url_index import CATEGORY_SEPARATOR, canonical_product_url, product_handle
+
+# Products waiting for a product page worker before discovery is held back
+DETAIL_QUEUE_SIZE = 200
+
+
+class WorkQueue:
+    # Queue of (position, url, category) between the stages. put() waits while `limit` products are waiting
+    # (0 for no limit); push() never waits, for the initial list and re-queued products. get() returns None once
+    # the queue is closed and no product is waiting or being scraped, since a product in flight may come back.
+    def __init__(self, limit=0, name='detail'):
+        self.name = name
+        self.limit = limit
+        self.items = asyncio.Queue()
+        self.space = asyncio.Event()
+        self.closed = False
+        self.stopped = False
+        self.in_flight = 0
+        # Depth statistics, sampled at every put and get, and the time each side spent waiting on the other
+        self.samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.producer_wait = 0.0
+        self.consumer_wait = 0.0
+
+    def depth(self):
+        return self.items.qsize()
+
+    def sample(self):
+        depth = self.depth()
+        self.samples += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def push(self, item):
+        self.items.put_nowait(item)
+        self.sample()
+
+    async def put(self, item):
+        # Backpressure: the producer waits for the workers to make room; dropped once the queue is stopped
+        if self.limit and self.depth() >= self.limit and not self.stopped:
+            started = time.perf_counter()
+            while self.depth() >= self.limit and not self.stopped:
+                self.space.clear()
+                await self.space.wait()
+            self.producer_wait += time.perf_counter() - started
+        if self.stopped:
+            return False
+        self.push(item)
+        return True
+
+    async def get(self):
+        started = time.perf_counter()
+        item = await self.items.get()
+        self.consumer_wait += time.perf_counter() - started
+        if item is None:
+            # End marker: hand it on to the next worker
+            self.items.put_nowait(None)
+            return None
+        self.in_flight += 1
+        self.sample()
+        if not self.limit or self.depth() < self.limit:
+            self.space.set()
+        return item
+
+    def task_done(self):
+        # The product taken by get() is settled (scraped, given up or pushed back)
+        self.in_flight -= 1
+        self.finish_if_drained()
+
+    def close(self):
+        # No product will be put any more
+        self.closed = True
+        self.finish_if_drained()
+
+    def stop(self):
+        # Out of time, or a worker failed: the producer stops waiting, nothing more is queued and the workers
+        # waiting for a product are woken up
+        self.stopped = True
+        self.space.set()
+        self.items.put_nowait(None)
+
+    def finish_if_drained(self):
+        if self.closed and not self.in_flight and self.items.empty():
+            self.items.put_nowait(None)
+
+    def drain(self):
+        # Take back the products still waiting, the end marker aside
+        left = []
+        while not self.items.empty():
+            item = self.items.get_nowait()
+            if item is not None:
+                left.append(item)
+        return left
+
+    def summary(self):
+        mean = self.depth_total / self.samples if self.samples else 0.0
+        return (f"{self.name.capitalize()} queue: mean depth {mean:.1f}, peak {self.depth_max}"
+                f"{f' of {self.limit}' if self.limit else ''}; producer held back {self.producer_wait:.1f} s, "
+                f"workers waited {self.consumer_wait:.1f} s.")
+
+
+class DiscoveryFeed:
+    # The discovery side of the pipeline: pairs found by discovery are collapsed to one entry per product, like
+    # deduplicate_product_urls, and every new product is queued for the workers at its position. A product
+    # found again under another category only gains that category, so rows are complete once discovery is done.
+    def __init__(self, limit=DETAIL_QUEUE_SIZE, deduplicate=True, checkpoint=None):
+        self.queue = WorkQueue(limit)
+        self.deduplicate = deduplicate
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            checkpoint.set_discovery_complete(False)
+        # [url, categories] per position, and the position of every handle
+        self.entries = []
+        self.positions = {}
+        # (handle, category) pairs restored by resume() and not found again yet, when duplicates are kept
+        self.restored = Counter()
+        self.discovered = 0
+        self.complete = asyncio.Event()
+
+    def resume(self, product_urls, finished):
+        # Start from the list of an interrupted run: its products keep their positions and the ones without
+        # a finished row are queued again. Rediscovery then only adds what the interrupted run had not found.
+        for position, (url, category) in enumerate(product_urls):
+            self.entries.append([url, category.split(CATEGORY_SEPARATOR)])
+            self.positions[product_handle(url)] = position
+            if not self.deduplicate:
+                self.restored[(product_handle(url), category)] += 1
+            if position not in finished:
+                self.queue.push((position, url, category))
+
+    async def add(self, pairs):
+        for url, category in pairs:
+            self.discovered += 1
+            handle = product_handle(url)
+            if self.restored[(handle, category)]:
+                # Kept duplicates have no entry to merge into: skip the pairs the checkpoint already holds
+                self.restored[(handle, category)] -= 1
+                continue
+            position = self.positions.get(handle) if self.deduplicate else None
+            if position is not None:
+                if category not in self.entries[position][1]:
+                    self.entries[position][1].append(category)
+                    self.save(position)
+                continue
+            position = len(self.entries)
+            self.entries.append([canonical_product_url(url) if self.deduplicate else url, [category]])
+            self.positions[handle] = position
+            self.save(position)
+            await self.queue.put((position, self.entries[position][0], category))
+
+    def save(self, position):
+        if self.checkpoint is not None:
+            self.checkpoint.save_product_url(position, self.entries[position][0], self.category(position))
+
+    def close(self):
+        self.queue.close()
+        self.complete.set()
+        if self.checkpoint is not None:
+            self.checkpoint.set_discovery_complete(True)
+        if self.deduplicate:
+            print(f"{len(self.entries)} unique products out of {self.discovered} discovered links.")
+
+    def category(self, position):
+        # Category column of a product, with every category it was found under so far
+        return CATEGORY_SEPARATOR.join(self.entries[position][1])
+
+    def product_urls(self):
+        return [(url, CATEGORY_SEPARATOR.join(categories)) for url, categories in self.entries]
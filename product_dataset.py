@@ -0,0 +1,189 @@
+# Fast loader and query API over the scraper output (CSV, JSONL, Parquet or Arrow). The file is parsed once into
+# the typed columns of records.py and kept next to it as an Arrow IPC cache, memory-mapped on the next load.
+# Prices, discount, rating and reviews are numpy arrays and products are indexed by category and brand.
+#   dataset = ProductDataset.load('product_data.csv')
+#   dataset.mean_discount_by_category()
+#   dataset.rows(dataset.query(max_price=10, min_rating=4.5))
+import os
+import sys
+import json
+import numpy
+import pyarrow
+import pyarrow.ipc
+import pyarrow.compute
+import pyarrow.parquet
+from product_fields import COLUMNS
+from records import record_schema, records_table, read_csv_rows
+
+# Suffix of the Arrow cache written next to a CSV, JSONL or untyped Parquet file
+CACHE_SUFFIX = '.cache.arrow'
+# Rows converted to Arrow at a time while the cache is built
+BATCH_SIZE = 5000
+
+
+def source_signature(path):
+    # Size and modification time of the source, stored in the cache to tell when it is stale
+    stat = os.stat(path)
+    return {b'source_size': str(stat.st_size).encode(), b'source_mtime_ns': str(stat.st_mtime_ns).encode()}
+
+
+def read_jsonl_rows(path):
+    # Rows of the jsonl sink, one object per line keyed by column name
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                product = json.loads(line)
+                yield tuple(product[column] for column in COLUMNS)
+
+
+def read_parquet_rows(path):
+    # Rows of the plain parquet sink: nested values are JSON strings, which the repr parser reads as well
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(columns=COLUMNS):
+        yield from zip(*(batch.column(column).to_pylist() for column in COLUMNS))
+
+
+def build_table(rows):
+    schema = record_schema()
+    tables = []
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            tables.append(records_table(batch, schema))
+            batch = []
+    if batch or not tables:
+        tables.append(records_table(batch, schema))
+    return pyarrow.concat_tables(tables)
+
+
+def read_arrow(path):
+    # Memory-mapped: the columns are read from the page cache when touched, nothing is copied up front
+    return pyarrow.ipc.open_file(pyarrow.memory_map(path, 'r')).read_all()
+
+
+def write_arrow(path, table):
+    # Written aside and renamed, so a reader never maps a half-written cache
+    temporary = path + '.tmp'
+    with pyarrow.ipc.new_file(temporary, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temporary, path)
+
+
+def load_table(path, cache=True):
+    # Typed table of a scraper output file, through the cache for formats that need parsing
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.arrow', '.feather'):
+        return read_arrow(path)
+    if extension == '.parquet':
+        table = pyarrow.parquet.read_table(path, memory_map=True)
+        if 'specs' in table.column_names:
+            # Written by the typed-parquet sink
+            return table
+
+    signature = source_signature(path)
+    cache_path = path + CACHE_SUFFIX
+    if cache and os.path.exists(cache_path):
+        table = read_arrow(cache_path)
+        metadata = table.schema.metadata or {}
+        if all(metadata.get(key) == value for key, value in signature.items()):
+            return table
+
+    if extension == '.jsonl':
+        rows = read_jsonl_rows(path)
+    elif extension == '.parquet':
+        rows = read_parquet_rows(path)
+    else:
+        rows = read_csv_rows(path)
+    table = build_table(rows).replace_schema_metadata(signature)
+    if cache:
+        write_arrow(cache_path, table)
+    return table
+
+
+def group_positions(values, positions):
+    # {value: numpy array of the positions holding it} for a string array without nulls
+    encoded = values.dictionary_encode()
+    codes = encoded.indices.to_numpy()
+    order = numpy.argsort(codes, kind='stable')
+    bounds = numpy.searchsorted(codes[order], numpy.arange(len(encoded.dictionary) + 1))
+    return {name: positions[order[start:stop]]
+            for name, start, stop in zip(encoded.dictionary.to_pylist(), bounds[:-1], bounds[1:])}
+
+
+class ProductDataset:
+    def __init__(self, table):
+        self.table = table
+        self.mrp = self.numbers('mrp')
+        self.sale_price = self.numbers('sale_price')
+        self.rating = self.numbers('star_rating')
+        self.reviews = self.numbers('number_of_reviews')
+        # Percent off the crossed-out price; a product without one sells at full price
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            self.discount = numpy.where(numpy.isnan(self.mrp), 0.0, (self.mrp - self.sale_price) / self.mrp * 100)
+        self.discount[numpy.isnan(self.sale_price)] = numpy.nan
+
+        # A product appears under every category it was listed in
+        categories = table.column('categories').combine_chunks()
+        self.by_category = group_positions(categories.flatten(),
+                                           pyarrow.compute.list_parent_indices(categories).to_numpy())
+        brands = table.column('brand').combine_chunks()
+        self.by_brand = group_positions(pyarrow.compute.fill_null(brands, ''), numpy.arange(len(table)))
+        self.by_brand.pop('', None)
+
+    @classmethod
+    def load(cls, path, cache=True):
+        return cls(load_table(path, cache))
+
+    def numbers(self, column):
+        # Float array of a numeric column, missing values as NaN
+        return self.table.column(column).to_numpy().astype(numpy.float64)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def categories(self):
+        return sorted(self.by_category)
+
+    def brands(self):
+        return sorted(self.by_brand)
+
+    def query(self, category=None, brand=None, min_price=None, max_price=None, min_rating=None, min_reviews=None,
+              min_discount=None):
+        # Positions of the products meeting every given condition; a missing value never matches
+        mask = numpy.ones(len(self), dtype=bool)
+        for index, key in ((self.by_category, category), (self.by_brand, brand)):
+            if key is not None:
+                selected = numpy.zeros(len(self), dtype=bool)
+                selected[index.get(key, [])] = True
+                mask &= selected
+        for values, low, high in ((self.sale_price, min_price, max_price), (self.rating, min_rating, None),
+                                  (self.reviews, min_reviews, None), (self.discount, min_discount, None)):
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return numpy.flatnonzero(mask)
+
+    def rows(self, positions):
+        # Products at the given positions as dicts of typed values
+        return self.table.take(pyarrow.array(positions, type=pyarrow.int64())).to_pylist()
+
+    def mean_discount_by_category(self):
+        return {name: float(numpy.nanmean(self.discount[positions])) if len(positions) else numpy.nan
+                for name, positions in sorted(self.by_category.items())}
+
+    def mean_price_by_brand(self):
+        return {name: float(numpy.nanmean(self.sale_price[positions])) if len(positions) else numpy.nan
+                for name, positions in sorted(self.by_brand.items())}
+
+    def to_pandas(self):
+        frame = self.table.to_pandas()
+        frame['discount'] = self.discount
+        return frame
+
+
+if __name__ == '__main__':
+    dataset = ProductDataset.load(sys.argv[1] if len(sys.argv) > 1 else 'product_data.csv')
+    print(f"{len(dataset)} products, {len(dataset.by_category)} categories, {len(dataset.by_brand)} brands.")
+    for category, discount in dataset.mean_discount_by_category().items():
+        print(f"  {category:<24}{len(dataset.by_category[category]):>6} products{discount:>8.1f}% mean discount")
@@ -0,0 +1,260 @@
+# Declarative description of every field scraped from a Decathlon product page.
+# The same table drives the in-browser extraction (one page.evaluate per product)
+# and reproduces the values of the get_* functions in final.py.
+
+# Columns of product_data.csv, in order
+COLUMNS = ['product_url', 'category', 'product_name', 'brand', 'star_rating', 'number_of_reviews',
+           'MRP', 'sale_price', 'colour', 'product information', 'Product description']
+
+# Value used when a field cannot be found on the page
+NOT_AVAILABLE = "Not Available"
+# Block of the reviews widget (rating and review count). Products without reviews do not have it, so their
+# late fields are known to be missing once it has not shown up shortly after the page load.
+REVIEWS_BLOCK = ".de-StarRating"
+# Longest wait (ms) for a late field whose block is on the page
+LATE_FIELD_WAIT = 5000
+# Longest wait (ms) for the block itself when it is not on the page at the load event, in case the widget
+# script injects it
+PROBE_WAIT = 1500
+
+
+def strip_text(text):
+    # Remove any leading/trailing whitespace
+    return text.strip()
+
+
+def third_word(text):
+    # "Rated 4.5 out of 5 stars" -> "4.5"
+    return text.split(" ")[2]
+
+
+def rating_value(text):
+    # "Rated 4.5 out of 5 stars" -> "4.5", the first number of the label
+    return next((word for word in text.split() if word.replace('.', '', 1).isdigit()), NOT_AVAILABLE)
+
+
+def first_word(text):
+    # "7366 Reviews)" -> "7366"; the live pages break the line before "Reviews)", so split on any whitespace
+    return text.split()[0]
+
+
+def rating_text(value):
+    # A rating as the page prints it: 4.0 or "4.0" -> "4", 4.5 -> "4.5"
+    return f"{float(value):g}"
+
+
+def name_value_dict(pairs):
+    # Remove newline characters from the name and value strings and keep the page order
+    return {name.replace("\n", ""): value.replace("\n", "") for name, value in pairs}
+
+
+def description_lines(text):
+    # Split the text into a list by newline characters, drop empty lines and photo captions
+    lines = list(filter(None, text.split('\n')))
+    return [line.strip() for line in lines if line.strip() and "A photo" not in line]
+
+
+# Every field of a product page:
+#   selectors - CSS selectors tried in order, the first match wins
+#   property  - DOM property read from the matched element ('textContent' or 'innerText')
+#   entries   - for name/value tables, the container, entry, name and value selectors
+#   post      - Python post-processing applied to the raw value
+#   missing   - value used when no selector matches or post-processing fails
+#   wait      - the field is rendered late by a widget: longest wait (ms) for it before giving up
+#   probe     - selectors of the block the late field is rendered into; without it the field is not waited for
+#   probe_wait - longest wait (ms) for that block when it is not on the page yet
+FIELD_SPECS = [
+    {'name': 'product_name',
+     'selectors': [".de-u-textGrow1.de-u-md-textGrow2.de-u-textMedium.de-u-spaceBottom06"],
+     'property': 'textContent', 'post': strip_text, 'missing': NOT_AVAILABLE},
+    {'name': 'brand',
+     'selectors': ["svg[role='img'] title"],
+     'property': 'textContent', 'post': None, 'missing': NOT_AVAILABLE},
+    {'name': 'star_rating',
+     'selectors': [".de-StarRating-fill + .de-u-hiddenVisually"],
+     'property': 'innerText', 'post': third_word, 'missing': NOT_AVAILABLE,
+     'wait': LATE_FIELD_WAIT, 'probe': [REVIEWS_BLOCK], 'probe_wait': PROBE_WAIT},
+    {'name': 'number_of_reviews',
+     'selectors': ["span.de-u-textMedium.de-u-textSelectNone.de-u-textBlue"],
+     'property': 'innerText', 'post': first_word, 'missing': NOT_AVAILABLE,
+     'wait': LATE_FIELD_WAIT, 'probe': [REVIEWS_BLOCK], 'probe_wait': PROBE_WAIT},
+    {'name': 'MRP',
+     'selectors': [".js-de-CrossedOutPrice > .js-de-PriceAmount"],
+     'property': 'innerText', 'post': None, 'missing': NOT_AVAILABLE},
+    {'name': 'sale_price',
+     'selectors': [".js-de-CurrentPrice > .js-de-PriceAmount"],
+     'property': 'textContent', 'post': None, 'missing': NOT_AVAILABLE},
+    {'name': 'colour',
+     'selectors': ["div.de-u-spaceTop06.de-u-lineHeight1.de-u-hidden.de-u-md-block.de-u-spaceBottom2 strong + span.js-de-ColorInfo",
+                   "div.de-u-spaceTop06.de-u-lineHeight1 strong + span.js-de-ColorInfo"],
+     'property': 'innerText', 'post': None, 'missing': NOT_AVAILABLE},
+    {'name': 'product information',
+     'entries': {'container': ".de-ProductInformation--multispec", 'entry': ".de-ProductInformation-entry",
+                 'name': "[itemprop=name]", 'value': "[itemprop=value]"},
+     'post': name_value_dict, 'missing': {NOT_AVAILABLE: NOT_AVAILABLE}},
+    {'name': 'Product description',
+     'selectors': [".FeaturesContainer"],
+     'property': 'textContent', 'post': description_lines, 'missing': NOT_AVAILABLE},
+]
+
+# Names of the scraped fields, in the order of the CSV columns
+FIELD_NAMES = [spec['name'] for spec in FIELD_SPECS]
+# Fields rendered late by a widget
+LATE_FIELDS = {spec['name']: spec for spec in FIELD_SPECS if spec.get('wait')}
+
+# Product tile of the search result grid. The tile selectors follow the stand-in server's markup and have not
+# been checked against the live grid; a tile they miss is only visited like a new product.
+TILE_SELECTOR = ".adept-product-display"
+# Fields shown on a tile, named after the columns they fill; selectors are relative to the tile and
+# attribute, when given, is read instead of the DOM property. Values are post-processed like the page fields.
+TILE_SPECS = [
+    {'name': 'product_url',
+     'selectors': [".adept-product-display__title-container"],
+     'attribute': 'href', 'post': None, 'missing': None},
+    {'name': 'product_name',
+     'selectors': [".adept-product-display__title-container"],
+     'property': 'textContent', 'post': strip_text, 'missing': NOT_AVAILABLE},
+    {'name': 'star_rating',
+     'selectors': [".adept-product-display__rating"],
+     'attribute': 'aria-label', 'post': rating_value, 'missing': NOT_AVAILABLE},
+    {'name': 'number_of_reviews',
+     'selectors': [".adept-product-display__reviews"],
+     'property': 'textContent', 'post': first_word, 'missing': NOT_AVAILABLE},
+    {'name': 'MRP',
+     'selectors': [".adept-product-display__compare-price"],
+     'property': 'textContent', 'post': strip_text, 'missing': NOT_AVAILABLE},
+    {'name': 'sale_price',
+     'selectors': [".adept-product-display__price"],
+     'property': 'textContent', 'post': None, 'missing': NOT_AVAILABLE},
+]
+
+# Browser-side reader for FIELD_SPECS: returns the raw value of every field (null when missing) in one call
+EXTRACT_FIELDS_JS = """
+(specs) => {
+    const fields = {};
+    for (const spec of specs) {
+        if (spec.entries) {
+            const container = document.querySelector(spec.entries.container);
+            let pairs = container ? [] : null;
+            if (container) {
+                for (const entry of container.querySelectorAll(spec.entries.entry)) {
+                    const name = entry.querySelector(spec.entries.name);
+                    const value = entry.querySelector(spec.entries.value);
+                    if (!name || !value) {
+                        pairs = null;
+                        break;
+                    }
+                    pairs.push([name.textContent, value.textContent]);
+                }
+            }
+            fields[spec.name] = pairs;
+            continue;
+        }
+        let value = null;
+        for (const selector of spec.selectors) {
+            const element = document.querySelector(selector);
+            if (element) {
+                value = element[spec.property];
+                break;
+            }
+        }
+        fields[spec.name] = value;
+    }
+    return fields;
+}
+"""
+
+
+# Browser-side reader for TILE_SPECS: the raw fields of every tile of the result grid in one call
+HARVEST_TILES_JS = """
+([tileSelector, specs]) => Array.from(document.querySelectorAll(tileSelector), tile => {
+    const fields = {};
+    for (const spec of specs) {
+        let value = null;
+        for (const selector of spec.selectors) {
+            const element = tile.querySelector(selector);
+            if (element) {
+                value = spec.attribute ? element.getAttribute(spec.attribute) : element[spec.property];
+                break;
+            }
+        }
+        fields[spec.name] = value;
+    }
+    return fields;
+})
+"""
+
+
+# Text of the page region the fields are read from, used to fingerprint a product page
+FINGERPRINT_JS = """
+(specs) => specs.map(spec => {
+    const selectors = spec.entries ? [spec.entries.container] : spec.selectors;
+    for (const selector of selectors) {
+        const element = document.querySelector(selector);
+        if (element) {
+            return element.textContent;
+        }
+    }
+    return '';
+}).join('\\u0001')
+"""
+
+
+# Names of the late fields whose block is on the page, probed in one call
+PROBE_FIELDS_JS = """
+(probes) => probes.filter(probe => probe.selectors.some(selector => document.querySelector(selector)))
+                  .map(probe => probe.name)
+"""
+
+
+def browser_specs(specs=FIELD_SPECS):
+    # Drop the Python-only keys so the specs can be sent to page.evaluate
+    return [{key: value for key, value in spec.items()
+             if key not in ('post', 'missing', 'wait', 'probe', 'probe_wait')}
+            for spec in specs]
+
+
+def probe_specs(names):
+    return [{'name': name, 'selectors': LATE_FIELDS[name]['probe']} for name in names]
+
+
+def set_field_waits(waits):
+    # Override the wait (ms) of late fields: {'star_rating': 2000, ...}
+    for name, wait in waits.items():
+        if name not in LATE_FIELDS:
+            raise ValueError(f"{name} is not a late field, choose from {', '.join(LATE_FIELDS)}")
+        LATE_FIELDS[name]['wait'] = wait
+
+
+def set_probe_wait(wait):
+    # Override the wait (ms) for the block of every late field
+    for spec in LATE_FIELDS.values():
+        spec['probe_wait'] = wait
+
+
+def fingerprint_specs():
+    # Late fields are left out of the region text, which depends on how far the reviews widget has rendered;
+    # page_fingerprint adds their values once read with the same waits as the extraction
+    return browser_specs([spec for spec in FIELD_SPECS if spec['name'] not in LATE_FIELDS])
+
+
+def missing_value(spec):
+    # Copy mutable placeholders so rows never share the same dict
+    missing = spec['missing']
+    return dict(missing) if isinstance(missing, dict) else missing
+
+
+def postprocess_fields(raw, specs=FIELD_SPECS):
+    # Turn the raw values read from the page into the final field values
+    fields = {}
+    for spec in specs:
+        value = raw.get(spec['name'])
+        if value is None:
+            fields[spec['name']] = missing_value(spec)
+            continue
+        try:
+            fields[spec['name']] = spec['post'](value) if spec['post'] else value
+        except Exception:
+            # Same fallback as the per-field getters when the text has an unexpected shape
+            fields[spec['name']] = missing_value(spec)
+    return fields
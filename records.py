@@ -0,0 +1,183 @@
+# Typed product records built from the rows the extractors produce: numeric prices, rating and review count,
+# normalised specification keys, and an Arrow schema with the specifications as a map column, so downstream
+# loads read typed columns instead of re-parsing Python reprs row by row.
+#   python records.py product_data.csv product_records.parquet   converts an existing CSV
+import re
+import ast
+import csv
+import sys
+from product_fields import COLUMNS, NOT_AVAILABLE
+from url_index import CATEGORY_SEPARATOR
+
+# Column of the delta rows written by incremental runs, in front of the product columns
+CHANGE_COLUMN = 'change'
+
+NUMBER = re.compile(r'\d[\d,]*(?:\.\d+)?')
+# A quoted string literal as repr() writes it; splitting on it leaves the brackets and separators
+STRING_LITERAL = re.compile(r"('[^'\\]*(?:\\.[^'\\]*)*'|\"[^\"\\]*(?:\\.[^\"\\]*)*\")", re.S)
+
+
+def parse_number(text):
+    # First number in a scraped string: "$1,299.00 " -> 1299.0, "7366 Reviews)" -> 7366.0
+    if not isinstance(text, str) or text == NOT_AVAILABLE:
+        return None
+    found = NUMBER.search(text)
+    return float(found.group().replace(',', '')) if found else None
+
+
+def parse_count(text):
+    number = parse_number(text)
+    return None if number is None else int(number)
+
+
+def clean_text(text):
+    # Collapse runs of whitespace (newlines and the padding of the spec table) to single spaces
+    return ' '.join(text.split())
+
+
+def normalise_spec_key(name):
+    # "      What is the fit of the 100 base layer?    " -> "what_is_the_fit_of_the_100_base_layer"
+    return re.sub(r'[^0-9a-z]+', '_', clean_text(name).lower()).strip('_')
+
+
+def parse_string_repr(text):
+    # The repr of a str -> str dict or of a str list, split in one regular expression pass; anything else
+    # (nesting, numbers) is handed to ast.literal_eval. Nothing is ever evaluated.
+    parts = STRING_LITERAL.split(text)
+    separators = [part.strip() for part in parts[0::2]]
+    literals = parts[1::2]
+    if len(separators) == 1:
+        valid = separators[0] in ('{}', '[]')
+    elif separators[0] == '{' and separators[-1] == '}' and len(literals) % 2 == 0:
+        valid = separators[1:-1] == [':', ','] * (len(literals) // 2 - 1) + [':']
+    elif separators[0] == '[' and separators[-1] == ']':
+        valid = separators[1:-1] == [','] * (len(literals) - 1)
+    else:
+        valid = False
+    if not valid:
+        return ast.literal_eval(text)
+    # Only literals with escapes need the real parser
+    strings = [ast.literal_eval(literal) if '\\' in literal else literal[1:-1] for literal in literals]
+    return dict(zip(strings[::2], strings[1::2])) if separators[0].startswith('{') else strings
+
+
+def parse_literal(value, default):
+    # CSV files hold the dicts and lists as Python reprs, rows fresh from the extractors hold the objects
+    if isinstance(value, str):
+        if value == NOT_AVAILABLE or not value.startswith(('{', '[')):
+            return default
+        try:
+            return parse_string_repr(value)
+        except (ValueError, SyntaxError):
+            return default
+    return value
+
+
+class ProductRecord:
+    __slots__ = ('url', 'categories', 'name', 'brand', 'rating', 'review_count', 'mrp', 'sale_price', 'colour',
+                 'specs', 'description')
+
+    def __init__(self, url, categories, name, brand, rating, review_count, mrp, sale_price, colour, specs,
+                 description):
+        self.url = url
+        self.categories = categories
+        self.name = name
+        self.brand = brand
+        self.rating = rating
+        self.review_count = review_count
+        self.mrp = mrp
+        self.sale_price = sale_price
+        self.colour = colour
+        self.specs = specs
+        self.description = description
+
+    @classmethod
+    def from_row(cls, row):
+        # Row in the COLUMNS order, from the extractors or read back from product_data.csv
+        url, category, name, brand, rating, reviews, mrp, sale_price, colour, information, description = row
+        specs = parse_literal(information, {})
+        description = parse_literal(description, [])
+        return cls(url, [item for item in category.split(CATEGORY_SEPARATOR) if item],
+                   None if name == NOT_AVAILABLE else name,
+                   None if brand == NOT_AVAILABLE else brand,
+                   parse_number(rating), parse_count(reviews), parse_number(mrp), parse_number(sale_price),
+                   None if colour == NOT_AVAILABLE else colour,
+                   {normalise_spec_key(key): clean_text(value) for key, value in specs.items()
+                    if key != NOT_AVAILABLE and normalise_spec_key(key)},
+                   [line for line in description if line])
+
+    def __repr__(self):
+        return f"ProductRecord({self.url!r}, {self.name!r}, sale_price={self.sale_price!r})"
+
+
+def record_schema(with_change=False):
+    import pyarrow
+
+    fields = [('product_url', pyarrow.string()),
+              ('categories', pyarrow.list_(pyarrow.string())),
+              ('product_name', pyarrow.string()),
+              ('brand', pyarrow.string()),
+              ('star_rating', pyarrow.float32()),
+              ('number_of_reviews', pyarrow.int32()),
+              ('mrp', pyarrow.float64()),
+              ('sale_price', pyarrow.float64()),
+              ('colour', pyarrow.string()),
+              ('specs', pyarrow.map_(pyarrow.string(), pyarrow.string())),
+              ('description', pyarrow.list_(pyarrow.string()))]
+    if with_change:
+        fields.insert(0, (CHANGE_COLUMN, pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+def records_table(rows, schema):
+    # Arrow table of a batch of rows; rows of a delta file start with the change column
+    import pyarrow
+
+    changes = None
+    if schema.names[0] == CHANGE_COLUMN:
+        changes = [row[0] for row in rows]
+        rows = [row[1:] for row in rows]
+    records = [ProductRecord.from_row(row) for row in rows]
+    columns = [[record.url for record in records],
+               [record.categories for record in records],
+               [record.name for record in records],
+               [record.brand for record in records],
+               [record.rating for record in records],
+               [record.review_count for record in records],
+               [record.mrp for record in records],
+               [record.sale_price for record in records],
+               [record.colour for record in records],
+               [list(record.specs.items()) for record in records],
+               [record.description for record in records]]
+    if changes is not None:
+        columns.insert(0, changes)
+    return pyarrow.Table.from_arrays([pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                     schema=schema)
+
+
+def read_csv_rows(path):
+    # Rows of a product_data.csv, whatever its header says
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if len(row) == len(COLUMNS):
+                yield tuple(row)
+
+
+def convert_csv(source, target, batch_size=1000):
+    # Rewrite a product_data.csv as typed Parquet, or as an Arrow IPC (feather) file for .arrow/.feather
+    from sinks import open_sink
+
+    output_format = 'arrow' if target.endswith(('.arrow', '.feather')) else 'typed-parquet'
+    with open_sink(target, output_format, COLUMNS, batch_size) as sink:
+        for row in read_csv_rows(source):
+            sink.write(row)
+    return sink.rows_written
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python records.py product_data.csv product_records.parquet")
+    print(f"{convert_csv(sys.argv[1], sys.argv[2])} records written to {sys.argv[2]}.")
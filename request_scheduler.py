@@ -0,0 +1,195 @@
+# Shared scheduler for every page load and click that can fail: bounded per-attempt timeouts, exponential
+# backoff with jitter, a retry budget per host, a circuit breaker that slows the whole crawl when errors
+# spike, and failures classified as timeout, HTTP status or missing selector.
+import random
+import asyncio
+from collections import Counter, deque
+from urllib.parse import urlsplit
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from instrumentation import TIMINGS
+
+# Timeout of one page load attempt (ms)
+NAVIGATION_TIMEOUT = 45000
+# Timeout of one click or selector wait (ms)
+ACTION_TIMEOUT = 30000
+# Attempts per request, the first one included
+MAX_ATTEMPTS = 4
+# Backoff before retry n is a random delay in [0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** n)] seconds
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# Retries allowed per host over a whole run, once spent a failing request is not retried
+HOST_RETRY_BUDGET = 300
+# The breaker opens when at least BREAKER_THRESHOLD of the last BREAKER_WINDOW requests failed
+BREAKER_WINDOW = 20
+BREAKER_THRESHOLD = 0.5
+# Pause added before every request while the breaker is open, doubled each time it trips again
+BREAKER_DELAY = 2.0
+BREAKER_MAX_DELAY = 60.0
+# HTTP statuses worth retrying
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class FetchFailure(Exception):
+    kind = 'error'
+    retryable = True
+
+    def __init__(self, url, message):
+        super().__init__(f"{self.kind} on {url}: {message}")
+        self.url = url
+
+
+class FetchTimeout(FetchFailure):
+    kind = 'timeout'
+
+
+class HttpStatusFailure(FetchFailure):
+    kind = 'http_status'
+
+    def __init__(self, url, status):
+        super().__init__(url, f"HTTP {status}")
+        self.status = status
+        self.retryable = status in RETRYABLE_STATUSES
+
+
+class SelectorMissing(FetchFailure):
+    kind = 'selector_missing'
+
+
+class ExtractionFailure(FetchFailure):
+    # The page loaded but reading it failed (context destroyed by a redirect, malformed document); the
+    # product is re-queued like any failed load
+    kind = 'extraction'
+
+
+def describe(error):
+    # First line of an exception's message, its type when it has none
+    return str(error).splitlines()[0] if str(error) else type(error).__name__
+
+
+class HostRateLimiter:
+    def __init__(self, max_per_second):
+        # Minimum number of seconds between two requests to the same host (0 disables the cap)
+        self.interval = 1 / max_per_second if max_per_second else 0
+        # Earliest time the next request to each host may start
+        self.next_slot = {}
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).netloc
+        # Reserve the next free slot for this host before sleeping, so concurrent callers queue up behind each other
+        now = loop.time()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            with TIMINGS.stage('rate_limit_wait'):
+                await asyncio.sleep(slot - now)
+
+
+def classify_failure(url, error):
+    # Map an exception raised by an attempt onto a FetchFailure
+    if isinstance(error, FetchFailure):
+        return error
+    if isinstance(error, (PlaywrightTimeoutError, asyncio.TimeoutError)):
+        return FetchTimeout(url, str(error).splitlines()[0] if str(error) else 'timed out')
+    return FetchFailure(url, describe(error))
+
+
+class RequestScheduler:
+    def __init__(self, max_per_second=0, navigation_timeout=NAVIGATION_TIMEOUT, max_attempts=MAX_ATTEMPTS,
+                 host_retry_budget=HOST_RETRY_BUDGET):
+        self.rate_limiter = HostRateLimiter(max_per_second)
+        self.navigation_timeout = navigation_timeout
+        self.max_attempts = max_attempts
+        self.host_retry_budget = host_retry_budget
+        # Retries spent per host
+        self.retries = Counter()
+        # Outcome (True for a failure) of the last requests, for the circuit breaker
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)
+        self.breaker_delay = 0.0
+        self.breaker_trips = 0
+        # Final failures by kind
+        self.failures = Counter()
+
+    def record(self, failed):
+        self.outcomes.append(failed)
+        error_rate = sum(self.outcomes) / len(self.outcomes)
+        if len(self.outcomes) == self.outcomes.maxlen and error_rate >= BREAKER_THRESHOLD:
+            # Too many errors: slow every request down and start counting afresh
+            self.breaker_delay = min(BREAKER_MAX_DELAY, max(BREAKER_DELAY, self.breaker_delay * 2))
+            self.breaker_trips += 1
+            self.outcomes.clear()
+            print(f"Error rate {error_rate:.0%}, slowing down to one request every {self.breaker_delay:.0f} s.")
+        elif not failed and self.breaker_delay:
+            # Recover gradually while requests succeed
+            self.breaker_delay = self.breaker_delay / 2 if self.breaker_delay > 0.1 else 0.0
+
+    def backoff(self, attempt):
+        # Full jitter exponential backoff
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+    async def run(self, url, attempt_fn):
+        # Call attempt_fn() until it succeeds, the failure is not retryable, or attempts or budget run out
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_attempts):
+            if self.breaker_delay:
+                with TIMINGS.stage('breaker_wait'):
+                    await asyncio.sleep(self.breaker_delay)
+            await self.rate_limiter.wait(url)
+            try:
+                result = await attempt_fn()
+            except Exception as error:
+                failure = classify_failure(url, error)
+                self.record(True)
+                last_attempt = attempt == self.max_attempts - 1
+                if not failure.retryable or last_attempt or self.retries[host] >= self.host_retry_budget:
+                    self.failures[failure.kind] += 1
+                    TIMINGS.count(f'failures:{failure.kind}')
+                    raise failure from error
+                self.retries[host] += 1
+                TIMINGS.count(f'retries:{failure.kind}')
+                with TIMINGS.stage('backoff_wait'):
+                    await asyncio.sleep(self.backoff(attempt))
+            else:
+                self.record(False)
+                return result
+
+    async def goto(self, page, url, ready_selector=None):
+        # Load a page; HTTP errors and a missing ready_selector count as failed attempts
+        async def attempt():
+            with TIMINGS.stage('goto', url):
+                response = await page.goto(url, timeout=self.navigation_timeout)
+            if response is not None and response.status >= 400:
+                raise HttpStatusFailure(url, response.status)
+            if ready_selector is not None:
+                try:
+                    with TIMINGS.stage('ready_selector', url):
+                        await page.wait_for_selector(ready_selector, timeout=ACTION_TIMEOUT)
+                except PlaywrightTimeoutError:
+                    raise SelectorMissing(url, ready_selector)
+            return response
+
+        return await self.run(url, attempt)
+
+    def summary(self):
+        failures = ', '.join(f"{count} {kind}" for kind, count in self.failures.most_common()) or 'none'
+        return (f"Retries: {sum(self.retries.values())}; failed requests: {failures}; "
+                f"circuit breaker tripped {self.breaker_trips} times.")
+
+
+# Scheduler used by callers that do not pass their own
+_default_scheduler = None
+
+
+def default_scheduler():
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = RequestScheduler()
+    return _default_scheduler
+
+
+def set_default_scheduler(scheduler):
+    # Share one scheduler (rate cap, retry budgets, breaker) between discovery and product scraping
+    global _default_scheduler
+    _default_scheduler = scheduler
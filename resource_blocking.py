@@ -0,0 +1,63 @@
+# Route interception for product page loads: aborts the requests the field extraction never needs
+# (images, fonts, video, analytics and ads) and counts what was blocked and what was still transferred.
+import re
+from collections import Counter
+from instrumentation import TIMINGS
+
+# Resource types aborted by default. Stylesheets and scripts are kept: the reviews widget is rendered
+# by a script and innerText depends on the page styles.
+BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font')
+# URL patterns (regular expressions) aborted whatever their resource type
+DENIED_URL_PATTERNS = (r'google-analytics\.com', r'googletagmanager\.com', r'doubleclick\.net',
+                       r'facebook\.(net|com)', r'hotjar\.com', r'criteo\.(com|net)', r'tiktok\.com',
+                       r'pinterest\.com', r'bing\.com', r'clarity\.ms', r'/analytics', r'/collect\?')
+# URL patterns that are always let through, checked before everything else
+ALLOWED_URL_PATTERNS = ()
+
+
+class ResourceBlocker:
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, denied_patterns=DENIED_URL_PATTERNS,
+                 allowed_patterns=ALLOWED_URL_PATTERNS):
+        self.resource_types = set(resource_types)
+        self.denied = [re.compile(pattern) for pattern in denied_patterns]
+        self.allowed = [re.compile(pattern) for pattern in allowed_patterns]
+        # Aborted requests by resource type
+        self.blocked = Counter()
+        # Requests that went through and the bytes they transferred (headers and body)
+        self.requests_loaded = 0
+        self.bytes_loaded = 0
+
+    def should_block(self, url, resource_type):
+        if any(pattern.search(url) for pattern in self.allowed):
+            return False
+        return resource_type in self.resource_types or any(pattern.search(url) for pattern in self.denied)
+
+    async def handle_route(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked[request.resource_type] += 1
+            TIMINGS.count('requests_blocked')
+            await route.abort('blockedbyclient')
+        else:
+            # Let the next handler (or the network) serve the request
+            await route.fallback()
+
+    async def record_request(self, request):
+        # Transferred size of every request that finished
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        size = sizes['responseHeadersSize'] + max(sizes['responseBodySize'], 0)
+        self.requests_loaded += 1
+        self.bytes_loaded += size
+        TIMINGS.count('bytes_transferred', size)
+
+    async def install(self, context):
+        await context.route('**/*', self.handle_route)
+        context.on('requestfinished', self.record_request)
+
+    def summary(self):
+        blocked = ', '.join(f"{count} {resource_type}" for resource_type, count in self.blocked.most_common())
+        return (f"Blocked {sum(self.blocked.values())} requests ({blocked or 'none'}); "
+                f"loaded {self.requests_loaded} requests, {self.bytes_loaded / 1e6:.1f} MB.")
@@ -0,0 +1,162 @@
+# On-disk cache of product and search page documents keyed by canonical URL. Every cached page is revalidated
+# with If-None-Match / If-Modified-Since by default, so a changed price is always seen; a TTL lets fresh entries
+# be served without touching the network. Responses marked no-store or private are never cached.
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from url_index import canonical_product_url
+
+# Default cache location, freshness lifetime and size limit
+CACHE_DIR = 'response_cache'
+CACHE_TTL = 0
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Headers that describe the transfer rather than the document, dropped when a cached body is served
+HOP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+
+def cache_directives(headers):
+    # Directive names of the Cache-Control header: 'no-store, max-age=0' -> {'no-store', 'max-age'}
+    value = next((value for name, value in headers.items() if name.lower() == 'cache-control'), '')
+    return {directive.split('=', 1)[0].strip().lower() for directive in value.split(',') if directive.strip()}
+
+
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.sqlite'))
+        # WAL lets the shard processes of a sharded crawl read the index while another one writes
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, status INTEGER, headers TEXT, etag TEXT, '
+            'last_modified TEXT, fetched_at REAL, last_access REAL, size INTEGER)')
+        self.connection.commit()
+        # hits: served fresh, revalidated: 304 from the server, misses: full download
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'evicted': 0}
+
+    def body_path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, url):
+        # Cached entry of a URL (with its body), or None
+        key = canonical_product_url(url)
+        row = self.connection.execute(
+            'SELECT status, headers, etag, last_modified, fetched_at FROM entries WHERE url = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            with open(self.body_path(key), 'rb') as file:
+                body = file.read()
+        except OSError:
+            return None
+        status, headers, etag, last_modified, fetched_at = row
+        with self.connection:
+            self.connection.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), key))
+        return {'url': key, 'status': status, 'headers': json.loads(headers), 'etag': etag,
+                'last_modified': last_modified, 'fetched_at': fetched_at, 'body': body}
+
+    def is_fresh(self, entry):
+        # A page marked no-cache is revalidated whatever the TTL
+        if 'no-cache' in cache_directives(entry['headers']):
+            return False
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        # Validators sent when revalidating a stale entry
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, status, headers, body):
+        key = canonical_product_url(url)
+        headers = {name.lower(): value for name, value in headers.items() if name.lower() not in HOP_HEADERS}
+        with open(self.body_path(key), 'wb') as file:
+            file.write(body)
+        now = time.time()
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (key, status, json.dumps(headers), headers.get('etag'),
+                                     headers.get('last-modified'), now, now, len(body)))
+        self.evict()
+
+    def refresh(self, entry):
+        # The server confirmed the cached body (304): it is fresh again
+        with self.connection:
+            self.connection.execute('UPDATE entries SET fetched_at = ? WHERE url = ?', (time.time(), entry['url']))
+
+    def evict(self):
+        # Drop the least recently used entries until the cache fits in max_bytes
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.connection.execute('SELECT url, size FROM entries ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            with self.connection:
+                self.connection.execute('DELETE FROM entries WHERE url = ?', (key,))
+            try:
+                os.remove(self.body_path(key))
+            except OSError:
+                pass
+            total -= size
+            self.stats['evicted'] += 1
+
+    async def handle_route(self, route):
+        request = route.request
+        # Only main-frame page loads are cached; iframes (ads, trackers, widgets) and everything else go to the
+        # next handler
+        if (request.method != 'GET' or not request.is_navigation_request()
+                or request.frame.parent_frame is not None):
+            await route.fallback()
+            return
+
+        entry = self.get(request.url)
+        if entry is not None and self.is_fresh(entry):
+            self.stats['hits'] += 1
+            await route.fulfill(status=entry['status'], headers=entry['headers'], body=entry['body'])
+            return
+
+        headers = dict(request.headers)
+        if entry is not None:
+            headers.update(self.conditional_headers(entry))
+        try:
+            response = await route.fetch(headers=headers)
+            body = await response.body()
+        except Exception:
+            # Fail the load at once instead of leaving the route unresolved until the navigation times out
+            await route.abort('failed')
+            return
+        if entry is not None and response.status == 304:
+            self.stats['revalidated'] += 1
+            self.refresh(entry)
+            await route.fulfill(status=entry['status'], headers=entry['headers'], body=entry['body'])
+            return
+
+        self.stats['misses'] += 1
+        if response.status == 200 and not cache_directives(response.headers) & {'no-store', 'private'}:
+            self.put(request.url, response.status, response.headers, body)
+        # The body is already decoded, so the transfer headers no longer apply
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in HOP_HEADERS}
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    async def install(self, context):
+        await context.route('**/*', self.handle_route)
+
+    def summary(self):
+        stats = self.stats
+        requests = stats['hits'] + stats['revalidated'] + stats['misses']
+        served = stats['hits'] + stats['revalidated']
+        return (f"Response cache: {stats['hits']} hits, {stats['revalidated']} revalidated (304), "
+                f"{stats['misses']} misses, {stats['evicted']} evicted; "
+                f"{served / requests if requests else 0:.0%} served from cache.")
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,200 @@
+# Browserless product backend for the Shopify storefront: reads /products/<handle>.js (name, brand, prices,
+# colour) through one pooled keep-alive HTTP session, then the page HTML without rendering it (JSON-LD rating
+# and review count, the specification table, the description). Only fields neither document has are left for
+# the browser. Values are normalised to what the browser backend stores in the same columns; with --json-fallback
+# none the description comes from the product.js HTML instead of the page's features block.
+import json
+import asyncio
+from urllib.parse import urlsplit, urlunsplit
+from product_fields import (FIELD_SPECS, NOT_AVAILABLE, LATE_FIELDS, REVIEWS_BLOCK, description_lines,
+                            postprocess_fields, rating_text)
+from instrumentation import TIMINGS
+from request_scheduler import ExtractionFailure, HttpStatusFailure, default_scheduler, describe
+
+# Open connections kept per host
+CONNECTIONS_PER_HOST = 16
+# Timeout (s) of one document request
+REQUEST_TIMEOUT = 20
+# What fills the fields product.js lacks: 'html' reads the page HTML and uses the browser only when the
+# reviews widget is rendered client side, 'browser' renders the page, 'none' leaves them Not Available
+JSON_FALLBACK = 'html'
+# Fields product.js provides
+JSON_FIELDS = ('product_name', 'brand', 'MRP', 'sale_price', 'colour')
+# Read from product.js only when no page is read: its description HTML is not the text of the page's features
+# block the other backends split into lines
+JSON_ONLY_FIELDS = ('Product description',)
+# Fields read from the static page HTML; the late fields come from its JSON-LD
+HTML_SPECS = [spec for spec in FIELD_SPECS if spec['name'] not in JSON_FIELDS and spec['name'] not in LATE_FIELDS]
+# Names of the colour option
+COLOUR_OPTIONS = {'color', 'colour'}
+
+HEADERS = {'Accept': 'application/json, text/html;q=0.9',
+           'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0'}
+
+
+def product_json_url(url):
+    # https://host/products/<handle>?adept-product=... -> https://host/products/<handle>.js
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip('/') + '.js', '', ''))
+
+
+def money(cents):
+    # Same text as the price elements of the page: 999 -> "$9.99 "
+    return f"${cents / 100:.2f} "
+
+
+def html_text(html):
+    # Text of an HTML fragment, one line per paragraph or line break
+    if not html or not html.strip():
+        return ''
+    import lxml.html
+
+    fragment = lxml.html.fragment_fromstring(html, create_parent='div')
+    for element in fragment.iter('br', 'p', 'li', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+        element.tail = '\n' + (element.tail or '')
+    return fragment.text_content()
+
+
+def fields_from_product_json(product):
+    # Map product.js onto the columns; prices are in cents, the first variant is the one the page shows
+    variant = (product.get('variants') or [{}])[0]
+    price = variant.get('price', product.get('price'))
+    compare_at = variant.get('compare_at_price', product.get('compare_at_price'))
+    colour = NOT_AVAILABLE
+    for position, option in enumerate(product.get('options') or []):
+        name = (option.get('name') or '') if isinstance(option, dict) else str(option or '')
+        if name.lower() in COLOUR_OPTIONS and variant.get(f'option{position + 1}'):
+            colour = variant[f'option{position + 1}']
+    description = description_lines(html_text(product.get('description') or ''))
+    return {
+        'product_name': (product.get('title') or '').strip() or NOT_AVAILABLE,
+        'brand': product.get('vendor') or NOT_AVAILABLE,
+        # A price is only crossed out when the compare-at price is above it; the page's MRP is read as
+        # innerText, which drops the trailing space the sale price keeps
+        'MRP': (money(compare_at).rstrip() if compare_at and price is not None and compare_at > price
+                else NOT_AVAILABLE),
+        'sale_price': money(price) if price is not None else NOT_AVAILABLE,
+        'colour': colour,
+        'Product description': description or NOT_AVAILABLE,
+    }
+
+
+def json_ld_products(document):
+    # Product objects of the JSON-LD scripts of a page
+    for script in document.xpath('//script[@type="application/ld+json"]'):
+        try:
+            data = json.loads(script.text or '')
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get('@graph', [data]) if isinstance(data, dict) else []
+        for item in items:
+            if isinstance(item, dict) and item.get('@type') in ('Product', ['Product']):
+                yield item
+
+
+def fields_from_json_ld(document):
+    fields = {}
+    for product in json_ld_products(document):
+        rating = product.get('aggregateRating') or {}
+        try:
+            fields['star_rating'] = rating_text(rating['ratingValue'])
+        except (KeyError, TypeError, ValueError):
+            pass
+        count = rating.get('reviewCount', rating.get('ratingCount'))
+        if count is not None:
+            fields['number_of_reviews'] = str(int(float(count)))
+    return fields
+
+
+class ShopifyFetcher:
+    def __init__(self, concurrency=CONNECTIONS_PER_HOST, scheduler=None, timeout=REQUEST_TIMEOUT,
+                 fallback=JSON_FALLBACK):
+        self.concurrency = concurrency
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.fallback = fallback
+        self.session = None
+        # Products served without the browser, and fields that needed it
+        self.documents_only = 0
+        self.browser_fields = 0
+
+    async def open(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency,
+                                         keepalive_timeout=60, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, headers=HEADERS,
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get(self, url, as_json):
+        # One document through the shared scheduler (rate cap, retries, breaker)
+        async def attempt():
+            with TIMINGS.stage('http_get', url):
+                async with self.session.get(url) as response:
+                    if response.status >= 400:
+                        raise HttpStatusFailure(url, response.status)
+                    body = await response.read()
+                    TIMINGS.count('bytes_transferred', len(body))
+            return json.loads(body) if as_json else body.decode('utf-8', 'replace')
+
+        return await (self.scheduler or default_scheduler()).run(url, attempt)
+
+    async def product_fields(self, url):
+        # (fields read from the documents, names of the fields only the rendered page can give)
+        product = await self.get(product_json_url(url), as_json=True)
+        try:
+            fields = fields_from_product_json(product)
+        except Exception as error:
+            # A malformed product.js fails this product only, it is re-queued like a failed load
+            raise ExtractionFailure(url, f"malformed product.js: {describe(error)}") from error
+        if self.fallback != 'none':
+            # Read from the page like the other backends do
+            for name in JSON_ONLY_FIELDS:
+                del fields[name]
+        other_specs = [spec for spec in FIELD_SPECS if spec['name'] not in fields]
+        if self.fallback == 'none':
+            fields.update(postprocess_fields({}, other_specs))
+        elif self.fallback == 'html':
+            html = await self.get(url, as_json=False)
+            loop = asyncio.get_running_loop()
+            try:
+                page_fields, widget = await loop.run_in_executor(None, read_page_html, html)
+            except Exception as error:
+                raise ExtractionFailure(url, f"unreadable page HTML: {describe(error)}") from error
+            fields.update(page_fields)
+            # A late field JSON-LD lacks needs the browser only when its widget block is on the page
+            if not widget:
+                fields.update(postprocess_fields({}, [spec for spec in other_specs if spec['name'] not in fields]))
+        missing = [spec['name'] for spec in other_specs if spec['name'] not in fields]
+        if missing:
+            self.browser_fields += len(missing)
+        else:
+            self.documents_only += 1
+        return fields, missing
+
+    def summary(self):
+        return (f"Shopify backend: {self.documents_only} products from documents only, "
+                f"{self.browser_fields} fields read from the browser.")
+
+
+def read_page_html(html):
+    # (static fields and JSON-LD fields of the page, whether the reviews widget block is on it), run off the
+    # event loop
+    import lxml.html
+    from html_extract import extract_raw_fields
+
+    document = lxml.html.fromstring(html)
+    fields = postprocess_fields(extract_raw_fields(document, HTML_SPECS), HTML_SPECS)
+    fields.update(fields_from_json_ld(document))
+    return fields, bool(document.cssselect(REVIEWS_BLOCK))
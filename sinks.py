@@ -0,0 +1,173 @@
+# Streaming writers for scraped product rows. Rows are written in batches while the crawl runs,
+# so memory stays flat and partial results are visible on disk.
+import os
+import csv
+import json
+from product_fields import COLUMNS
+from records import CHANGE_COLUMN, record_schema, records_table
+
+# Number of rows buffered before they are written out
+BATCH_SIZE = 50
+
+
+class RowSink:
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        self.path = path
+        self.columns = columns
+        self.batch_size = batch_size
+        self.batch = []
+        self.rows_written = 0
+
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.write_batch(self.batch)
+            self.rows_written += len(self.batch)
+            self.batch = []
+
+    def write_batch(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(RowSink):
+    # Same layout as DataFrame.to_csv: header row, dicts and lists written as their Python repr
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        super().__init__(path, columns, batch_size)
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file, lineterminator='\n')
+        self.writer.writerow(columns)
+        self.file.flush()
+
+    def write_batch(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class JsonlSink(RowSink):
+    # One JSON object per line, keyed by column name
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        super().__init__(path, columns, batch_size)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write_batch(self, rows):
+        self.file.writelines(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n' for row in rows)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ParquetSink(RowSink):
+    # One row group per batch; nested values (dicts, lists) are stored as JSON strings
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        import pyarrow
+        import pyarrow.parquet
+
+        super().__init__(path, columns, batch_size)
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_batch(self, rows):
+        columns = [[None if value is None else value if isinstance(value, str) else json.dumps(value)
+                    for value in column] for column in zip(*rows)]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class TypedParquetSink(RowSink):
+    # Typed columns from records.ProductRecord: numeric prices, rating and review count, the specifications
+    # as a map and the description as a list
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        import pyarrow.parquet
+
+        super().__init__(path, columns, batch_size)
+        self.schema = record_schema(columns[0] == CHANGE_COLUMN)
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_batch(self, rows):
+        self.writer.write_table(records_table(rows, self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class ArrowSink(RowSink):
+    # Same typed columns in an Arrow IPC (feather v2) file, which can be memory-mapped when read back
+    def __init__(self, path, columns=COLUMNS, batch_size=BATCH_SIZE):
+        import pyarrow.ipc
+
+        super().__init__(path, columns, batch_size)
+        self.schema = record_schema(columns[0] == CHANGE_COLUMN)
+        self.writer = pyarrow.ipc.new_file(path, self.schema)
+
+    def write_batch(self, rows):
+        self.writer.write_table(records_table(rows, self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+SINKS = {
+    'csv': CsvSink,
+    'jsonl': JsonlSink,
+    'parquet': ParquetSink,
+    'typed-parquet': TypedParquetSink,
+    'arrow': ArrowSink,
+    'feather': ArrowSink,
+}
+
+
+def open_sink(path, output_format=None, columns=COLUMNS, batch_size=BATCH_SIZE):
+    # The format defaults to the file extension
+    output_format = output_format or os.path.splitext(path)[1].lstrip('.').lower() or 'csv'
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return SINKS[output_format](path, columns, batch_size)
+
+
+class OrderedWriter:
+    # Rows finish out of order with concurrent workers: hold them until every earlier row is written.
+    # A None row takes its place in the order but writes nothing.
+    def __init__(self, sink):
+        self.sink = sink
+        self.pending = {}
+        self.next_index = 0
+
+    def add(self, index, row):
+        self.pending[index] = row
+        while self.next_index in self.pending:
+            row = self.pending.pop(self.next_index)
+            if row is not None:
+                self.sink.write(row)
+            self.next_index += 1
+
+    def drain(self):
+        # Write the rows still held behind products that never finished (time budget spent), in order
+        for index in sorted(self.pending):
+            row = self.pending.pop(index)
+            if row is not None:
+                self.sink.write(row)
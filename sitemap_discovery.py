@@ -0,0 +1,217 @@
+# Product discovery from the store's sitemaps instead of the search UI: sitemap.xml is an index of
+# sitemap_products_*.xml files listing every product URL with its last modification time. The files are
+# streamed through an incremental XML parser, so entries come out while the download goes on and no file is
+# ever held whole, and a small state database keeps the lastmod of every product scraped so a run only queues
+# the products modified since.
+#   python sitemap_discovery.py https://www.decathlon.com/sitemap.xml   lists the product URLs
+import re
+import sys
+import zlib
+import asyncio
+import sqlite3
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlsplit
+from xml.etree.ElementTree import XMLPullParser
+from request_scheduler import HttpStatusFailure, default_scheduler
+from url_index import BASE_URL, canonical_product_url
+
+# Sitemap index of the store
+SITEMAP_URL = urljoin(BASE_URL, '/sitemap.xml')
+# Child sitemaps of the index that list products (Shopify also lists pages, collections and blogs)
+PRODUCT_SITEMAPS = r'sitemap_products_'
+# Default location of the lastmod database
+SITEMAP_STATE_PATH = 'sitemap_state.sqlite'
+# Bytes read from the network and fed to the parser at a time
+CHUNK_SIZE = 64 * 1024
+# Parsed entries held ahead of the consumer before the download pauses
+ENTRY_QUEUE_SIZE = 1000
+# The sitemap does not say which categories list a product
+SITEMAP_CATEGORY = ''
+
+
+def local_name(tag):
+    # '{http://www.sitemaps.org/schemas/sitemap/0.9}loc' -> 'loc'
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_lastmod(text):
+    # W3C datetime ('2026-05-18', '2026-05-18T08:00:00Z', '2026-05-18T08:00:00-04:00') -> POSIX timestamp
+    if not text:
+        return None
+    try:
+        moment = datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class SitemapParser:
+    # Incremental parser of a sitemap or sitemap index: feed() bytes as they arrive, entries() yields
+    # ('url' or 'sitemap', loc, lastmod) for every entry completed so far
+    def __init__(self):
+        self.parser = XMLPullParser(events=('start', 'end'))
+        self.root = None
+
+    def feed(self, data):
+        self.parser.feed(data)
+
+    def close(self):
+        self.parser.close()
+
+    def entries(self):
+        for event, element in self.parser.read_events():
+            if event == 'start':
+                if self.root is None:
+                    self.root = element
+                continue
+            kind = local_name(element.tag)
+            if kind not in ('url', 'sitemap'):
+                continue
+            loc = lastmod = None
+            for child in element:
+                name = local_name(child.tag)
+                if name == 'loc':
+                    loc = (child.text or '').strip()
+                elif name == 'lastmod':
+                    lastmod = parse_lastmod(child.text)
+            # Entries are direct children of the root; dropping them keeps memory flat whatever the file size
+            self.root.clear()
+            if loc:
+                yield kind, loc, lastmod
+
+
+def iter_sitemap_entries(chunks):
+    # Entries of a sitemap given as an iterable of byte chunks (a file read piecewise, a fixture)
+    parser = SitemapParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.entries()
+    parser.close()
+    yield from parser.entries()
+
+
+async def stream_sitemap(session, url, scheduler=None):
+    # Entries of one sitemap, parsed while it downloads; .xml.gz files are inflated on the fly. The whole
+    # download is one scheduler attempt, so a connection dropped mid-body is retried like a failed request,
+    # and the retry skips the entries already passed on.
+    entries = asyncio.Queue(maxsize=ENTRY_QUEUE_SIZE)
+    passed_on = 0
+
+    async def attempt():
+        nonlocal passed_on
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if urlsplit(url).path.endswith('.gz') else None
+        parser = SitemapParser()
+        seen = 0
+        async with session.get(url) as response:
+            if response.status >= 400:
+                raise HttpStatusFailure(url, response.status)
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                parser.feed(inflater.decompress(chunk) if inflater else chunk)
+                for entry in parser.entries():
+                    seen += 1
+                    if seen > passed_on:
+                        passed_on = seen
+                        await entries.put(entry)
+        parser.close()
+        for entry in parser.entries():
+            seen += 1
+            if seen > passed_on:
+                passed_on = seen
+                await entries.put(entry)
+
+    async def download():
+        try:
+            await (scheduler or default_scheduler()).run(url, attempt)
+        except Exception as error:
+            await entries.put(error)
+        else:
+            await entries.put(None)
+
+    task = asyncio.create_task(download())
+    try:
+        while True:
+            entry = await entries.get()
+            if entry is None:
+                break
+            if isinstance(entry, Exception):
+                raise entry
+            yield entry
+    finally:
+        task.cancel()
+
+
+async def sitemap_products(session, sitemap_url=SITEMAP_URL, scheduler=None, sitemaps=PRODUCT_SITEMAPS):
+    # (product URL, lastmod) of every product, following the index into its product sitemaps one at a time
+    pattern = re.compile(sitemaps)
+    pending = [sitemap_url]
+    while pending:
+        url = pending.pop(0)
+        async for kind, loc, lastmod in stream_sitemap(session, url, scheduler):
+            if kind == 'sitemap':
+                if pattern.search(loc):
+                    pending.append(urljoin(url, loc))
+            elif '/products/' in urlsplit(loc).path:
+                yield loc, lastmod
+
+
+class SitemapState:
+    # Last modification time of every product scraped from the sitemap by a previous run
+    def __init__(self, path=SITEMAP_STATE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS products (url TEXT PRIMARY KEY, lastmod REAL)')
+        self.connection.commit()
+
+    def lastmods(self):
+        return dict(self.connection.execute('SELECT url, lastmod FROM products'))
+
+    def record(self, entries):
+        # (canonical url, lastmod) pairs of the products whose row this run produced
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO products VALUES (?, ?)', entries)
+
+    def close(self):
+        self.connection.close()
+
+
+def modified_since(lastmod, previous):
+    # A product is queued unless an earlier run saw it with the same or a later lastmod
+    return previous is None or lastmod is None or lastmod > previous
+
+
+async def discover_from_sitemap(sitemap_url=SITEMAP_URL, state=None, scheduler=None, sitemaps=PRODUCT_SITEMAPS,
+                                connections=4, found=None, listed=None, session=None):
+    # (url, category) pairs of the products modified since the previous run (all of them without a state),
+    # in sitemap order. found(pairs), when given, receives every product as soon as it is parsed; listed, a
+    # dict, is filled with the lastmod of every product of the sitemap, for the caller to record in the state
+    # once a product's row is produced (a product given up or left for later is then queued again). Without
+    # a session, one is opened for the run.
+    if session is None:
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=connections)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(sock_read=60)) as session:
+            return await discover_from_sitemap(sitemap_url, state, scheduler, sitemaps, connections, found,
+                                               listed, session)
+
+    previous = state.lastmods() if state is not None else {}
+    listed = {} if listed is None else listed
+    product_urls = []
+    async for url, lastmod in sitemap_products(session, sitemap_url, scheduler, sitemaps):
+        canonical = canonical_product_url(url)
+        listed[canonical] = lastmod
+        if modified_since(lastmod, previous.get(canonical)):
+            product_urls.append((canonical, SITEMAP_CATEGORY))
+            if found is not None:
+                await found(product_urls[-1:])
+    print(f"{len(listed)} products in the sitemap, {len(product_urls)} new or modified since the last run.")
+    return product_urls
+
+
+if __name__ == '__main__':
+    product_urls = asyncio.run(discover_from_sitemap(sys.argv[1] if len(sys.argv) > 1 else SITEMAP_URL))
+    for url, category in product_urls:
+        print(url)
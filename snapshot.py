@@ -0,0 +1,59 @@
+# Snapshot of the last scraped state of every product: a fingerprint of the field region of its page
+# and its row. Incremental runs compare against it to skip unchanged products and emit only a delta.
+# The fingerprint is taken from the loaded page (the documents with --backend shopify), rating and review
+# count included, so an unchanged product still costs its page load and the late-field wait; what it saves is
+# the extraction of the other fields, their post-processing and the write of an unchanged row.
+import json
+import time
+import sqlite3
+from url_index import CATEGORY_SEPARATOR
+
+# Default location of the snapshot database
+SNAPSHOT_PATH = 'product_snapshot.sqlite'
+
+# Kinds of rows in the delta file
+NEW, CHANGED, REMOVED = 'new', 'changed', 'removed'
+
+
+class SnapshotStore:
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS products (url TEXT PRIMARY KEY, fingerprint TEXT, row TEXT, seen_at REAL)')
+        self.connection.commit()
+
+    def get(self, url):
+        # Previous fingerprint and row of a product, or None for a product never seen
+        found = self.connection.execute('SELECT fingerprint, row FROM products WHERE url = ?', (url,)).fetchone()
+        if found is None:
+            return None
+        return {'fingerprint': found[0], 'row': tuple(json.loads(found[1]))}
+
+    def put(self, url, fingerprint, row):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)',
+                                    (url, fingerprint, json.dumps(list(row)), time.time()))
+
+    def touch(self, url):
+        # The product was seen unchanged in this run
+        with self.connection:
+            self.connection.execute('UPDATE products SET seen_at = ? WHERE url = ?', (time.time(), url))
+
+    def pop_removed(self, seen_urls, unvisited_categories=()):
+        # Rows of the products that are no longer listed, deleted from the snapshot. Products listed under a
+        # category this run did not crawl may still be listed there and are kept.
+        seen_urls = set(seen_urls)
+        unvisited_categories = set(unvisited_categories)
+        removed = [(url, tuple(json.loads(row)))
+                   for url, row in self.connection.execute('SELECT url, row FROM products')
+                   if url not in seen_urls]
+        removed = [(url, row) for url, row in removed
+                   if not unvisited_categories & set(row[1].split(CATEGORY_SEPARATOR))]
+        with self.connection:
+            self.connection.executemany('DELETE FROM products WHERE url = ?', [(url,) for url, row in removed])
+        return [row for url, row in removed]
+
+    def close(self):
+        self.connection.close()
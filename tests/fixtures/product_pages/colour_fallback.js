@@ -0,0 +1,26 @@
+{
+  "id": 2,
+  "title": "Men's Fleece Jacket MH120",
+  "handle": "mens-fleece-jacket-mh120",
+  "vendor": "Quechua",
+  "price": 1500,
+  "compare_at_price": null,
+  "options": [
+    {
+      "name": "Colour",
+      "position": 1,
+      "values": [
+        "Dark Grey"
+      ]
+    }
+  ],
+  "variants": [
+    {
+      "id": 21,
+      "option1": "Dark Grey",
+      "price": 1500,
+      "compare_at_price": null
+    }
+  ],
+  "description": "<p>Warmth</p>"
+}
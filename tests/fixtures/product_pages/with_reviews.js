@@ -0,0 +1,35 @@
+{
+  "id": 1,
+  "title": "Thermal Underwear Base Layer Top Women's",
+  "handle": "womens-ski-simple-warm-base-layer",
+  "vendor": "Decathlon Wedze",
+  "price": 800,
+  "compare_at_price": 999,
+  "options": [
+    {
+      "name": "Color",
+      "position": 1,
+      "values": [
+        "Black"
+      ]
+    },
+    {
+      "name": "Size",
+      "position": 2,
+      "values": [
+        "S",
+        "M"
+      ]
+    }
+  ],
+  "variants": [
+    {
+      "id": 11,
+      "option1": "Black",
+      "option2": "S",
+      "price": 800,
+      "compare_at_price": 999
+    }
+  ],
+  "description": "<p><strong>Designed for female skiers and snowboarders.</strong></p><p>This warm base layer, will keep you comfortable throughout the day.</p>"
+}
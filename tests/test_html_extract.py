@@ -0,0 +1,96 @@
+# Parity of the lxml backend with the browser backend on saved product pages. The lxml values are checked
+# against what the browser reads from the same markup (innerText, textContent); the browser comparison itself
+# runs only where Playwright and Firefox are installed.
+import os
+import asyncio
+import pytest
+import lxml.html
+from html_extract import compare_backends, extract_fields_from_file, inner_text
+from product_fields import NOT_AVAILABLE
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'product_pages')
+
+EXPECTED = {
+    'with_reviews.html': {
+        'product_name': "Thermal Underwear Base Layer Top Women's",
+        'brand': 'Decathlon Wedze',
+        'star_rating': '4.5',
+        # innerText breaks the line at the <br>, first_word splits on it
+        'number_of_reviews': '7366',
+        # innerText drops the trailing space textContent keeps
+        'MRP': '$9.99',
+        'sale_price': '$8.00 ',
+        # The desktop colour block wins over the mobile one
+        'colour': 'Black',
+        'product information': {'      Composition    ': ' Main fabric: 100.0% Polyester',
+                                '      What is the fit of the 100 base layer?    ':
+                                    ' The 100 base layer comes in a REGULAR fit.'},
+        'Product description': ["Thermal Underwear Base Layer Top Women's | Designed for female skiers and "
+                                "snowboarders.",
+                                'This warm base layer, will keep you comfortable throughout the day.',
+                                'Moisture wicking',
+                                'VERY LOW: a fabric that provides moisture wicking and low-level drying.',
+                                'Warmth', 'AVERAGE: brushed lining for warmth.'],
+    },
+    'no_reviews.html': {
+        'product_name': "Kids' Hiking Cap",
+        'brand': 'Quechua',
+        'star_rating': NOT_AVAILABLE,
+        'number_of_reviews': NOT_AVAILABLE,
+        'MRP': NOT_AVAILABLE,
+        'sale_price': '$6.00 ',
+        'colour': 'Navy',
+        'product information': {'Composition': ' 100% Polyester'},
+        # textContent keeps hidden text
+        'Product description': ['Sun protection', 'UPF 50+ fabric (internal note)'],
+    },
+    'colour_fallback.html': {
+        'product_name': "Men's Fleece Jacket MH120",
+        'brand': 'Quechua',
+        'star_rating': '4',
+        'number_of_reviews': '212',
+        'MRP': NOT_AVAILABLE,
+        'sale_price': '$15.00 ',
+        # Second colour selector; innerText collapses the spaces
+        'colour': 'Dark Grey',
+        'product information': {'Composition': ' 100% Polyester'},
+        'Product description': ['Warmth'],
+    },
+    'no_spec_table.html': {
+        'product_name': 'Sport Bag 40 L',
+        'brand': 'Kipsta',
+        'star_rating': NOT_AVAILABLE,
+        'number_of_reviews': NOT_AVAILABLE,
+        'MRP': '$25.00',
+        'sale_price': '$19.99 ',
+        'colour': NOT_AVAILABLE,
+        'product information': {NOT_AVAILABLE: NOT_AVAILABLE},
+        'Product description': NOT_AVAILABLE,
+    },
+}
+
+
+@pytest.mark.parametrize('name', sorted(EXPECTED))
+def test_html_backend(name):
+    assert extract_fields_from_file(os.path.join(FIXTURES, name)) == EXPECTED[name]
+
+
+@pytest.mark.parametrize('html, text', [
+    ('<div>one <b>two</b>   three</div>', 'one two three'),
+    ('<div>line<br>break</div>', 'line\nbreak'),
+    ('<div><p>first</p><p>second</p></div>', 'first\nsecond'),
+    ('<div>shown<span hidden>hidden</span><span style="display: none">gone</span> text</div>', 'shown text'),
+    ('<div>text<script>var x = 1;</script> after</div>', 'text after'),
+])
+def test_inner_text(html, text):
+    assert inner_text(lxml.html.fragment_fromstring(html)) == text
+
+
+def test_browser_parity():
+    async_api = pytest.importorskip('playwright.async_api')
+    paths = [os.path.join(FIXTURES, name) for name in sorted(EXPECTED)]
+    try:
+        mismatches = asyncio.run(compare_backends(paths))
+    except async_api.Error as error:
+        pytest.skip(f"no browser to compare against: {error.message.splitlines()[0]}")
+    assert mismatches == 0
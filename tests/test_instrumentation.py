@@ -0,0 +1,52 @@
+# Stage timings: URL time is charged once, by the outermost stage, whatever the nesting and concurrency
+import time
+import asyncio
+from instrumentation import Timings
+
+
+async def load(timings, url):
+    # Stages nested like a product page visit: extract around goto around ready_selector, with the late
+    # fields waited for in tasks of their own
+    with timings.stage('extract', url):
+        with timings.stage('goto', url):
+            await asyncio.sleep(0.02)
+            with timings.stage('ready_selector', url):
+                await asyncio.sleep(0.02)
+        with timings.stage('late_fields_probe', url + '?variant=1'):
+            await asyncio.sleep(0.01)
+
+        async def late_field():
+            with timings.stage('late_fields_wait', url):
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(late_field(), late_field())
+
+
+def test_url_time_never_exceeds_wall_time():
+    timings = Timings(enabled=True)
+    urls = [f'https://www.decathlon.com/products/item-{number}' for number in range(4)]
+
+    async def crawl():
+        start = time.perf_counter()
+        await asyncio.gather(*(load(timings, url) for url in urls))
+        return time.perf_counter() - start
+
+    wall = asyncio.run(crawl())
+    assert set(timings.url_seconds) == set(urls)
+    for url in urls:
+        assert timings.url_seconds[url] <= wall
+        # Only the extract stage is charged
+        assert timings.url_seconds[url] in timings.samples['extract']
+    # Nested stages still get their own samples
+    assert len(timings.samples['ready_selector']) == len(urls)
+    assert len(timings.samples['late_fields_wait']) == 2 * len(urls)
+
+
+def test_sibling_stages_are_each_charged():
+    timings = Timings(enabled=True)
+    url = 'https://www.decathlon.com/products/item'
+    with timings.stage('goto', url):
+        time.sleep(0.01)
+    with timings.stage('extract', url):
+        time.sleep(0.01)
+    assert timings.url_seconds[url] == sum(timings.samples['goto']) + sum(timings.samples['extract'])
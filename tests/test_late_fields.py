@@ -0,0 +1,99 @@
+# Probe of the reviews widget block that decides whether rating and review count are waited for. The block
+# selector is checked on the saved pages: it must be there exactly when the late fields are, and hold them.
+# A block never found over a whole run is reported.
+import os
+import asyncio
+import pytest
+import lxml.html
+import final
+from product_fields import LATE_FIELDS, PROBE_FIELDS_JS, REVIEWS_BLOCK, probe_specs
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'product_pages')
+# Saved pages and whether their product has reviews
+PAGES = {'with_reviews.html': True, 'colour_fallback.html': True, 'no_reviews.html': False,
+         'no_spec_table.html': False}
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+        return lxml.html.fromstring(file.read())
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_probe_block_holds_the_late_fields(name):
+    document = load(name)
+    for field, spec in LATE_FIELDS.items():
+        blocks = [block for selector in spec['probe'] for block in document.cssselect(selector)]
+        assert bool(blocks) == PAGES[name]
+        for selector in spec['selectors']:
+            for element in document.cssselect(selector):
+                # Every element the field is read from sits in the probed block
+                assert any(block in element.iterancestors() for block in blocks)
+
+
+def test_browser_probe_finds_the_block():
+    async_api = pytest.importorskip('playwright.async_api')
+
+    async def probe():
+        found = {}
+        async with async_api.async_playwright() as pw:
+            browser = await pw.firefox.launch()
+            page = await browser.new_page()
+            for name in sorted(PAGES):
+                with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+                    await page.set_content(file.read())
+                found[name] = await page.evaluate(PROBE_FIELDS_JS, probe_specs(list(LATE_FIELDS)))
+            await browser.close()
+        return found
+
+    try:
+        found = asyncio.run(probe())
+    except async_api.Error as error:
+        pytest.skip(f"no browser to probe with: {error.message.splitlines()[0]}")
+    for name, has_reviews in PAGES.items():
+        assert sorted(found[name]) == (sorted(LATE_FIELDS) if has_reviews else [])
+
+
+class FakePage:
+    # Page whose probe finds the block or not, and where it never shows up later
+    url = 'https://www.decathlon.com/products/item'
+
+    def __init__(self, has_block):
+        self.has_block = has_block
+
+    async def evaluate(self, script, probes):
+        return [probe['name'] for probe in probes] if self.has_block else []
+
+    async def wait_for_selector(self, selector, **options):
+        raise TimeoutError(selector)
+
+
+def probe_pages(monkeypatch, blocks):
+    monkeypatch.setattr(final, 'late_probes', final.Counter())
+    for has_block in blocks:
+        asyncio.run(final.present_late_fields(FakePage(has_block), list(LATE_FIELDS)))
+    return final.late_probes
+
+
+def test_systematic_miss_is_reported(monkeypatch):
+    probes = probe_pages(monkeypatch, [False] * final.PROBE_MISS_WARNING)
+    assert probes['probed'] == probes['missed'] == len(LATE_FIELDS) * final.PROBE_MISS_WARNING
+    assert REVIEWS_BLOCK in final.late_fields_summary()
+
+
+def test_products_without_reviews_are_not_reported(monkeypatch):
+    probes = probe_pages(monkeypatch, [False] * final.PROBE_MISS_WARNING + [True])
+    assert probes['missed'] == len(LATE_FIELDS) * final.PROBE_MISS_WARNING
+    assert final.late_fields_summary() is None
+
+
+@pytest.mark.parametrize('value', ['rating=2000', 'star_rating=abc', 'star_rating', 'number_of_reviews=-1'])
+def test_bad_field_wait_is_a_usage_error(value, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        final.parse_args(['--field-wait', value])
+    assert exit_info.value.code == 2
+    assert '--field-wait' in capsys.readouterr().err
+
+
+def test_field_wait():
+    assert final.parse_args(['--field-wait', 'star_rating=2000']).field_wait == [('star_rating', 2000)]
@@ -0,0 +1,50 @@
+# Discovery feed of the pipelined crawl: products are queued once, at stable positions, also across a resume
+import asyncio
+from pipeline import DiscoveryFeed
+from url_index import CATEGORY_SEPARATOR
+
+CAP = 'https://www.decathlon.com/products/kids-hiking-cap'
+FLEECE = 'https://www.decathlon.com/products/mens-fleece-jacket-mh120'
+BAG = 'https://www.decathlon.com/products/sport-bag-40-l'
+
+DISCOVERED = [(CAP, 'Cap'), (FLEECE, 'Fleece'), (CAP, 'Cap'), (FLEECE, 'Jacket')]
+
+
+def run_discovery(deduplicate, pairs, resumed=None, finished=()):
+    # (product list, queued items) of a discovery, optionally resumed from an interrupted one
+    async def discover():
+        feed = DiscoveryFeed(limit=0, deduplicate=deduplicate)
+        if resumed is not None:
+            feed.resume(resumed, set(finished))
+        await feed.add(pairs)
+        feed.close()
+        return feed.product_urls(), feed.queue.drain()
+
+    return asyncio.run(discover())
+
+
+def test_duplicates_merged():
+    product_urls, queued = run_discovery(True, DISCOVERED)
+    assert product_urls == [(CAP, 'Cap'), (FLEECE, CATEGORY_SEPARATOR.join(['Fleece', 'Jacket']))]
+    assert [position for position, url, category in queued] == [0, 1]
+
+
+def test_duplicates_kept():
+    product_urls, queued = run_discovery(False, DISCOVERED)
+    assert product_urls == DISCOVERED
+    assert [position for position, url, category in queued] == [0, 1, 2, 3]
+
+
+def test_resume_with_duplicates_kept():
+    # The interrupted run found the first three pairs and finished position 0
+    product_urls, queued = run_discovery(False, DISCOVERED + [(BAG, 'Sport Bag')], DISCOVERED[:3], finished=[0])
+    assert product_urls == DISCOVERED + [(BAG, 'Sport Bag')]
+    assert [position for position, url, category in queued] == [1, 2, 3, 4]
+
+
+def test_resume_with_duplicates_merged():
+    product_urls, queued = run_discovery(True, DISCOVERED + [(BAG, 'Sport Bag')], [(CAP, 'Cap'), (FLEECE, 'Fleece')],
+                                         finished=[0, 1])
+    assert product_urls == [(CAP, 'Cap'), (FLEECE, CATEGORY_SEPARATOR.join(['Fleece', 'Jacket'])),
+                            (BAG, 'Sport Bag')]
+    assert [position for position, url, category in queued] == [2]
@@ -0,0 +1,130 @@
+# Retry policy shared by the single-process and the sharded crawl: pages are leased on demand, a product the
+# browser crashed under is pushed back on a fresh lease, other failures go to the caller
+import asyncio
+from final import MAX_REQUEUES, product_worker, requeue_failure
+from request_scheduler import FetchFailure
+
+
+class FakeLease:
+    def __init__(self, number):
+        self.page = f'page-{number}'
+        self.crashed = False
+
+
+class FakePool:
+    def __init__(self):
+        self.leases = []
+        self.replaced = 0
+        self.released = []
+
+    async def acquire(self):
+        self.leases.append(FakeLease(len(self.leases) + 1))
+        return self.leases[-1]
+
+    def lost(self, lease):
+        return lease.crashed
+
+    async def replace(self, lease):
+        self.replaced += 1
+        return await self.acquire()
+
+    async def checkin(self, lease):
+        return lease
+
+    async def release(self, lease):
+        self.released.append(lease)
+
+
+def run_worker(items, scrape, pool=None):
+    # Outcomes of one worker over items; pushed back items are taken again after the others
+    pool = pool or FakePool()
+    queue = list(items)
+    outcomes = {'rows': [], 'failures': [], 'pushed': [], 'settled': 0}
+
+    async def next_product():
+        return queue.pop(0) if queue else None
+
+    def push_back(item):
+        outcomes['pushed'].append(item[0])
+        queue.append(item)
+
+    def settled():
+        outcomes['settled'] += 1
+
+    asyncio.run(product_worker(
+        pool, next_product, scrape, push_back=push_back, crashes={}, settled=settled,
+        on_row=lambda item, row, seconds: outcomes['rows'].append((item[0], row)),
+        on_failure=lambda item, failure: outcomes['failures'].append((item[0], failure))))
+    return outcomes, pool
+
+
+def items(count):
+    return [(index, f'https://www.decathlon.com/products/item-{index}', 'Cap') for index in range(count)]
+
+
+def test_rows_on_one_lease():
+    async def scrape(open_page, url, category):
+        return (url, category, await open_page())
+
+    outcomes, pool = run_worker(items(3), scrape)
+    assert [index for index, row in outcomes['rows']] == [0, 1, 2]
+    assert {row[2] for index, row in outcomes['rows']} == {'page-1'}
+    assert len(pool.leases) == 1 and len(pool.released) == 1
+    assert outcomes['settled'] == 3
+
+
+def test_no_lease_when_no_page_is_needed():
+    async def scrape(open_page, url, category):
+        return (url, category)
+
+    outcomes, pool = run_worker(items(2), scrape)
+    assert len(outcomes['rows']) == 2
+    assert pool.leases == [] and pool.released == []
+
+
+def test_fetch_failure_goes_to_caller():
+    async def scrape(open_page, url, category):
+        await open_page()
+        raise FetchFailure(url, 'HTTP 503')
+
+    outcomes, pool = run_worker(items(1), scrape)
+    assert [index for index, failure in outcomes['failures']] == [0]
+    assert outcomes['pushed'] == [] and pool.replaced == 0
+
+
+def test_crash_is_pushed_back_on_a_fresh_lease():
+    pool = FakePool()
+    attempts = []
+
+    async def scrape(open_page, url, category):
+        page = await open_page()
+        attempts.append(page)
+        if len(attempts) == 1:
+            pool.leases[-1].crashed = True
+            raise RuntimeError('Target closed')
+        return (url, category, page)
+
+    outcomes, pool = run_worker(items(1), scrape, pool)
+    assert outcomes['pushed'] == [0]
+    assert outcomes['rows'] == [(0, (items(1)[0][1], 'Cap', 'page-2'))]
+    assert pool.replaced == 1
+
+
+def test_repeated_crashes_give_up():
+    pool = FakePool()
+
+    async def scrape(open_page, url, category):
+        await open_page()
+        pool.leases[-1].crashed = True
+        raise RuntimeError('Target closed')
+
+    outcomes, pool = run_worker(items(1), scrape, pool)
+    assert outcomes['pushed'] == [0] * MAX_REQUEUES
+    [(index, failure)] = outcomes['failures']
+    assert index == 0 and not failure.retryable
+
+
+def test_requeue_failure():
+    requeues = {}
+    assert [requeue_failure(requeues, 7, True) for _ in range(MAX_REQUEUES + 1)] == [True] * MAX_REQUEUES + [False]
+    assert requeue_failure(requeues, 8, False) is False
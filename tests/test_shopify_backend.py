@@ -0,0 +1,49 @@
+# Documents backend on saved product pages with their product.js: every column it fills must hold the value the
+# browser-equivalent lxml backend reads from the same page, so switching backends does not change the rows
+# (nor make an incremental run report every product as changed).
+import os
+import json
+import pytest
+from html_extract import extract_fields_from_file
+from product_fields import NOT_AVAILABLE
+from shopify_backend import JSON_ONLY_FIELDS, fields_from_product_json, read_page_html
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'product_pages')
+# Pages saved with their product.js and JSON-LD
+PAGES = ['with_reviews', 'colour_fallback']
+
+
+def document_fields(name):
+    # What the backend stores with --json-fallback html: product.js, then the page HTML and its JSON-LD
+    with open(os.path.join(FIXTURES, f'{name}.js'), encoding='utf-8') as file:
+        fields = fields_from_product_json(json.load(file))
+    for field in JSON_ONLY_FIELDS:
+        del fields[field]
+    with open(os.path.join(FIXTURES, f'{name}.html'), encoding='utf-8') as file:
+        page_fields, widget = read_page_html(file.read())
+    fields.update(page_fields)
+    return fields, widget
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_same_values_as_the_page(name):
+    fields, widget = document_fields(name)
+    assert widget
+    assert fields == extract_fields_from_file(os.path.join(FIXTURES, f'{name}.html'))
+
+
+def test_late_fields_normalised():
+    # The live markup breaks "7366<br>Reviews)" over two lines; JSON-LD gives 7366, and 4.0 for a rating of 4
+    assert document_fields('with_reviews')[0]['number_of_reviews'] == '7366'
+    fields = document_fields('colour_fallback')[0]
+    assert (fields['star_rating'], fields['number_of_reviews']) == ('4', '212')
+
+
+def test_description_from_product_js():
+    # Only used with --json-fallback none, when no page is read
+    with open(os.path.join(FIXTURES, 'with_reviews.js'), encoding='utf-8') as file:
+        fields = fields_from_product_json(json.load(file))
+    assert fields['Product description'] == ['Designed for female skiers and snowboarders.',
+                                             'This warm base layer, will keep you comfortable throughout the day.']
+    assert fields['MRP'] == '$9.99' and fields['sale_price'] == '$8.00 '
+    assert fields_from_product_json({})['product_name'] == NOT_AVAILABLE
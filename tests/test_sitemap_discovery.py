@@ -0,0 +1,177 @@
+# Sitemap discovery on saved sitemap files: an index pointing at a product sitemap, a gzipped product sitemap
+# and a pages sitemap, served by a stand-in for the aiohttp session that can drop the connection mid-body.
+import os
+import gzip
+import asyncio
+import sqlite3
+import pytest
+import sitemap_discovery
+from urllib.parse import urlsplit
+from request_scheduler import RequestScheduler
+from sitemap_discovery import (SITEMAP_CATEGORY, SitemapState, discover_from_sitemap, iter_sitemap_entries,
+                               modified_since, parse_lastmod, sitemap_products)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'sitemaps')
+INDEX_URL = 'https://www.decathlon.com/sitemap.xml'
+# Chunks of a download that breaks before the connection drops, with 128-byte chunks (after the first products)
+DROP_AFTER = 5
+
+PRODUCTS = [
+    ('https://www.decathlon.com/products/thermal-base-layer-top', parse_lastmod('2026-05-18T08:00:00Z')),
+    ('https://www.decathlon.com/products/kids-hiking-cap', parse_lastmod('2026-05-17')),
+    ('https://www.decathlon.com/products/sport-bag-40-l', None),
+    ('https://www.decathlon.com/products/mens-fleece-jacket-mh120', parse_lastmod('2026-05-18T08:30:00Z')),
+]
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+
+def chunked(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+class FakeContent:
+    def __init__(self, data, drop_after):
+        self.data = data
+        self.drop_after = drop_after
+
+    async def iter_chunked(self, size):
+        for position, chunk in enumerate(chunked(self.data, size)):
+            if self.drop_after is not None and position == self.drop_after:
+                raise ConnectionResetError('connection dropped mid-body')
+            yield chunk
+
+
+class FakeResponse:
+    def __init__(self, status, data, drop_after=None):
+        self.status = status
+        self.content = FakeContent(data, drop_after)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    # Serves the fixture named after the last path segment; drops[name] is the number of downloads of that file
+    # that break after DROP_AFTER chunks
+    def __init__(self, drops=None):
+        self.drops = dict(drops or {})
+        self.requested = []
+
+    def get(self, url):
+        name = urlsplit(url).path.rsplit('/', 1)[-1]
+        self.requested.append(name)
+        if not os.path.exists(os.path.join(FIXTURES, name)):
+            return FakeResponse(404, b'')
+        drop_after = None
+        if self.drops.get(name):
+            self.drops[name] -= 1
+            drop_after = DROP_AFTER
+        return FakeResponse(200, read_fixture(name), drop_after)
+
+
+def scheduler():
+    scheduler = RequestScheduler(max_attempts=3)
+    scheduler.backoff = lambda attempt: 0
+    return scheduler
+
+
+async def collect(session, **options):
+    return [entry async for entry in sitemap_products(session, INDEX_URL, scheduler(), **options)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, 1 << 20])
+def test_entries_across_chunk_boundaries(size):
+    entries = list(iter_sitemap_entries(chunked(read_fixture('sitemap_products_1.xml'), size)))
+    assert entries == [('url', 'https://www.decathlon.com/', None)] + [('url', url, lastmod)
+                                                                       for url, lastmod in PRODUCTS[:3]]
+
+
+def test_nested_image_loc_is_ignored():
+    locs = [loc for kind, loc, lastmod in iter_sitemap_entries([read_fixture('sitemap_products_1.xml')])]
+    assert not any('cdn.decathlon.com' in loc for loc in locs)
+
+
+def test_index_entries():
+    entries = list(iter_sitemap_entries(chunked(read_fixture('sitemap.xml'), 16)))
+    assert [(kind, loc) for kind, loc, lastmod in entries] == [
+        ('sitemap', 'https://www.decathlon.com/sitemap_products_1.xml?from=1&to=3'),
+        ('sitemap', 'https://www.decathlon.com/sitemap_pages_1.xml'),
+        ('sitemap', '/sitemap_products_2.xml.gz'),
+    ]
+
+
+def test_product_sitemaps_only():
+    session = FakeSession()
+    assert asyncio.run(collect(session)) == PRODUCTS
+    # The pages sitemap is never downloaded, the gzipped one is inflated
+    assert session.requested == ['sitemap.xml', 'sitemap_products_1.xml', 'sitemap_products_2.xml.gz']
+
+
+def test_sitemaps_pattern():
+    session = FakeSession()
+    assert asyncio.run(collect(session, sitemaps=r'\.xml\.gz$')) == PRODUCTS[3:]
+
+
+def test_gzipped_sitemap_is_inflated():
+    data = gzip.decompress(read_fixture('sitemap_products_2.xml.gz'))
+    assert [loc for kind, loc, lastmod in iter_sitemap_entries([data])] == [PRODUCTS[3][0]]
+
+
+def test_dropped_connection_is_retried_without_repeats(monkeypatch):
+    monkeypatch.setattr(sitemap_discovery, 'CHUNK_SIZE', 128)
+    session = FakeSession(drops={'sitemap_products_1.xml': 2})
+    assert asyncio.run(collect(session)) == PRODUCTS
+    assert session.requested.count('sitemap_products_1.xml') == 3
+
+
+def test_dropped_connection_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(sitemap_discovery, 'CHUNK_SIZE', 128)
+    session = FakeSession(drops={'sitemap_products_1.xml': 3})
+    with pytest.raises(Exception, match='connection dropped'):
+        asyncio.run(collect(session))
+
+
+@pytest.mark.parametrize('lastmod, previous, queued', [
+    (100.0, None, True),
+    (None, 100.0, True),
+    (200.0, 100.0, True),
+    (100.0, 100.0, False),
+    (50.0, 100.0, False),
+])
+def test_modified_since(lastmod, previous, queued):
+    assert modified_since(lastmod, previous) is queued
+
+
+def test_state_round_trip(tmp_path):
+    state = SitemapState(str(tmp_path / 'state.sqlite'))
+    state.record(PRODUCTS[:2])
+    state.record([(PRODUCTS[0][0], PRODUCTS[0][1] + 60)])
+    assert state.lastmods() == {PRODUCTS[0][0]: PRODUCTS[0][1] + 60, PRODUCTS[1][0]: PRODUCTS[1][1]}
+    state.close()
+    assert sqlite3.connect(str(tmp_path / 'state.sqlite')).execute('SELECT COUNT(*) FROM products').fetchone() == (2,)
+
+
+def test_discovery_queues_only_modified_products(tmp_path):
+    state = SitemapState(str(tmp_path / 'state.sqlite'))
+    # Seen before: unchanged, older than the sitemap, and without a lastmod in the sitemap
+    state.record([PRODUCTS[0], (PRODUCTS[1][0], PRODUCTS[1][1] - 60), (PRODUCTS[2][0], 100.0)])
+    listed, found = {}, []
+
+    async def on_found(pairs):
+        found.extend(pairs)
+
+    product_urls = asyncio.run(discover_from_sitemap(INDEX_URL, state, scheduler(), found=on_found, listed=listed,
+                                                     session=FakeSession()))
+    expected = [(url, SITEMAP_CATEGORY) for url, lastmod in PRODUCTS[1:]]
+    assert product_urls == expected
+    assert found == expected
+    # Every product of the sitemap is listed, queued or not
+    assert listed == dict(PRODUCTS)
+    state.close()
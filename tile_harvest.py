@@ -0,0 +1,71 @@
+# Catalogue snapshot from the search result tiles: the grid's product links and the name, prices, rating and
+# review count of all its tiles are read from every result page, the tile fields merged in by link. A product
+# whose tile shows the same price as in the previous harvest gets a partial row built from its tile; only new
+# products, changed prices and products without a matching tile get a product page visit.
+import time
+import sqlite3
+from product_fields import COLUMNS, FIELD_SPECS, missing_value
+from records import parse_number
+from url_index import product_handle
+
+# Default location of the tile price database
+TILE_STATE_PATH = 'tile_prices.sqlite'
+
+
+class TileStore:
+    # Sale price of every product as shown on its tile when it was last harvested
+    def __init__(self, path=TILE_STATE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tiles (url TEXT PRIMARY KEY, price REAL, seen_at REAL)')
+        self.connection.commit()
+
+    def prices(self):
+        return {url: price for url, price in self.connection.execute('SELECT url, price FROM tiles')}
+
+    def record(self, prices):
+        # {url: price} of the products whose row this run produced
+        now = time.time()
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?)',
+                                        [(url, price, now) for url, price in prices.items()])
+
+    def close(self):
+        self.connection.close()
+
+
+def tile_row(url, category, fields):
+    # Row in the COLUMNS order; the fields a tile does not show are Not Available
+    return (url, category) + tuple(fields[spec['name']] if spec['name'] in fields else missing_value(spec)
+                                   for spec in FIELD_SPECS)
+
+
+def tiles_by_url(product_urls, tiles):
+    # Tile fields of every product of the deduplicated list, matched on the product handle
+    by_handle = {product_handle(href): fields for href, fields in tiles.items()}
+    return {url: by_handle[product_handle(url)] for url, category in product_urls
+            if product_handle(url) in by_handle}
+
+
+def harvest_rows(product_urls, tiles, prices):
+    # {position: partial row} of the products whose tile price is the one recorded by the previous harvest;
+    # the others (new, price changed, no tile) need their product page
+    rows = {}
+    for position, (url, category) in enumerate(product_urls):
+        fields = tiles.get(url)
+        if fields is None:
+            continue
+        price = parse_number(fields['sale_price'])
+        if price is not None and prices.get(url) == price:
+            rows[position] = tile_row(url, category, fields)
+    return rows
+
+
+def row_prices(rows):
+    # {url: sale price} of finished rows, from a tile or a product page alike
+    position = COLUMNS.index('sale_price')
+    prices = {}
+    for row in rows:
+        if row is not None and parse_number(row[position]) is not None:
+            prices[row[0]] = parse_number(row[position])
+    return prices
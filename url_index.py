@@ -0,0 +1,66 @@
+# Canonical product URLs and the categories each product was found under, so that a product listed in
+# several categories is fetched once and its row names all of them.
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Site the relative result links point to
+BASE_URL = 'https://www.decathlon.com'
+# Query parameters added by the search widget or for tracking, they do not change the product page
+TRACKING_PARAM_PREFIXES = ('adept-', 'utm_', '_pos', '_sid', '_ss', '_psq')
+# Tracking parameters matched on their whole name, a prefix would also drop e.g. refinement
+TRACKING_PARAMS = {'ref'}
+# Separator between the categories of a product in the category column
+CATEGORY_SEPARATOR = '|'
+
+
+def canonical_product_url(url, base=BASE_URL):
+    # Absolute URL, lowercase host, no fragment, no tracking parameters, no trailing slash
+    parts = urlsplit(urljoin(base, url.strip()))
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not name.lower().startswith(TRACKING_PARAM_PREFIXES) and name.lower() not in TRACKING_PARAMS]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+def product_handle(url):
+    # Shopify product handle: the path segment after /products/ (the canonical URL for other pages)
+    canonical = canonical_product_url(url)
+    segments = urlsplit(canonical).path.split('/')
+    if 'products' in segments[:-1]:
+        return segments[segments.index('products') + 1]
+    return canonical
+
+
+class ProductIndex:
+    def __init__(self):
+        # handle -> canonical URL of the first occurrence and the categories in discovery order
+        self.products = {}
+
+    def add(self, url, category):
+        handle = product_handle(url)
+        product = self.products.setdefault(handle, {'url': canonical_product_url(url), 'categories': []})
+        if category not in product['categories']:
+            product['categories'].append(category)
+
+    def add_all(self, product_urls):
+        for url, category in product_urls:
+            self.add(url, category)
+
+    def categories(self, url):
+        product = self.products.get(product_handle(url))
+        return product['categories'] if product else []
+
+    def product_urls(self):
+        # One (url, categories) pair per product, in the order products were first discovered
+        return [(product['url'], CATEGORY_SEPARATOR.join(product['categories']))
+                for product in self.products.values()]
+
+    def __len__(self):
+        return len(self.products)
+
+
+def deduplicate_product_urls(product_urls):
+    # Collapse the (url, category) list found by filter_products to one entry per product
+    index = ProductIndex()
+    index.add_all(product_urls)
+    print(f"{len(index)} unique products out of {len(product_urls)} discovered links.")
+    return index.product_urls()